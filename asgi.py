@@ -0,0 +1 @@
+from asgi_server import app
@@ -0,0 +1,228 @@
+from quart import Quart, Response, g, request, jsonify
+import asyncio
+
+from functions import connector_fn
+from functions import http_handlers as handlers
+from functions import sync_scheduler
+from functions.connector_fn_async import (
+    close_case_from_zoho,
+    create_case_from_zoho,
+    iter_batch,
+    run_batch,
+    upload_docs_from_zoho_to_naa,
+)
+from functions.helpers import async_http_client
+from functions.helpers.log import configure_logging
+from server import start_background_sync
+
+# The ASGI flavour of server.py: same endpoints, auth and response shapes
+# (both are built on functions.http_handlers), but create, close and upload
+# run on the event loop (connector_fn_async), so one process can keep
+# hundreds of them waiting on Zoho/NAA at once. Queued jobs and the sync
+# scheduler stay on their threads, and handlers that read or write the
+# SQLite stores run through asyncio.to_thread.
+app = Quart(__name__)
+
+
+def _endpoint_label() -> str:
+    return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+
+def _reply(reply):
+    """A handlers reply, (body, status[, headers]), as a Quart response."""
+    body, *rest = reply
+    return (jsonify(body), *rest)
+
+
+@app.before_serving
+async def _startup():
+    configure_logging()
+    start_background_sync()
+
+
+@app.after_serving
+async def _shutdown():
+    sync_scheduler.stop()
+    await async_http_client.close_all()
+
+
+@app.before_request
+async def _start_request_metrics():
+    g.request_metrics = handlers.RequestMetrics(request.method, _endpoint_label())
+
+
+@app.after_request
+async def _capture_status(response):
+    request_metrics = g.get('request_metrics')
+    if request_metrics is not None:
+        server_timing = request_metrics.responded(response.status_code)
+        if server_timing is not None:
+            response.headers['Server-Timing'] = server_timing
+    return response
+
+
+@app.teardown_request
+async def _finish_request_metrics(exc):
+    request_metrics = g.pop('request_metrics', None)
+    if request_metrics is not None:
+        request_metrics.finished(exc)
+
+
+def _auth_error():
+    error = handlers.auth_error(request.headers)
+    return _reply(error) if error else None
+
+
+def _wants_async(data: dict) -> bool:
+    return handlers.wants_async(request.headers, request.args, data)
+
+
+async def _submit(kind: str, fn, *args, payload=None):
+    return _reply(await asyncio.to_thread(handlers.submit, kind, fn, *args, payload=payload))
+
+
+async def _body() -> dict:
+    if request.is_json:
+        return await request.get_json(force=True)
+    return (await request.form).to_dict()
+
+
+@app.route('/createNAACaseFromZoho', methods=['POST'])
+async def create_naa_case_endpoint():
+    auth_error = _auth_error()
+    if auth_error:
+        return auth_error
+
+    data = await _body()
+    matterID, error = handlers.matter_id(data)
+    if error:
+        return _reply(error)
+
+    if _wants_async(data):
+        # jobs run on the worker's thread pool, so they use the threaded pipeline
+        return await _submit("createNAACaseFromZoho", connector_fn.create_case_from_zoho, matterID, payload={"matterID": matterID})
+
+    return _reply(handlers.result_reply(await create_case_from_zoho(matterID)))
+
+
+@app.route('/closeNAACaseFromZoho', methods=['POST'])
+async def close_naa_case_endpoint():
+    auth_error = _auth_error()
+    if auth_error:
+        return auth_error
+
+    data = await _body()
+    matterID, error = handlers.matter_id(data)
+    if error:
+        return _reply(error)
+
+    return _reply(handlers.result_reply(await close_case_from_zoho(matterID)))
+
+
+async def _batch_endpoint(operation: str):
+    auth_error = _auth_error()
+    if auth_error:
+        return auth_error
+
+    data = await request.get_json(silent=True) or {}
+    matterIDs, error = handlers.batch_matter_ids(data)
+    if error:
+        return _reply(error)
+
+    if handlers.batch_as_job(matterIDs, _wants_async(data)):
+        return await _submit(f"{operation}NAACasesFromZoho", connector_fn.run_batch, operation, matterIDs, payload={"matterIDs": matterIDs})
+
+    if handlers.wants_stream(request.headers, request.args):
+        # one line per matter as it finishes, then a summary line
+        async def _lines():
+            results = []
+            async for result in iter_batch(operation, matterIDs):
+                results.append(result)
+                yield handlers.ndjson_line(result)
+            yield handlers.batch_summary_line(operation, results)
+
+        return Response(g.request_metrics.streamed(_lines()), mimetype="application/x-ndjson")
+
+    return _reply(handlers.batch_reply(await run_batch(operation, matterIDs)))
+
+
+@app.route('/createNAACasesFromZoho', methods=['POST'])
+async def create_naa_cases_endpoint():
+    """createNAACaseFromZoho for body["matterIDs"], run concurrently."""
+    return await _batch_endpoint("create")
+
+
+@app.route('/closeNAACasesFromZoho', methods=['POST'])
+async def close_naa_cases_endpoint():
+    """closeNAACaseFromZoho for body["matterIDs"], run concurrently."""
+    return await _batch_endpoint("close")
+
+
+@app.route('/uploadDocsFromZoho', methods=['POST'])
+async def upload_docs_endpoint():
+    auth_error = _auth_error()
+    if auth_error:
+        return auth_error
+
+    if request.is_json:
+        data = await request.get_json(force=True)
+    else:
+        data, error = handlers.upload_form(await request.form)
+        if error:
+            return _reply(error)
+
+    case_id, attachments, error = handlers.upload_request(data)
+    if error:
+        return _reply(error)
+
+    # transfer attachments concurrently, one result per attachment
+    return _reply(handlers.upload_reply(await upload_docs_from_zoho_to_naa(attachments, case_id)))
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+async def get_job_endpoint(job_id):
+    auth_error = _auth_error()
+    if auth_error:
+        return auth_error
+    return _reply(await asyncio.to_thread(handlers.get_job, job_id))
+
+
+@app.route('/sync', methods=['POST'])
+async def trigger_sync_endpoint():
+    """Queue a sync now: all open matters, or only body["matterIDs"]."""
+    auth_error = _auth_error()
+    if auth_error:
+        return auth_error
+    data = await request.get_json(silent=True) or {}
+    return _reply(await asyncio.to_thread(handlers.trigger_sync, data))
+
+
+@app.route('/webhooks/sync', methods=['POST'])
+async def sync_webhook_endpoint():
+    """Queue a refresh of the matters a Zoho or NAA change notification names."""
+    auth_error = handlers.webhook_auth_error(request.headers)
+    if auth_error:
+        return _reply(auth_error)
+
+    data = await request.get_json(silent=True) if request.is_json else (await request.form).to_dict()
+    return _reply(await asyncio.to_thread(handlers.sync_webhook, data))
+
+
+@app.route('/sync', methods=['GET'])
+async def sync_status_endpoint():
+    auth_error = _auth_error()
+    if auth_error:
+        return auth_error
+    return _reply(await asyncio.to_thread(handlers.sync_status))
+
+
+@app.route('/metrics', methods=['GET'])
+async def metrics_endpoint():
+    """Prometheus text format, summed over every worker on this host."""
+    auth_error = _auth_error()
+    if auth_error:
+        return auth_error
+    text = await asyncio.to_thread(handlers.metrics_text)
+    if text is None:
+        return _reply(handlers.METRICS_DISABLED)
+    return Response(text, mimetype=handlers.METRICS_MIMETYPE)
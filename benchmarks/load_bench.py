@@ -0,0 +1,356 @@
+"""
+Offline load test: the real app under gunicorn against stub Zoho/NAA.
+
+Starts benchmarks/stub_upstream.py, then gunicorn with start_flask.sh's
+settings (worker count configurable; --server asgi runs hypercorn with the
+asyncio app from asgi.py instead), both in a scratch directory so no
+credentials or state from the checkout are used. It drives each endpoint
+with concurrent clients and reports p50/p95/p99 latency and requests/sec.
+Full syncs are triggered through POST /sync at several matter counts and
+timed from the job record.
+
+Each run appends one JSON line to --out. The run is then compared with the
+last earlier line that used the same config, and endpoints whose p95 grew or
+whose throughput fell by more than --threshold are flagged.
+
+    python benchmarks/load_bench.py --requests 200 --concurrency 8 \\
+        --latency-ms 40 --sync-counts 50,200,1000 --out bench_output.txt
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = "bench-pass"
+HEADERS = {"Authorization": f"Bearer {PASSWORD}"}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(sorted_values, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def _latency_summary(latencies, errors: int, wall: float, statuses: dict) -> dict:
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "rps": round(len(values) / wall, 2) if wall > 0 else 0.0,
+        "p50Ms": round(_percentile(values, 50) * 1000, 1),
+        "p95Ms": round(_percentile(values, 95) * 1000, 1),
+        "p99Ms": round(_percentile(values, 99) * 1000, 1),
+        "statuses": statuses,
+    }
+
+
+class Environment:
+    """Stub upstream + gunicorn app in a scratch directory."""
+
+    def __init__(self, args):
+        self.args = args
+        self.workdir = tempfile.mkdtemp(prefix="naa-bench-")
+        self.stub = None
+        self.app = None
+        self.stub_url = None
+        self.app_url = None
+
+    def __enter__(self):
+        self._start_stub()
+        self._start_app()
+        return self
+
+    def __exit__(self, *exc):
+        for proc in (self.app, self.stub):
+            if proc is not None and proc.poll() is None:
+                proc.terminate()
+                try:
+                    proc.wait(timeout=15)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def _start_stub(self):
+        a = self.args
+        self.stub = subprocess.Popen(
+            [
+                sys.executable, os.path.join(ROOT, "benchmarks", "stub_upstream.py"),
+                "--latency-ms", str(a.latency_ms),
+                "--jitter-ms", str(a.jitter_ms),
+                "--error-rate", str(a.error_rate),
+                "--file-kb", str(a.file_kb),
+            ],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        self.stub_url = self.stub.stdout.readline().strip()
+        if not self.stub_url:
+            raise RuntimeError("stub server did not start")
+
+    def _start_app(self):
+        a = self.args
+        os.makedirs(os.path.join(self.workdir, "credentials"))
+        empty_env = os.path.join(self.workdir, ".env")
+        open(empty_env, "w").close()
+        env = dict(os.environ)
+        env.update(
+            DOTENV_PATH=empty_env,
+            SERVER_PASS=PASSWORD,
+            NAA_EMAIL="bench@example.com",
+            NAA_PASSWORD="bench",
+            NAA_BASE_URL=self.stub_url,
+            ZOHO_API_DOMAIN=self.stub_url,
+            ZOHO_ACCOUNTS_URL=self.stub_url,
+            ZOHO_CLIENT_ID="bench",
+            ZOHO_CLIENT_SECRET="bench",
+            ZOHOCRM_REFRESH_TOKEN="bench",
+            SYNC_SCHEDULER_ENABLED="0",
+            RATE_LIMIT_ENABLED="1" if a.rate_limit else "0",
+            LOG_LEVEL="WARNING",
+        )
+        port = _free_port()
+        self.app_url = f"http://127.0.0.1:{port}"
+        if a.server == "asgi":
+            env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))
+            cmd = [
+                sys.executable, "-m", "hypercorn",
+                "--bind", f"127.0.0.1:{port}",
+                "--workers", str(a.workers),
+                "--log-level", "warning",
+                "asgi:app",
+            ]
+        else:
+            cmd = self._gunicorn_cmd(port)
+        self.app = subprocess.Popen(
+            cmd, cwd=self.workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if self.app.poll() is not None:
+                raise RuntimeError(f"{a.server} server exited during start-up")
+            try:
+                requests.get(self.app_url + "/jobs/ping", timeout=1)
+                return
+            except requests.exceptions.ConnectionError:
+                time.sleep(0.2)
+        raise RuntimeError(f"{a.server} server did not start within 30s")
+
+    def _gunicorn_cmd(self, port: int) -> list:
+        a = self.args
+        cmd = [
+            sys.executable, "-m", "gunicorn",
+            "-c", os.path.join(ROOT, "gunicorn.conf.py"),
+            "--pythonpath", ROOT,
+            "--chdir", self.workdir,
+            "--bind", f"127.0.0.1:{port}",
+            "--timeout", "20",
+            "--preload",
+            "--workers", str(a.workers),
+            "--log-level", "warning",
+        ]
+        if a.max_requests:
+            cmd += ["--max-requests", str(a.max_requests), "--max-requests-jitter", "20"]
+        cmd.append("wsgi:app")
+        return cmd
+
+    def configure_stub(self, **config):
+        requests.post(self.stub_url + "/_admin/config", json=config, timeout=5).raise_for_status()
+
+    def stub_calls(self) -> dict:
+        return requests.get(self.stub_url + "/_admin/stats", timeout=5).json()
+
+
+def run_endpoint(env: Environment, path: str, body_for, total: int, concurrency: int) -> dict:
+    """POST `body_for(i)` to `path` `total` times from `concurrency` clients."""
+    local = threading.local()
+    statuses = {}
+    lock = threading.Lock()
+
+    def call(i):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        started = time.perf_counter()
+        try:
+            status = session.post(env.app_url + path, json=body_for(i), headers=HEADERS, timeout=60).status_code
+        except requests.exceptions.RequestException:
+            status = "error"
+        elapsed = time.perf_counter() - started
+        with lock:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        return elapsed, status
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(call, range(total)))
+    wall = time.perf_counter() - started
+    errors = sum(1 for _, status in results if status == "error" or int(status) >= 400)
+    return _latency_summary([elapsed for elapsed, _ in results], errors, wall, statuses)
+
+
+def run_sync(env: Environment, matters: int, runs: int) -> dict:
+    """Time `runs` full syncs over `matters` records, from the job timestamps."""
+    env.configure_stub(records=matters)
+    durations, errors, statuses, written = [], 0, {}, []
+    started_all = time.perf_counter()
+    for _ in range(runs):
+        resp = requests.post(env.app_url + "/sync", json={}, headers=HEADERS, timeout=30)
+        resp.raise_for_status()
+        status_url = env.app_url + resp.json()["statusUrl"]
+        deadline = time.monotonic() + 900
+        job = {}
+        while time.monotonic() < deadline:
+            job = requests.get(status_url, headers=HEADERS, timeout=30).json()
+            if job.get("status") in ("succeeded", "failed", "interrupted"):
+                break
+            time.sleep(0.1)
+        statuses[job.get("status", "timeout")] = statuses.get(job.get("status", "timeout"), 0) + 1
+        if job.get("status") != "succeeded":
+            errors += 1
+            continue
+        durations.append(job["finishedAt"] - job["startedAt"])
+        written.append((job.get("result") or {}).get("written"))
+    out = _latency_summary(durations, errors, time.perf_counter() - started_all, statuses)
+    out["matters"] = matters
+    out["mattersPerSecond"] = round(matters / _percentile(sorted(durations), 50), 1) if durations else 0.0
+    out["written"] = written
+    return out
+
+
+def _compare(current: dict, previous: dict, threshold: float) -> list:
+    regressions = []
+    for name, now in current["results"].items():
+        before = previous["results"].get(name)
+        if not before:
+            continue
+        if before["p95Ms"] and now["p95Ms"] > before["p95Ms"] * (1 + threshold):
+            regressions.append(f"{name}: p95 {before['p95Ms']}ms -> {now['p95Ms']}ms")
+        if before["rps"] and now["rps"] < before["rps"] * (1 - threshold):
+            regressions.append(f"{name}: {before['rps']} -> {now['rps']} req/s")
+    return regressions
+
+
+def _previous(path: str, config: dict):
+    if not path or not os.path.exists(path):
+        return None
+    previous = None
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry.get("benchmark") == "load" and entry.get("config") == config:
+                previous = entry
+    return previous
+
+
+def _git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--server", choices=("wsgi", "asgi"), default="wsgi",
+                        help="gunicorn + Flask (wsgi) or hypercorn + Quart (asgi)")
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--max-requests", type=int, default=70, help="0 disables worker recycling")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--attachments", type=int, default=2, help="documents per upload request")
+    parser.add_argument("--sync-counts", default="50,200,1000")
+    parser.add_argument("--sync-runs", type=int, default=3)
+    parser.add_argument("--latency-ms", type=float, default=40.0)
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--file-kb", type=float, default=256.0)
+    parser.add_argument("--rate-limit", action="store_true", help="keep the Zoho rate limiter on")
+    parser.add_argument("--only", help="comma-separated subset: create,close,upload,sync")
+    parser.add_argument("--out", help="append the JSON result to this file")
+    parser.add_argument("--threshold", type=float, default=0.2, help="regression tolerance (0.2 = 20%%)")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    only = set(args.only.split(",")) if args.only else {"create", "close", "upload", "sync"}
+    config = {k: v for k, v in vars(args).items() if k not in ("out", "threshold", "fail_on_regression")}
+    results = {}
+    # fresh matter ids per request, so single-flight replay and the lookup
+    # cache don't turn the run into a cache benchmark
+    base = int(time.time()) % 100000 * 1000
+
+    with Environment(args) as env:
+        if "create" in only:
+            results["POST /createNAACaseFromZoho"] = run_endpoint(
+                env, "/createNAACaseFromZoho", lambda i: {"matterID": base + i},
+                args.requests, args.concurrency,
+            )
+        if "close" in only:
+            results["POST /closeNAACaseFromZoho"] = run_endpoint(
+                env, "/closeNAACaseFromZoho", lambda i: {"matterID": base + args.requests + i},
+                args.requests, args.concurrency,
+            )
+        if "upload" in only:
+            attachments = [
+                {"document_id": str(n), "document_name": f"doc{n}.pdf"} for n in range(args.attachments)
+            ]
+            results["POST /uploadDocsFromZoho"] = run_endpoint(
+                env, "/uploadDocsFromZoho",
+                lambda i: {"record_id": base + i, "NAAM_CaseID": base + i, "attachments": attachments},
+                args.requests, args.concurrency,
+            )
+        if "sync" in only:
+            for count in (int(c) for c in args.sync_counts.split(",") if c.strip()):
+                results[f"sync_cases[{count}]"] = run_sync(env, count, args.sync_runs)
+        stub_calls = env.stub_calls()
+
+    entry = {
+        "benchmark": "load",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "commit": _git_commit(),
+        "config": config,
+        "results": results,
+        "upstreamCalls": stub_calls,
+    }
+
+    print(f"{'scenario':40} {'n':>6} {'err':>5} {'req/s':>8} {'p50ms':>9} {'p95ms':>9} {'p99ms':>9}")
+    for name, r in results.items():
+        print(f"{name:40} {r['requests']:>6} {r['errors']:>5} {r['rps']:>8} "
+              f"{r['p50Ms']:>9} {r['p95Ms']:>9} {r['p99Ms']:>9}")
+
+    previous = _previous(args.out, config)
+    regressions = _compare(entry, previous, args.threshold) if previous else []
+    if previous:
+        print(f"\ncompared with {previous.get('commit')} ({previous.get('timestamp')}):")
+        print("\n".join(f"  REGRESSION {r}" for r in regressions) or "  no regressions")
+
+    if args.out:
+        with open(args.out, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
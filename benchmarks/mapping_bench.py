@@ -0,0 +1,147 @@
+"""
+Zoho-to-NAA field mapping micro-benchmark.
+
+Times the table-driven mapping (functions.case_mapping.build_case_request)
+against the hand-written extract_fields_from_zoho it replaced, kept below
+verbatim as the baseline. Both run on the same in-memory record, in the
+full shape Zoho used to return and in the projected shape
+searchZohoRecords now asks for, plus a record missing three fields.
+Nothing touches the network.
+
+The table is not the faster of the two: a good record costs it 1-1.5 us
+more (about 3 us against 1.7 us). What it buys is the list of every missing
+field instead of None, optional fields that may be blank, and a projected
+record about a sixth of the full one on the wire.
+
+    python benchmarks/mapping_bench.py --number 100000 --out bench_output.txt
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from functions.case_mapping import MissingZohoFields, ZOHO_CASE_FIELDS, build_case_request  # noqa: E402
+from stub_upstream import record  # noqa: E402
+
+
+def extract_fields_from_zoho(zohoDetails: dict, name: str, requestId: str) -> dict:
+    try:
+        defendantPlantiff = False
+        caseClientName = name
+        data0 = zohoDetails["data"][0]
+
+        outCourtState = data0["State"]
+        outCourtCity = data0["City"]
+        outCourtName = data0["Court_Name"]
+        outCourtAddress = data0["Address"]
+        outCourtZip = data0["Zip_Code"]
+        hearingType = data0["Pick_List_5"]
+        detailedInstructions = data0["Desired_Result"]
+
+        attorneyRecord = data0["Attorney_of_Record"]
+        fileNumber = data0["Client_Reference"]
+        caseName = data0["Case_Name1"]
+        caseNumber = data0["Case_Number"]
+
+        # Normalize county field
+        outCourtCounty = data0["County2"]["name"]
+        if ":" in outCourtCounty:
+            outCourtCounty = outCourtCounty.split(":", 1)[1].strip()
+
+        # Parse and format hearingDate
+        hearingTime = str(data0["Twenty_Four_Hr_Hearing_Time"])
+        date_part, time_part = hearingTime.split(" ")
+        hour, minute = time_part.split(":")[:2]
+        hour = hour.zfill(2)
+        minute = minute.zfill(2)
+        hearingDate = f"{date_part}T{hour}:{minute}:00"
+
+        return {
+            "outCourtState": outCourtState,
+            "outCourtCounty": outCourtCounty,
+            "outCourtCity": outCourtCity,
+            "outCourtName": outCourtName,
+            "outCourtAddress": outCourtAddress,
+            "outCourtZip": outCourtZip,
+            "hearingType": hearingType,
+            "hearingDate": hearingDate,
+            "fileNumber": fileNumber,
+            "defendantPlantiff": defendantPlantiff,
+            "detailedInstructions": detailedInstructions,
+            "attorneyRecord": attorneyRecord,
+            "caseName": caseName,
+            "caseClientName": caseClientName,
+            "caseNumber": caseNumber,
+        }
+    except KeyError:
+        return None
+
+
+def _full_record() -> dict:
+    # a real Appearances1 record carries ~100 fields; pad the stub's to match
+    rec = record(1234)
+    rec.update({f"Unused_Field_{i}": f"value {i}" for i in range(80)})
+    return rec
+
+
+def _missing(build):
+    try:
+        build()
+    except MissingZohoFields as e:
+        return e.fields
+    return []
+
+
+def _usec(fn, number: int, repeat: int) -> float:
+    return round(min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1e6, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--number", type=int, default=100000, help="calls per timing run")
+    parser.add_argument("--repeat", type=int, default=5, help="timing runs; the fastest is kept")
+    parser.add_argument("--out", help="also append the JSON result to this file")
+    args = parser.parse_args()
+
+    full = _full_record()
+    projected = {k: full[k] for k in ("id", "Matter", "NAAM_CaseID", "NAAM_Results", "Results", *ZOHO_CASE_FIELDS)}
+    broken = dict(projected)
+    for field in ("Court_Name", "County2", "Twenty_Four_Hr_Hearing_Time"):
+        broken.pop(field)
+
+    legacy = extract_fields_from_zoho({"data": [full]}, "Client", 1234)
+    table = build_case_request(full, "Client").as_kwargs()
+    if legacy != table:
+        sys.exit(f"mappings disagree:\n{legacy}\n{table}")
+
+    result = {
+        "number": args.number,
+        "recordBytes": {
+            "full": len(json.dumps({"data": [full]})),
+            "projected": len(json.dumps({"data": [projected]})),
+        },
+        "usecPerCall": {
+            "legacy": _usec(lambda: extract_fields_from_zoho({"data": [full]}, "Client", 1234), args.number, args.repeat),
+            "table": _usec(lambda: build_case_request(full, "Client"), args.number, args.repeat),
+            "tableProjected": _usec(lambda: build_case_request(projected, "Client"), args.number, args.repeat),
+            "legacyMissing": _usec(lambda: extract_fields_from_zoho({"data": [broken]}, "Client", 1234), args.number, args.repeat),
+            "tableMissing": _usec(lambda: _missing(lambda: build_case_request(broken, "Client")), args.number, args.repeat),
+        },
+        "missingReported": {
+            "legacy": extract_fields_from_zoho({"data": [broken]}, "Client", 1234),
+            "table": _missing(lambda: build_case_request(broken, "Client")),
+        },
+    }
+    print(json.dumps(result, indent=2))
+    if args.out:
+        with open(args.out, "a") as f:
+            f.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Worker startup benchmark.
+
+Each run starts a fresh interpreter (as a recycled gunicorn worker would),
+imports `wsgi`, then serves one request through Flask's test client. The
+request is deliberately unauthenticated so it exercises routing and app
+setup without calling Zoho or NAA. Outbound connections attempted during
+import are counted; anything above zero means import is doing network I/O.
+
+    python benchmarks/startup_bench.py --runs 10 --out bench_output.txt
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_CHILD = r"""
+import json, socket, sys, time
+
+connects = []
+_real_connect = socket.socket.connect
+def _counting_connect(self, address):
+    connects.append(repr(address))
+    return _real_connect(self, address)
+socket.socket.connect = _counting_connect
+
+t0 = time.perf_counter()
+import wsgi
+t1 = time.perf_counter()
+import_connects = list(connects)
+
+client = wsgi.app.test_client()
+t2 = time.perf_counter()
+resp = client.post("/createNAACaseFromZoho", json={"matterID": 1})
+t3 = time.perf_counter()
+
+# stdout belongs to the app's log writer thread
+print(json.dumps({
+    "importMs": (t1 - t0) * 1000,
+    "firstRequestMs": (t3 - t2) * 1000,
+    "firstRequestStatus": resp.status_code,
+    "importConnects": import_connects,
+}), file=sys.stderr)
+"""
+
+
+def _run_once() -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", _CHILD],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stderr.strip().splitlines()[-1])
+
+
+def _summary(values):
+    values = sorted(values)
+    return {
+        "min": round(values[0], 2),
+        "median": round(statistics.median(values), 2),
+        "max": round(values[-1], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--out", help="also append the JSON result to this file")
+    args = parser.parse_args()
+
+    runs = [_run_once() for _ in range(args.runs)]
+    result = {
+        "runs": args.runs,
+        "importMs": _summary([r["importMs"] for r in runs]),
+        "firstRequestMs": _summary([r["firstRequestMs"] for r in runs]),
+        "firstRequestStatus": runs[-1]["firstRequestStatus"],
+        "importConnects": max(len(r["importConnects"]) for r in runs),
+    }
+    print(json.dumps(result, indent=2))
+    if args.out:
+        with open(args.out, "a") as f:
+            f.write(json.dumps(result) + "\n")
+    if result["importConnects"]:
+        sys.exit("import performed network I/O: %s" % runs[-1]["importConnects"])
+
+
+if __name__ == "__main__":
+    main()
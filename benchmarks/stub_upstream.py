@@ -0,0 +1,266 @@
+"""
+Stub Zoho CRM + NAA server for offline benchmarks.
+
+Serves every upstream endpoint the app calls, on one port:
+
+    Zoho   POST /oauth/v2/token
+           GET  /crm/v7/Appearances1/search     (by id, or the sync listing)
+           PUT  /crm/v7/Appearances1[/<id>]
+           GET  /crm/v8/Deals/search
+           GET  /crm/v7/files?id=<id>
+    NAA    POST /api/users/login
+           GET  /api/cases[/<id>]
+           POST /api/cases
+           POST /api/cases/<id>/upload
+           PUT  /api/cases/<id>/cancel
+
+Any matter id resolves to a synthetic record. The sync listing and the
+paged NAA case listing both hold `records` matters. Latency, error rate
+and file size are configurable at start-up or at runtime via
+POST /_admin/config with a JSON body, e.g.
+{"latency_ms": 80, "error_rate": 0.02, "records": 500}. GET /_admin/stats
+returns per-endpoint call counts.
+
+    python benchmarks/stub_upstream.py --port 0 --latency-ms 50
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+CONFIG = {
+    "latency_ms": 0.0,
+    "jitter_ms": 0.0,
+    "error_rate": 0.0,
+    "error_status": 503,
+    "file_kb": 64,
+    "records": 100,
+    # how many of them an incremental (Modified_Time) listing returns
+    "modified": 10,
+}
+_calls = {}
+_calls_lock = threading.Lock()
+_file_cache = {}
+
+_ID_SEGMENT = re.compile(r"/\d+")
+
+
+def record(matter_id: int) -> dict:
+    return {
+        "id": str(matter_id),
+        "NAAM_CaseID": matter_id,
+        "NAAM_Results": "Assigned",
+        "Results": "",
+        "State": "CA",
+        "City": "Los Angeles",
+        "Court_Name": "Stanley Mosk Courthouse",
+        "Address": "111 N Hill St",
+        "Zip_Code": "90012",
+        "Pick_List_5": "Status Conference",
+        "Desired_Result": "Continue the hearing",
+        "Attorney_of_Record": "Attorney",
+        "Client_Reference": f"REF-{matter_id}",
+        "Case_Name1": f"Case {matter_id}",
+        "Case_Number": f"BC{matter_id:06d}",
+        "County2": {"name": "CA: Los Angeles"},
+        "Twenty_Four_Hr_Hearing_Time": "2030-01-02 9:30",
+        "Matter": {"id": str(matter_id)},
+        "Submission_Status": "Submitted",
+    }
+
+
+def case(case_id: int) -> dict:
+    return {"id": case_id, "caseStatus": (2, 3, 7)[case_id % 3],
+            "detailedResults": f"results for {case_id}"}
+
+
+def _file_bytes(size: int) -> bytes:
+    data = _file_cache.get(size)
+    if data is None:
+        data = _file_cache[size] = os.urandom(size)
+    return data
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # send headers and body in one segment with TCP_NODELAY, otherwise
+    # Nagle + delayed ACK adds ~40ms to every response
+    disable_nagle_algorithm = True
+    wbufsize = 64 * 1024
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, code: int, obj=None, raw: bytes = None, headers=None):
+        body = raw if raw is not None else (json.dumps(obj).encode() if obj is not None else b"")
+        self.send_response(code)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            return self.rfile.read(length)
+        if self.headers.get("Transfer-Encoding") == "chunked":
+            out = b""
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return out
+                out += self.rfile.read(size)
+                self.rfile.readline()
+        return b""
+
+    def _handle(self):
+        url = urlsplit(self.path)
+        path, query = url.path, parse_qs(url.query)
+        body = self._body()
+
+        if path.startswith("/_admin/"):
+            return self._admin(path, body)
+
+        key = f"{self.command} {_ID_SEGMENT.sub('/:id', path)}"
+        with _calls_lock:
+            _calls[key] = _calls.get(key, 0) + 1
+
+        delay = CONFIG["latency_ms"] + random.uniform(0, CONFIG["jitter_ms"])
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+        auth_call = path in ("/oauth/v2/token", "/api/users/login")
+        if not auth_call and random.random() < CONFIG["error_rate"]:
+            return self._send(CONFIG["error_status"], {"message": "stub injected error"})
+
+        if path == "/oauth/v2/token":
+            return self._send(200, {"access_token": "stub-zoho-token", "expires_in": 3600})
+        if path == "/api/users/login":
+            return self._send(200, {"token": "stub-naa-token"})
+        if path.startswith("/crm/"):
+            return self._zoho(path, query, body)
+        if path.startswith("/api/cases"):
+            return self._naa(path, query)
+        return self._send(404, {"message": f"not found {path}"})
+
+    def _zoho(self, path, query, body):
+        if path.startswith("/crm/v7/files"):
+            return self._send(200, raw=_file_bytes(int(CONFIG["file_kb"] * 1024)))
+        if path.startswith("/crm/v8/Deals/search"):
+            return self._send(200, {"data": [{"Contact_Name": {"name": "Stub Client", "id": "1"}}]})
+        if path.startswith("/crm/v7/Appearances1"):
+            if self.command == "PUT":
+                rows = json.loads(body or b"{}").get("data", [])
+                return self._send(200, {"data": [
+                    {"code": "SUCCESS", "status": "success", "message": "record updated",
+                     "details": {"id": row.get("id", "")}}
+                    for row in rows
+                ]})
+            criteria = query.get("criteria", [""])[0]
+            fields = [f for f in query.get("fields", [""])[0].split(",") if f]
+
+            def rows(ids):
+                if not fields:
+                    return [record(i) for i in ids]
+                return [{k: v for k, v in record(i).items() if k in fields} for i in ids]
+
+            match = re.search(r"(?:^|\()(?:NAAM_Case)?id:equals:(\d+)", criteria, re.I)
+            if match:
+                return self._send(200, {"data": rows([int(match.group(1))])})
+            total = int(CONFIG["records"])
+            if "Modified_Time:greater_than" in criteria:
+                total = min(total, int(CONFIG["modified"]))
+            # like Zoho, pages past the first 2000 records need a page_token
+            token = query.get("page_token", [""])[0]
+            page = int(token[len("tok"):]) if token else int(query.get("page", ["1"])[0])
+            per_page = int(query.get("per_page", ["200"])[0])
+            if not token and (page - 1) * per_page >= 2000:
+                return self._send(400, {"code": "LIMIT_REACHED", "message": "use page_token"})
+            ids = range((page - 1) * per_page + 1, min(page * per_page, total) + 1)
+            if not ids:
+                return self._send(204)
+            more = page * per_page < total
+            info = {"page": page, "per_page": per_page, "more_records": more}
+            if more and page * per_page >= 2000:
+                info["next_page_token"] = f"tok{page + 1}"
+            return self._send(200, {"data": rows(ids), "info": info})
+        return self._send(404, {"message": f"not found {path}"})
+
+    def _naa(self, path, query):
+        match = re.match(r"/api/cases/(\d+)(/\w+)?$", path)
+        if match:
+            case_id, action = int(match.group(1)), match.group(2)
+            if action in ("/upload", "/cancel"):
+                return self._send(200, {"ok": True})
+            return self._send(200, case(case_id))
+        if self.command == "POST":
+            return self._send(200, {"id": random.randint(100000, 999999)})
+        total = int(CONFIG["records"])
+        page = int(query.get("Pager.PageIndex", ["1"])[0])
+        size = int(query.get("Pager.PageSize", ["25"])[0])
+        ids = range((page - 1) * size + 1, min(page * size, total) + 1)
+        return self._send(200, {"items": [case(i) for i in ids], "totalCount": total})
+
+    def _admin(self, path, body):
+        if path == "/_admin/config" and self.command == "POST":
+            CONFIG.update(json.loads(body or b"{}"))
+            return self._send(200, CONFIG)
+        if path == "/_admin/stats":
+            with _calls_lock:
+                return self._send(200, dict(_calls))
+        if path == "/_admin/reset" and self.command == "POST":
+            with _calls_lock:
+                _calls.clear()
+            return self._send(200, {})
+        return self._send(404, {"message": f"not found {path}"})
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _handle
+
+
+class Server(ThreadingHTTPServer):
+    # the default listen backlog of 5 drops connects under a few hundred
+    # concurrent clients, which then show up as 1s+ SYN retransmit stalls
+    request_queue_size = 1024
+
+
+def serve(port: int = 0, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    server = Server((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--latency-ms", type=float, default=CONFIG["latency_ms"])
+    parser.add_argument("--jitter-ms", type=float, default=CONFIG["jitter_ms"])
+    parser.add_argument("--error-rate", type=float, default=CONFIG["error_rate"])
+    parser.add_argument("--file-kb", type=float, default=CONFIG["file_kb"])
+    parser.add_argument("--records", type=int, default=CONFIG["records"])
+    args = parser.parse_args()
+    CONFIG.update(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        file_kb=args.file_kb,
+        records=args.records,
+    )
+    server = serve(args.port)
+    # the first line on stdout is the base URL, for the benchmark driver
+    print(f"http://127.0.0.1:{server.server_port}", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
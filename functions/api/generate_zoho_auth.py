@@ -1,16 +1,18 @@
 import os
-from dotenv import load_dotenv
-import requests
 import json
 
+from functions.helpers import http_client
+from functions.helpers.files import atomic_write_json
+from functions.helpers.retry import call_with_retry
+from functions.helpers.settings import get_settings
+
 # Path to your JSON creds file
 CONFIG_FILE = 'credentials/credentials.json'
 
-# Load CLIENT_ID, CLIENT_SECRET and REFRESH_TOKEN from .env
-load_dotenv(override=True)
-CLIENT_ID = os.getenv("ZOHO_CLIENT_ID")
-CLIENT_SECRET = os.getenv("ZOHO_CLIENT_SECRET")
-REFRESH_TOKEN = os.getenv("ZOHOCRM_REFRESH_TOKEN")
+# CLIENT_ID, CLIENT_SECRET and REFRESH_TOKEN come from .env via settings
+CLIENT_ID = get_settings().zoho_client_id
+CLIENT_SECRET = get_settings().zoho_client_secret
+REFRESH_TOKEN = get_settings().zoho_refresh_token
 
 
 def json_read_a_write(mode='r', new_json=None, json_file=CONFIG_FILE):
@@ -29,39 +31,58 @@ def json_read_a_write(mode='r', new_json=None, json_file=CONFIG_FILE):
         with open(json_file, 'r') as f:
             return json.load(f)
     elif mode == 'w' and isinstance(new_json, dict):
-        # Ensure directory exists
-        os.makedirs(os.path.dirname(json_file), exist_ok=True)
-        with open(json_file, 'w') as f:
-            json.dump(new_json, f, indent=4)
+        # temp file + rename, so other workers never read a half-written file
+        atomic_write_json(json_file, new_json)
         return new_json
     else:
         raise ValueError("Invalid arguments to json_read_a_write")
 
 
-def zoho_generate_authtoken(credential_file_name=CONFIG_FILE):
-    # 1) Load existing credentials JSON (will create file if missing)
-    creds = json_read_a_write(mode='r', json_file=credential_file_name)
+class ZohoAuthError(Exception):
+    """Raised when Zoho's token endpoint refuses to issue an access token."""
 
-    # 2) Hit Zoho’s token endpoint
-    resp = requests.post(
-        "https://accounts.zoho.com/oauth/v2/token",
-        params={
-            'client_id': CLIENT_ID,
-            'client_secret': CLIENT_SECRET,
-            'refresh_token': REFRESH_TOKEN,
-            'grant_type': 'refresh_token'
-        }
+
+def fetch_zoho_access_token():
+    """
+    Exchange the refresh token for a new access token.
+    Returns (access_token, expires_in_seconds); raises ZohoAuthError on failure.
+    """
+    url = f"{get_settings().zoho_accounts_url}/oauth/v2/token"
+    params = {
+        'client_id': CLIENT_ID,
+        'client_secret': CLIENT_SECRET,
+        'refresh_token': REFRESH_TOKEN,
+        'grant_type': 'refresh_token'
+    }
+    # refreshing is safe to repeat, so retry it like a GET
+    resp = call_with_retry(
+        "POST", url, lambda budget: http_client.send("POST", url, budget=budget, params=params), idempotent=True
     )
-    data = resp.json()
+    try:
+        data = resp.json()
+    except ValueError:
+        data = {}
 
-    # 3) Check for errors
     if resp.status_code != 200 or 'access_token' not in data:
         err = data.get('error_description') or data.get('error') or resp.text
-        return f"Error generating ZohoCRM access token: {err}"
+        raise ZohoAuthError(f"Error generating ZohoCRM access token: {err}")
+
+    return data['access_token'], data.get('expires_in')
+
+
+def zoho_generate_authtoken(credential_file_name=CONFIG_FILE):
+    # 1) Load existing credentials JSON (will create file if missing)
+    creds = json_read_a_write(mode='r', json_file=credential_file_name)
+
+    # 2) Hit Zoho’s token endpoint
+    try:
+        access_token, expires_in = fetch_zoho_access_token()
+    except ZohoAuthError as e:
+        return str(e)
 
-    # 4) Update our credentials file
-    creds['access_token'] = data['access_token']
-    creds['expires_in']  = data['expires_in']
+    # 3) Update our credentials file
+    creds['access_token'] = access_token
+    creds['expires_in'] = expires_in
     json_read_a_write(mode='w', new_json=creds, json_file=credential_file_name)
 
     return "Success generating ZohoCRM access token"
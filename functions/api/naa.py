@@ -1,14 +1,19 @@
-import os
+import contextvars
 import json
-from dotenv import load_dotenv
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from functions.helpers.constants import loginNAAPostUrl, getNAACasesUrl
 from functions.helpers.helpers import requestGet, requestPost,requestPut
+from functions.helpers.files import atomic_write_json
+from functions.helpers.settings import get_settings
+from functions.helpers.streaming import MultipartStream
+from functions.helpers.token_manager import TokenManager
 from functools import wraps
 from requests.exceptions import HTTPError
+from typing import Dict, Iterable, Iterator, Tuple
 
-load_dotenv(override=True)
-loginNAAEmail = os.getenv("NAA_EMAIL")
-loginNAAPassword = os.getenv("NAA_PASSWORD")
+loginNAAEmail = get_settings().naa_email
+loginNAAPassword = get_settings().naa_password
 
 # path for storing/reading the token
 _CRED_PATH = "credentials/naa_credentials.json"
@@ -21,53 +26,76 @@ def load_token(path: str = _CRED_PATH) -> str:
         return None
 
 def save_token(token: str, path: str = _CRED_PATH):
-    with open(path, "w") as f:
-        json.dump({"token": token}, f)
+    atomic_write_json(path, {"token": token})
 
 # login to NAA — returns raw token string
 def loginNAA() -> str:
     payload = {"email": loginNAAEmail, "password": loginNAAPassword}
-    response = requestPost(url=loginNAAPostUrl, payload=payload)
+    response = requestPost(url=loginNAAPostUrl, payload=payload, idempotent=True)
     return response.json()['token']
 
-# on import, try to load existing token, otherwise fetch + persist
-token = load_token()
-if not token:
-    token = loginNAA()
-    save_token(token)
+def _fetch_token():
+    # NAA doesn't report a lifetime; the manager falls back to the JWT's exp
+    return loginNAA(), None
 
-def reInit():
-    global token
-    token = loginNAA()
-    save_token(token)
+# shared across threads and gunicorn workers; logs in lazily on first use
+_tokens = TokenManager("naa", _CRED_PATH, _fetch_token, token_key="token")
+
+def get_token() -> str:
+    return _tokens.get_token()
+
+def token_stats() -> dict:
+    return _tokens.stats()
+
+def reInit(stale: str = None):
+    return _tokens.invalidate(stale if stale is not None else _tokens.get_token())
+
+def _auth_failure(e: HTTPError):
+    """
+    The error dict to return for `e`, or None when NAA rejected the token and
+    the call should be retried with a fresh one. Shared with naa_async.
+    """
+    # try to parse JSON body
+    try:
+        err = e.response.json()
+    except Exception:
+        return {'error': str(e), 'statusCode':e.response.status_code if e.response.status_code else 500}
+    if isinstance(err, dict) and err.get("title") == "Unauthorized":
+        return None
+    return {'error': str(e),'statusCode': e.response.status_code}
 
 # decorator to auto-refresh on 401 Unauthorized
 def ensure_authorized(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
+        used = get_token()
         try:
             return func(*args, **kwargs)
         except HTTPError as e:
-            # try to parse JSON body
-            try:
-                err = e.response.json()
-            except Exception:
-                return {'error': str(e), 'statusCode':e.response.status_code if e.response.status_code else 500}
-            if err.get("title") == "Unauthorized":
-                # refresh token and retry once
-                reInit()
-                return func(*args, **kwargs)
-            # otherwise re-raise
-            return {'error': str(e),'statusCode': e.response.status_code}
-        
+            failure = _auth_failure(e)
+            if failure is not None:
+                return failure
+            # refresh token (once across workers) and retry once
+            reInit(used)
+            return func(*args, **kwargs)
+
     return wrapper
 
+def _auth_headers(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+def _upload_result(response, caseID: int) -> dict:
+    if(response.status_code == 200):
+        return {'response': 'success in uploadFile for caseID: '+str(caseID),'statusCode':200}
+    else:
+        return {'error': f"Failed to upload file for caseID {caseID}: {response.text}"}
+
 @ensure_authorized
 def getNAACases(pageIndex: int = None, pageSize: int = None) -> dict:
     pageIndex = 1 if pageIndex is None else pageIndex
     pageSize = 25 if pageSize is None else pageSize
 
-    headers = {"Authorization": f"Bearer {token}"}
+    headers = _auth_headers(get_token())
     params = {
         "Pager.PageIndex": pageIndex,
         "Pager.PageSize": pageSize,
@@ -76,23 +104,98 @@ def getNAACases(pageIndex: int = None, pageSize: int = None) -> dict:
     response = requestGet(url=getNAACasesUrl, headers=headers, params=params)
     return response.json()
 
+def _page_items(page) -> list:
+    if isinstance(page, list):
+        return page
+    return page.get("items") or []
+
+def iterNAACases(pageSize: int = None, prefetch: int = None) -> Iterator[dict]:
+    """
+    Yield every NAA case, one page of `pageSize` (NAA_PAGE_SIZE) at a time.
+    While a page is being consumed the next `prefetch` (NAA_PREFETCH_PAGES,
+    at least 1) pages are fetched in the background, so at most prefetch + 1
+    pages are held in memory. Raises HTTPError if a page cannot be fetched.
+    """
+    settings = get_settings()
+    pageSize = settings.naa_page_size if pageSize is None else pageSize
+    prefetch = max(1, settings.naa_prefetch_pages if prefetch is None else prefetch)
+
+    def _fetch(pageIndex: int):
+        page = getNAACases(pageIndex, pageSize)
+        if isinstance(page, dict) and "error" in page:
+            raise HTTPError(page["error"], response=page)
+        return page
+
+    first = _fetch(1)
+    items = _page_items(first)
+    total = first.get("totalCount") if isinstance(first, dict) else None
+    # without a total the listing ends at the first short page
+    lastPage = -(-total // pageSize) if isinstance(total, int) else None
+    if (lastPage is not None and lastPage <= 1) or (lastPage is None and len(items) < pageSize):
+        yield from items
+        return
+
+    ctx = contextvars.copy_context()
+    pool = ThreadPoolExecutor(max_workers=prefetch)
+    pending = deque()
+    nextPage = 2
+
+    def _schedule():
+        nonlocal nextPage
+        while len(pending) < prefetch and (lastPage is None or nextPage <= lastPage):
+            pending.append(pool.submit(ctx.copy().run, _fetch, nextPage))
+            nextPage += 1
+
+    try:
+        _schedule()
+        yield from items
+        while pending:
+            items = _page_items(pending.popleft().result())
+            if lastPage is None and len(items) < pageSize:
+                # past the end: drop the speculative fetches
+                for future in pending:
+                    future.cancel()
+                pending.clear()
+            else:
+                _schedule()
+            yield from items
+    finally:
+        for future in pending:
+            future.cancel()
+        pool.shutdown(wait=False)
+
+def getCaseStatusIndex(caseIDs: Iterable = None) -> Dict[str, Tuple[int, str]]:
+    """
+    One paged sweep of NAA as ``str(caseID) -> (caseStatus, detailedResults)``,
+    keeping only `caseIDs` when given. Cases listed without a status or
+    without detailedResults are left out, so callers fall back to getCaseByID
+    for them rather than overwrite Zoho's Results with a blank.
+    """
+    wanted = None if caseIDs is None else {str(c) for c in caseIDs}
+    index = {}
+    for case in iterNAACases():
+        caseID = str(case.get("id"))
+        if "caseStatus" not in case or "detailedResults" not in case:
+            continue
+        if wanted is not None and caseID not in wanted:
+            continue
+        index[caseID] = (case["caseStatus"], case["detailedResults"])
+    return index
+
 @ensure_authorized
 def getCaseByID(caseID: int) -> dict:
-    headers = {"Authorization": f"Bearer {token}"}
     url = f"{getNAACasesUrl}/{caseID}"
-    response = requestGet(url=url, headers=headers)
+    response = requestGet(url=url, headers=_auth_headers(get_token()))
     return response.json()
 
 @ensure_authorized
 def closeCase(caseID: int) -> dict:
-    headers = {"Authorization": f"Bearer {token}"}
     url = f"{getNAACasesUrl}/{caseID}/cancel"
-    response = requestPut(url=url, headers=headers)
+    response = requestPut(url=url, headers=_auth_headers(get_token()))
     return 'success in closeCase for caseID: '+str(caseID)
 
 @ensure_authorized
 def uploadFile(caseID: int, file_bytes: bytes, filename: str = "document.pdf") -> dict:
-    headers = {"Authorization": f"Bearer {token}"}
     url = f"{getNAACasesUrl}/{caseID}/upload"
 
     files = {
@@ -101,17 +204,26 @@ def uploadFile(caseID: int, file_bytes: bytes, filename: str = "document.pdf") -
     response = requestPost(
         url,
         files=files,
-        headers=headers
+        headers=_auth_headers(get_token())
     )
-    if(response.status_code == 200):
-        return {'response': 'success in uploadFile for caseID: '+str(caseID),'statusCode':200}
-    else:
-        return {'error': f"Failed to upload file for caseID {caseID}: {response.text}"}
-    
+    return _upload_result(response, caseID)
 
 
 @ensure_authorized
-def postCase(
+def uploadFileStream(caseID: int, fileobj, size: int, filename: str = "document.pdf") -> dict:
+    """
+    Same as uploadFile, but streams `size` bytes from the seekable `fileobj`
+    as the multipart body instead of building it in memory.
+    """
+    fileobj.seek(0)
+    body = MultipartStream("file", filename, fileobj, size, "application/pdf")
+    headers = {**_auth_headers(get_token()), "Content-Type": body.content_type}
+    url = f"{getNAACasesUrl}/{caseID}/upload"
+    response = requestPost(url, data=body, headers=headers)
+    return _upload_result(response, caseID)
+
+
+def _case_body(
         outCourtState: str,
         outCourtCounty: str,
         outCourtCity: str,
@@ -129,8 +241,11 @@ def postCase(
         caseNumber: str
         
     ) -> dict:
-    headers = {"Authorization": f"Bearer {token}"}
-    body = {
+    """
+    The postCase request body. Its signature is postCase's: every field is
+    required, and naa_async.postCase takes the same arguments.
+    """
+    return {
         "outCourtState": outCourtState,
         "outCourtCounty": outCourtCounty,
         "outCourtCity": outCourtCity,
@@ -147,7 +262,11 @@ def postCase(
         "caseClientName": caseClientName,
         "caseNumber": caseNumber
     }
+
+@ensure_authorized
+def postCase(**fields) -> dict:
+    """Create an NAA case; takes _case_body's arguments."""
     url = getNAACasesUrl
-    response = requestPost(url=url, headers=headers, payload=body)
+    response = requestPost(url=url, headers=_auth_headers(get_token()), payload=_case_body(**fields))
     return response.json()  # Return the response only if successful
 
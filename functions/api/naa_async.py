@@ -0,0 +1,93 @@
+import asyncio
+
+from functions.api.naa import _auth_failure, _auth_headers, _case_body, _tokens, _upload_result
+from functions.helpers.async_helpers import requestGetAsync, requestPostAsync, requestPutAsync
+from functions.helpers.constants import getNAACasesUrl
+from functions.helpers.streaming import MultipartStream
+from functools import wraps
+from requests.exceptions import HTTPError
+
+# asyncio versions of the naa.py calls used by the create, close and upload
+# endpoints; same token manager, request bodies and return shapes as naa.py.
+
+
+async def get_token() -> str:
+    return await _tokens.get_token_async()
+
+
+# decorator to auto-refresh on 401 Unauthorized
+def ensure_authorized(func):
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        used = await get_token()
+        try:
+            return await func(*args, **kwargs)
+        except HTTPError as e:
+            failure = _auth_failure(e)
+            if failure is not None:
+                return failure
+            # refresh token (once across workers) and retry once
+            await _tokens.invalidate_async(used)
+            return await func(*args, **kwargs)
+
+    return wrapper
+
+
+@ensure_authorized
+async def getCaseByID(caseID: int) -> dict:
+    url = f"{getNAACasesUrl}/{caseID}"
+    response = await requestGetAsync(url=url, headers=_auth_headers(await get_token()))
+    return response.json()
+
+
+@ensure_authorized
+async def closeCase(caseID: int) -> dict:
+    url = f"{getNAACasesUrl}/{caseID}/cancel"
+    await requestPutAsync(url=url, headers=_auth_headers(await get_token()))
+    return 'success in closeCase for caseID: ' + str(caseID)
+
+
+@ensure_authorized
+async def uploadFile(caseID: int, file_bytes: bytes, filename: str = "document.pdf") -> dict:
+    url = f"{getNAACasesUrl}/{caseID}/upload"
+    files = {"file": (filename, file_bytes, "application/pdf")}
+    response = await requestPostAsync(url, files=files, headers=_auth_headers(await get_token()))
+    return _upload_result(response, caseID)
+
+
+async def _iter_body(body: MultipartStream):
+    # a spool past DOC_SPOOL_THRESHOLD is on disk: read it off the loop
+    await asyncio.to_thread(body.rewind)
+    parts = iter(body)
+    while True:
+        chunk = await asyncio.to_thread(next, parts, None)
+        if chunk is None:
+            break
+        yield chunk
+
+
+@ensure_authorized
+async def uploadFileStream(caseID: int, fileobj, size: int, filename: str = "document.pdf") -> dict:
+    """
+    Same as uploadFile, but streams `size` bytes from the seekable `fileobj`
+    as the multipart body instead of building it in memory.
+    """
+    fileobj.seek(0)
+    body = MultipartStream("file", filename, fileobj, size, "application/pdf")
+    headers = {
+        **_auth_headers(await get_token()),
+        "Content-Type": body.content_type,
+        "Content-Length": str(len(body)),
+    }
+    url = f"{getNAACasesUrl}/{caseID}/upload"
+    response = await requestPostAsync(url, content=lambda: _iter_body(body), headers=headers)
+    return _upload_result(response, caseID)
+
+
+@ensure_authorized
+async def postCase(**fields) -> dict:
+    """Create an NAA case; takes naa._case_body's arguments."""
+    response = await requestPostAsync(
+        url=getNAACasesUrl, headers=_auth_headers(await get_token()), payload=_case_body(**fields)
+    )
+    return response.json()
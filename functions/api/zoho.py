@@ -1,54 +1,76 @@
-import os
-from dotenv import load_dotenv
+from functions.case_mapping import ZOHO_CASE_FIELDS
 from functions.helpers.helpers import requestGet, requestPut
-from functions.api.generate_zoho_auth import zoho_generate_authtoken
+from functions.api.generate_zoho_auth import CONFIG_FILE, fetch_zoho_access_token
+from functions.helpers.cache import cached, invalidate
+from functions.helpers.log import get_logger
+from functions.helpers.rate_limit import acquire, rate_limited
+from functions.helpers.settings import get_settings
+from functions.helpers.streaming import copy_response_to
+from functions.helpers.token_manager import TokenManager
 import json
+from datetime import datetime, timezone
 from functools import wraps
 from requests.exceptions import HTTPError
-from typing import Any, Dict
+from typing import Any, Dict, Iterator
+
+logger = get_logger(__name__)
+
+
+def _status_code(response) -> int:
+    """statusCode from either a requests.Response or our error-dict responses."""
+    if isinstance(response, dict):
+        return response.get("statusCode", 500)
+    return getattr(response, "status_code", None) or 500
+
+
+def _auth_failure(e: HTTPError):
+    """
+    The error dict to return for `e`, or None when Zoho rejected the access
+    token and the call should be retried with a fresh one. Shared with
+    zoho_async's decorator.
+    """
+    # try to parse JSON body
+    try:
+        err = e.response.json()
+    except ZohoApiError as zerr:
+        return {"error": str(zerr), "statusCode": zerr["statusCode"]}
+    except Exception:
+        return {"error": str(e), "statusCode": _status_code(e.response)}
+    message = err.get("message") if isinstance(err, dict) else None
+    if "invalid oauth token" in (message or ""):
+        return None
+    return {"error": str(e), "statusCode": _status_code(e.response)}
 
 
 # decorator to auto-refresh on 401 Unauthorized
 def ensure_authorized(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
+        used = get_token()
         try:
             return func(*args, **kwargs)
         except HTTPError as e:
-            # try to parse JSON body
-            try:
-                err = e.response.json()
-            except ZohoApiError as zerr:
-                return {"error": str(zerr), "statusCode": zerr["statusCode"]}
-            except Exception:
-                return {"error": str(e), "statusCode": e.response["statusCode"]}
-            if "invalid oauth token" in err.get("message"):
-                # refresh token and retry once
-                reInit()
-                return func(*args, **kwargs)
-            # otherwise re-raise
-            return {"error": str(e), "statusCode": e.response["statusCode"]}
+            failure = _auth_failure(e)
+            if failure is not None:
+                return failure
+            # refresh token (once across workers) and retry once
+            reInit(used)
+            return func(*args, **kwargs)
 
     return wrapper
 
 
+def _auth_headers(token: str) -> dict:
+    return {"Authorization": f"Zoho-oauthtoken {token}"}
+
+
 def initConfig(path: str = "credentials/credentials.json") -> dict:
     with open(path, "r") as f:
         return json.load(f)
 
 
-load_dotenv(override=True)
-ZOHO_CLIENT_ID = os.getenv("ZOHO_CLIENT_ID")
-ZOHO_CLIENT_SECRET = os.getenv("ZOHO_CLIENT_SECRET")
-ZOHO_REDEIRECT_URI = os.getenv("ZOHO_REDIRECT_URI")
-ZOHO_SCOPES = os.getenv("ZOHO_SCOPES")
-ZOHO_REFRESH_TOKEN = os.getenv("ZOHOCRM_REFRESH_TOKEN")
-ZOHO_API_DOMAIN = os.getenv("ZOHO_API_DOMAIN")
-ZOHO_TOKEN_TYPE = os.getenv("ZOHO_TOKEN_TYPE")
-ZOHO_EXPIRES_IN = os.getenv("ZOHO_EXPIRES_IN")
-ZOHOCRM_ACCESS_TOKEN = os.getenv("ZOHOCRM_ACCESS_TOKEN")
-ZOHOCRM_EXPIRES_IN = os.getenv("ZOHOCRM_EXPIRES_IN")
-ACCESS_TOKEN = os.getenv("ACCESS_TOKEN")
+ZOHO_API_DOMAIN = get_settings().zoho_api_domain
+ACCESS_TOKEN = get_settings().zoho_access_token
 
 
 MODULE_API_NAME = "Appearances1"
@@ -57,16 +79,26 @@ baseUrlMatters = f"{ZOHO_API_DOMAIN}/crm/v8/Deals/search?criteria=(id:equals:"
 filesUrl = f"{ZOHO_API_DOMAIN}/crm/v7/files?id="
 
 
-def reInit():
-    global ZOHO_CLIENT_ID, ZOHO_CLIENT_SECRET, ZOHO_REDEIRECT_URI
-    global ZOHO_SCOPES, ZOHO_REFRESH_TOKEN, ZOHO_API_DOMAIN
-    global ZOHO_TOKEN_TYPE, ZOHO_EXPIRES_IN
-    global ZOHOCRM_ACCESS_TOKEN, ZOHOCRM_EXPIRES_IN
-    global ACCESS_TOKEN
+# shared across threads and gunicorn workers; refreshed ahead of expiry
+_tokens = TokenManager(
+    "zoho",
+    CONFIG_FILE,
+    fetch_zoho_access_token,
+    token_key="access_token",
+    initial_token=ACCESS_TOKEN,
+)
+
+
+def get_token() -> str:
+    return _tokens.get_token()
+
+
+def token_stats() -> dict:
+    return _tokens.stats()
 
-    zoho_generate_authtoken()
-    cred = initConfig()
-    ACCESS_TOKEN = cred["access_token"]
+
+def reInit(stale: str = None):
+    return _tokens.invalidate(stale if stale is not None else _tokens.get_token())
 
 
 class ZohoApiError(HTTPError):
@@ -77,25 +109,21 @@ class ZohoApiError(HTTPError):
         super().__init__(message, response=response)
 
 
-@ensure_authorized
-def searchZohoRecords(matterID: int) -> Dict[str, Any]:
-    """
-    Look up a Zoho record by its ID.
-
-    Raises
-    ------
-    ZohoApiError
-        If the HTTP status is anything other than 200 OK, or if the body
-        can’t be parsed as JSON.
-    """
-    headers = {"Authorization": f"Zoho-oauthtoken {ACCESS_TOKEN}"}
-    url = f"{baseUrl}search?criteria=id:equals:{matterID}"
+SYNC_STATUSES = ("Submitted", "Dead", "New")
+SYNC_FIELDS = ("id", "NAAM_CaseID", "NAAM_Results", "Results")
+# what create (the case mapping and the Matter lookup), close and sync read
+# from a record; searchZohoRecords fetches nothing else
+RECORD_FIELDS = tuple(dict.fromkeys(("Matter", *SYNC_FIELDS, *ZOHO_CASE_FIELDS)))
 
-    response = requestGet(headers=headers, url=url)
 
+def _search_result(response, what: str) -> Dict[str, Any]:
+    """
+    The parsed body of a search response. Raises ZohoApiError on 204 (no
+    match) or a body that isn't JSON; `what` names the search in the error.
+    """
     # ––– 1. Enforce exact-200 success –––––––––––––––––––––––––––––––––––
     if response.status_code == 204:
-        resString = f"Zoho search failed (HTTP {response.status_code}): empty response from search zohoRecords for matterID {matterID}"
+        resString = f"Zoho search failed (HTTP {response.status_code}): empty response from {what}"
         raise ZohoApiError(resString, response={"error": resString, "statusCode": 409})
 
     # ––– 2. Parse JSON safely –––––––––––––––––––––––––––––––––––––––––––
@@ -109,8 +137,22 @@ def searchZohoRecords(matterID: int) -> Dict[str, Any]:
         ) from exc
 
 
+def _record_search(matterID: int) -> dict:
+    """url and params for searchZohoRecords."""
+    return {
+        "url": f"{baseUrl}search?criteria=id:equals:{matterID}",
+        "params": {"fields": ",".join(RECORD_FIELDS)},
+    }
+
+
+def _case_id_update(caseID) -> dict:
+    return {"data": [{"NAAM_CaseID": caseID}]}
+
+
+@cached("record")
 @ensure_authorized
-def searchZohoContacts(matterID: str) -> Dict[str, Any]:
+@rate_limited("zoho_read")
+def searchZohoRecords(matterID: int) -> Dict[str, Any]:
     """
     Look up a Zoho record by its ID.
 
@@ -120,98 +162,234 @@ def searchZohoContacts(matterID: str) -> Dict[str, Any]:
         If the HTTP status is anything other than 200 OK, or if the body
         can’t be parsed as JSON.
     """
-    headers = {"Authorization": f"Zoho-oauthtoken {ACCESS_TOKEN}"}
-    url = f"{baseUrlMatters}{matterID})"
+    response = requestGet(headers=_auth_headers(get_token()), **_record_search(matterID))
+    return _search_result(response, f"search zohoRecords for matterID {matterID}")
 
-    response = requestGet(headers=headers, url=url)
 
-    # ––– 1. Enforce exact-200 success –––––––––––––––––––––––––––––––––––
-    if response.status_code == 204:
-        resString = f"Zoho search failed (HTTP {response.status_code}): empty response from search zoho contacts for {matterID}"
-        raise ZohoApiError(resString, response={"error": resString, "statusCode": 409})
+@cached("contact")
+@ensure_authorized
+@rate_limited("zoho_read")
+def searchZohoContacts(matterID: str) -> Dict[str, Any]:
+    """
+    Look up a Zoho record by its ID.
 
-    # ––– 2. Parse JSON safely –––––––––––––––––––––––––––––––––––––––––––
-    try:
-        return response.json()
-    except (json.JSONDecodeError, ValueError) as exc:
-        # 200 with an empty body (204 scenario) triggers this
-        resString = f"Zoho search returned invalid JSON: {exc} — body: {response.text}"
-        raise ZohoApiError(
-            resString, response={"error": resString, "statusCode": 500}
-        ) from exc
+    Raises
+    ------
+    ZohoApiError
+        If the HTTP status is anything other than 200 OK, or if the body
+        can’t be parsed as JSON.
+    """
+    response = requestGet(headers=_auth_headers(get_token()), url=f"{baseUrlMatters}{matterID})")
+    return _search_result(response, f"search zoho contacts for {matterID}")
 
 
 # add case id to zoho record
 @ensure_authorized
+@rate_limited("zoho_write")
 def addCaseIDToZohoRecord(matterID: int, caseID: int) -> dict:
-    formatToken = f"Zoho-oauthtoken {ACCESS_TOKEN}"
-    headers = {"Authorization": formatToken}
-    data = {
-        "data": [
-            {
-                "NAAM_CaseID": caseID,
-            }
-        ]
-    }
     url = f"{baseUrl}{matterID}"
-    response = requestPut(headers=headers, url=url, data=data)
+    response = requestPut(headers=_auth_headers(get_token()), url=url, data=_case_id_update(caseID))
+    invalidate("record", matterID)
     return response.json()
 
 
 @ensure_authorized
+@rate_limited("zoho_write")
 def updateResults(matterID: int, result: str, detailed_results: str) -> dict:
-    formatToken = f"Zoho-oauthtoken {ACCESS_TOKEN}"
+    formatToken = f"Zoho-oauthtoken {get_token()}"
     headers = {"Authorization": formatToken}
     data = {"data": [{"NAAM_Results": result, "Results": detailed_results}]}
-    print(f"data: {data}")
+    logger.debug("updating results", extra={"matterID": matterID, "data": data, "sample": True})
     url = f"{baseUrl}{matterID}"
     response = requestPut(headers=headers, url=url, data=data)
+    invalidate("record", matterID)
+    return response.json()
+
+
+BULK_UPDATE_LIMIT = 100
+
+
+@ensure_authorized
+@rate_limited("zoho_write")
+def _putRecords(rows: list) -> dict:
+    formatToken = f"Zoho-oauthtoken {get_token()}"
+    headers = {"Authorization": formatToken}
+    url = baseUrl.rstrip("/")
+    response = requestPut(headers=headers, url=url, data={"data": rows})
     return response.json()
 
 
+def updateResultsBulk(updates: list) -> Dict[str, Dict[str, Any]]:
+    """
+    Write NAAM_Results/Results for many matters using the module's
+    multi-record update, at most BULK_UPDATE_LIMIT records per call.
+
+    `updates` is a list of ``(matterID, result, detailed_results)`` tuples.
+    Returns ``{str(matterID): {"ok": bool, "code": ..., "message": ...}}``
+    built from Zoho's per-record responses; a failed call marks every
+    matter in that chunk with the call's error.
+    """
+    outcome = {}
+    for start in range(0, len(updates), BULK_UPDATE_LIMIT):
+        chunk = updates[start:start + BULK_UPDATE_LIMIT]
+        rows = [
+            {"id": str(matterID), "NAAM_Results": result, "Results": detailed_results}
+            for matterID, result, detailed_results in chunk
+        ]
+        logger.info("bulk results update", extra={"records": len(rows)})
+        try:
+            res = _putRecords(rows)
+        except Exception as e:
+            # transport/rate-limit failures only fail this chunk
+            res = {"error": str(e), "statusCode": 500}
+        for matterID, _, _ in chunk:
+            invalidate("record", matterID)
+
+        if "error" in res:
+            for matterID, _, _ in chunk:
+                outcome[str(matterID)] = {
+                    "ok": False,
+                    "code": res.get("statusCode", 500),
+                    "message": res["error"],
+                }
+            continue
+
+        # Zoho answers in request order; prefer the echoed id when present
+        for (matterID, _, _), item in zip(chunk, res.get("data", [])):
+            key = str((item.get("details") or {}).get("id") or matterID)
+            outcome[key] = {
+                "ok": item.get("status") == "success",
+                "code": item.get("code"),
+                "message": item.get("message"),
+            }
+        for matterID, _, _ in chunk:
+            outcome.setdefault(
+                str(matterID),
+                {"ok": False, "code": None, "message": "missing from Zoho response"},
+            )
+    return outcome
+
+
+def _zoho_datetime(timestamp: float) -> str:
+    """A Unix time in the ISO 8601 form Zoho criteria expect."""
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat(timespec="seconds")
+
+
+SEARCH_PAGE_SIZE = 200  # Zoho's per_page maximum
+
+
+def _sync_criteria(modifiedSince: float = None) -> str:
+    criteria = "(" + "or".join(
+        f"(Submission_Status:equals:{status})" for status in SYNC_STATUSES
+    ) + ")"
+    if modifiedSince is not None:
+        criteria = f"({criteria}and(Modified_Time:greater_than:{_zoho_datetime(modifiedSince)}))"
+    return criteria
+
+
 @ensure_authorized
+def _searchPage(criteria: str, fields: tuple, page: int, per_page: int, page_token: str = None) -> dict:
+    headers = {"Authorization": f"Zoho-oauthtoken {get_token()}"}
+    params = {"criteria": criteria, "fields": ",".join(fields), "per_page": per_page}
+    if page_token:
+        params["page_token"] = page_token
+    else:
+        params["page"] = page
+    acquire("zoho_read")
+    response = requestGet(headers=headers, url=f"{baseUrl}search", params=params)
+    if response.status_code == 204:
+        return {"data": [], "info": {}}
+    return response.json()
+
+
+def iterSearch(criteria: str, fields: tuple = SYNC_FIELDS, per_page: int = SEARCH_PAGE_SIZE) -> Iterator[dict]:
+    """
+    Yield every appearance matching `criteria`, reduced to `fields` (the only
+    fields requested from Zoho), one page at a time. Follows
+    info.more_records, switching to info.next_page_token when Zoho hands one
+    out for deep result sets, and stops at an empty (or 204) page even if
+    Zoho claims there are more. Each page is parsed once. Raises
+    ZohoApiError if a page cannot be fetched.
+    """
+    page, token = 1, None
+    while True:
+        body = _searchPage(criteria, fields, page, per_page, token)
+        if "error" in body:
+            raise ZohoApiError(body["error"], response=body)
+        data = body.get("data") or []
+        for rec in data:
+            yield {field: rec.get(field) for field in fields}
+        info = body.get("info") or {}
+        if not data or not info.get("more_records"):
+            return
+        token = info.get("next_page_token")
+        page += 1
+
+
+def iterSyncIds(modifiedSince: float = None) -> Iterator[str]:
+    """The ids of every Submitted, Dead or New appearance, as a stream."""
+    for rec in iterSearch(_sync_criteria(modifiedSince), fields=("id",)):
+        yield rec["id"]
+
+
 def getListOfSyncIds() -> dict:
-    formatToken = f"Zoho-oauthtoken {ACCESS_TOKEN}"
+    """Returns ``{"response": [id, ...]}`` for every appearance the sync covers."""
+    try:
+        return {"response": list(iterSyncIds())}
+    except HTTPError as e:
+        return {"error": str(e), "statusCode": _status_code(e.response)}
 
-    headers = {"Authorization": formatToken}
-    # url = f"{baseUrl}search?criteria=id:equals:{matterID}"
-    urlSubmit = f"{baseUrl}search?criteria=Submission_Status:equals:Submitted"
-
-    submittedResponse = requestGet(headers=headers, url=urlSubmit)
-
-    submittedResponses = []
-    submittedResponses = (
-        [response["id"] for response in submittedResponse.json()["data"]]
-        if len(submittedResponse.json()["data"]) > 0
-        else []
-    )
-
-    urlDead = f"{baseUrl}search?criteria=Submission_Status:equals:Dead"
-    deadResponse = requestGet(headers=headers, url=urlDead)
-    deadResponses = []
-    deadResponses = (
-        [response["id"] for response in deadResponse.json()["data"]]
-        if len(deadResponse.json()["data"]) > 0
-        else []
-    )
-
-    urlNew = f"{baseUrl}search?criteria=Submission_Status:equals:New"
-    newResponse = requestGet(headers=headers, url=urlNew)
-    newResponses = []
-    newResponses = (
-        [response["id"] for response in newResponse.json()["data"]]
-        if len(newResponse.json()["data"]) > 0
-        else []
-    )
-
-    return {"response": submittedResponses + deadResponses + newResponses}
+
+def listSyncRecords(per_page: int = SEARCH_PAGE_SIZE, modifiedSince: float = None) -> dict:
+    """
+    Fetch every appearance the sync cares about (Submitted, Dead or New),
+    keeping only the fields the sync reads. With `modifiedSince` (a Unix
+    time), only those Zoho modified after it.
+
+    Returns ``{"response": [{"id", "NAAM_CaseID", "NAAM_Results", "Results"}, ...]}``.
+    """
+    try:
+        return {"response": list(iterSearch(_sync_criteria(modifiedSince), SYNC_FIELDS, per_page))}
+    except HTTPError as e:
+        return {"error": str(e), "statusCode": _status_code(e.response)}
+
+
+def findSyncRecordsByCaseID(caseID: int) -> dict:
+    """
+    The appearances linked to NAA case `caseID`, with the SYNC_FIELDS only.
+    Returns ``{"response": [...]}`` (empty when none link it).
+    """
+    try:
+        return {"response": list(iterSearch(f"(NAAM_CaseID:equals:{caseID})"))}
+    except HTTPError as e:
+        return {"error": str(e), "statusCode": _status_code(e.response)}
 
 
 # add case id to zoho record
 @ensure_authorized
+@rate_limited("zoho_file")
 def getFileFromZoho(fileId: str) -> dict:
-    formatToken = f"Zoho-oauthtoken {ACCESS_TOKEN}"
+    formatToken = f"Zoho-oauthtoken {get_token()}"
     headers = {"Authorization": formatToken}
     url = f"{filesUrl}{fileId}"
     response = requestGet(headers=headers, url=url)
     return {"statusCode": response.status_code, "response": response.content}
+
+
+@ensure_authorized
+@rate_limited("zoho_file")
+def downloadFileFromZoho(fileId: str, dest) -> dict:
+    """
+    Stream a Zoho file into the writable binary file object `dest` without
+    holding the whole document in memory. `dest` is rewound and truncated
+    first so a token-refresh retry starts from a clean file.
+    """
+    formatToken = f"Zoho-oauthtoken {get_token()}"
+    headers = {"Authorization": formatToken}
+    url = f"{filesUrl}{fileId}"
+    dest.seek(0)
+    dest.truncate()
+    response = requestGet(headers=headers, url=url, stream=True)
+    size = copy_response_to(response, dest)
+    dest.seek(0)
+    return {"statusCode": response.status_code, "size": size}
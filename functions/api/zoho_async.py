@@ -0,0 +1,112 @@
+import asyncio
+
+from functions.api.zoho import (
+    _auth_failure,
+    _auth_headers,
+    _case_id_update,
+    _record_search,
+    _search_result,
+    _tokens,
+    baseUrl,
+    baseUrlMatters,
+    filesUrl,
+)
+from functions.helpers.async_helpers import requestGetAsync, requestPutAsync
+from functions.helpers.cache import cached_async, invalidate_async
+from functions.helpers.log import get_logger
+from functions.helpers.rate_limit import rate_limited_async
+from functions.helpers.streaming import CHUNK_SIZE
+from functools import wraps
+from requests.exceptions import HTTPError
+from typing import Any, Dict
+
+logger = get_logger(__name__)
+
+# asyncio versions of the zoho.py calls used by the create, close and upload
+# endpoints. They share zoho.py's URLs, request and response helpers, token
+# manager, lookup cache and rate limit buckets, and return the same shapes.
+
+
+async def get_token() -> str:
+    return await _tokens.get_token_async()
+
+
+# decorator to auto-refresh on 401 Unauthorized
+def ensure_authorized(func):
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        used = await get_token()
+        try:
+            return await func(*args, **kwargs)
+        except HTTPError as e:
+            failure = _auth_failure(e)
+            if failure is not None:
+                return failure
+            # refresh token (once across workers) and retry once
+            await _tokens.invalidate_async(used)
+            return await func(*args, **kwargs)
+
+    return wrapper
+
+
+@cached_async("record")
+@ensure_authorized
+@rate_limited_async("zoho_read")
+async def searchZohoRecords(matterID: int) -> Dict[str, Any]:
+    response = await requestGetAsync(headers=_auth_headers(await get_token()), **_record_search(matterID))
+    return _search_result(response, f"search zohoRecords for matterID {matterID}")
+
+
+@cached_async("contact")
+@ensure_authorized
+@rate_limited_async("zoho_read")
+async def searchZohoContacts(matterID: str) -> Dict[str, Any]:
+    response = await requestGetAsync(headers=_auth_headers(await get_token()), url=f"{baseUrlMatters}{matterID})")
+    return _search_result(response, f"search zoho contacts for {matterID}")
+
+
+@ensure_authorized
+@rate_limited_async("zoho_write")
+async def addCaseIDToZohoRecord(matterID: int, caseID: int) -> dict:
+    url = f"{baseUrl}{matterID}"
+    response = await requestPutAsync(headers=_auth_headers(await get_token()), url=url, data=_case_id_update(caseID))
+    await invalidate_async("record", matterID)
+    return response.json()
+
+
+@ensure_authorized
+@rate_limited_async("zoho_file")
+async def getFileFromZoho(fileId: str) -> dict:
+    headers = _auth_headers(await get_token())
+    url = f"{filesUrl}{fileId}"
+    response = await requestGetAsync(headers=headers, url=url)
+    return {"statusCode": response.status_code, "response": response.content}
+
+
+def _clear(dest) -> None:
+    dest.seek(0)
+    dest.truncate()
+
+
+@ensure_authorized
+@rate_limited_async("zoho_file")
+async def downloadFileFromZoho(fileId: str, dest) -> dict:
+    """
+    Stream a Zoho file into the writable binary file object `dest`, chunk by
+    chunk. `dest` is rewound and truncated first so a token-refresh retry
+    starts from a clean file. Writes run in a thread: past
+    DOC_SPOOL_THRESHOLD the spool is a file on disk.
+    """
+    headers = _auth_headers(await get_token())
+    url = f"{filesUrl}{fileId}"
+    await asyncio.to_thread(_clear, dest)
+    response = await requestGetAsync(headers=headers, url=url, stream=True)
+    size = 0
+    try:
+        async for chunk in response.aiter_bytes(CHUNK_SIZE):
+            await asyncio.to_thread(dest.write, chunk)
+            size += len(chunk)
+    finally:
+        await response.aclose()
+    dest.seek(0)
+    return {"statusCode": response.status_code, "size": size}
@@ -0,0 +1,131 @@
+from dataclasses import dataclass, fields as dataclass_fields
+from typing import Callable
+
+# How a Zoho appearance (Appearances1 record) becomes an NAA postCase call.
+# Each row is (postCase argument, Zoho field, transform, required): a dotted
+# field follows a lookup ("County2.name"), and the transform, if any, gets the
+# raw value. caseClientName comes from the matter's contact, not the record,
+# and CASE_CONSTANTS are the same for every case.
+#
+# Zoho returns null for empty fields it was asked for, so absent and null
+# mean the same thing here. A required field that is empty (or rejected by
+# its transform) is missing; an optional one, such as the free-text
+# instructions, is passed on as None, as extract_fields_from_zoho did.
+#
+# The table is read once, at import (`build_case_request`), and the Zoho
+# fields it names are all searchZohoRecords asks Zoho for.
+
+
+REQUIRED, OPTIONAL = True, False
+
+
+def _county(value) -> str:
+    # "CA: Los Angeles" -> "Los Angeles"
+    if ":" in value:
+        return value.split(":", 1)[1].strip()
+    return value
+
+
+def _hearing_date(value) -> str:
+    # "2030-01-02 9:30" -> "2030-01-02T09:30:00"
+    date_part, time_part = str(value).split(" ")
+    hour, minute = time_part.split(":")[:2]
+    return f"{date_part}T{hour.zfill(2)}:{minute.zfill(2)}:00"
+
+
+CASE_FIELD_MAP = (
+    ("outCourtState", "State", None, REQUIRED),
+    ("outCourtCounty", "County2.name", _county, REQUIRED),
+    ("outCourtCity", "City", None, REQUIRED),
+    ("outCourtName", "Court_Name", None, REQUIRED),
+    ("outCourtAddress", "Address", None, REQUIRED),
+    ("outCourtZip", "Zip_Code", None, REQUIRED),
+    ("hearingType", "Pick_List_5", None, REQUIRED),
+    ("hearingDate", "Twenty_Four_Hr_Hearing_Time", _hearing_date, REQUIRED),
+    ("fileNumber", "Client_Reference", None, OPTIONAL),
+    ("detailedInstructions", "Desired_Result", None, OPTIONAL),
+    ("attorneyRecord", "Attorney_of_Record", None, OPTIONAL),
+    ("caseName", "Case_Name1", None, REQUIRED),
+    ("caseNumber", "Case_Number", None, REQUIRED),
+)
+CASE_CONSTANTS = {"defendantPlantiff": False}
+
+
+@dataclass(slots=True)
+class NAACaseRequest:
+    """The arguments of one NAA postCase call, in postCase's order."""
+
+    outCourtState: str
+    outCourtCounty: str
+    outCourtCity: str
+    outCourtName: str
+    outCourtAddress: str
+    outCourtZip: str
+    hearingType: str
+    hearingDate: str
+    fileNumber: str
+    defendantPlantiff: bool
+    detailedInstructions: str
+    attorneyRecord: str
+    caseName: str
+    caseClientName: str
+    caseNumber: str
+
+    def as_kwargs(self) -> dict:
+        return {name: getattr(self, name) for name in _REQUEST_FIELDS}
+
+
+_REQUEST_FIELDS = tuple(f.name for f in dataclass_fields(NAACaseRequest))
+
+
+class MissingZohoFields(KeyError):
+    """A Zoho record lacks (or has unusable values for) mapped fields."""
+
+    def __init__(self, fields: list):
+        super().__init__(fields)
+        self.fields = fields
+
+    def __str__(self) -> str:
+        return "Missing Zoho fields: " + ", ".join(self.fields)
+
+
+def compile_mapping(field_map=CASE_FIELD_MAP) -> Callable[..., NAACaseRequest]:
+    """
+    Turn a field map into ``extract(record, caseClientName)``, which returns
+    an NAACaseRequest or raises MissingZohoFields naming every required
+    field that is absent, null or rejected by its transform.
+    """
+    rows = tuple(
+        (name, path, *(path.split(".", 1) + [None])[:2], transform, required)
+        for name, path, transform, required in field_map
+    )
+
+    def extract(record, caseClientName):
+        values = {"caseClientName": caseClientName, **CASE_CONSTANTS}
+        missing = []
+        for name, path, first, lookup, transform, required in rows:
+            value = record.get(first)
+            if lookup is not None and value is not None:
+                value = value.get(lookup)
+            if value is None:
+                if required:
+                    missing.append(path)
+                    continue
+            elif transform is not None:
+                try:
+                    value = transform(value)
+                except (TypeError, ValueError):
+                    missing.append(path)
+                    continue
+            values[name] = value
+        if missing:
+            raise MissingZohoFields(missing)
+        return NAACaseRequest(**values)
+
+    return extract
+
+
+build_case_request = compile_mapping()
+
+# every Zoho field the mapping reads, for search field projection
+ZOHO_CASE_FIELDS = tuple(dict.fromkeys(path.split(".")[0] for _, path, _, _ in CASE_FIELD_MAP))
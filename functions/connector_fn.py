@@ -1,197 +1,247 @@
-from functions.api.naa import postCase, closeCase, getCaseByID, uploadFile
+from functions.api.naa import postCase, closeCase, getCaseByID, getCaseStatusIndex, uploadFile, uploadFileStream
 from functions.api.zoho import (
     searchZohoRecords,
     addCaseIDToZohoRecord,
-    getListOfSyncIds,
-    updateResults,
+    listSyncRecords,
+    SYNC_FIELDS,
+    updateResultsBulk,
     getFileFromZoho,
+    downloadFileFromZoho,
     searchZohoContacts,
 )
+from functions.case_mapping import MissingZohoFields, build_case_request
+from functions.helpers import metrics
+from functions.helpers.cache import fresh_reads, invalidate
+from functions.helpers.executor import iter_bounded, map_bounded
+from functions.helpers.log import get_logger
+from functions.helpers.rate_limit import background_priority
+from functions.helpers.settings import get_settings
+from functions.helpers.singleflight import single_flight
+from functions.helpers.state_store import load_states, results_hash, save_states
+from functions.helpers.streaming import new_spool
+from functions.helpers.tracing import span
+from functions.sync_engine import merge_write_results, run_sync, upstream_slot
 import base64
+import time
 from requests.exceptions import HTTPError
 
+logger = get_logger(__name__)
 
-def retry_once(fn):
-    """
-    Decorator: call the function, retry once on HTTPError or any Exception,
-    then propagate the last error if it still fails.
-    """
+DOC_BYTES = metrics.Counter(
+    "document_transfer_bytes_total",
+    "Document bytes downloaded from Zoho and uploaded to NAA.",
+    ("direction",),
+)
+DOC_TRANSFERS = metrics.Counter(
+    "document_transfers_total",
+    "Zoho-to-NAA document transfers by outcome.",
+    ("outcome",),
+)
 
-    def wrapper(*args, **kwargs):
-        last_exc = None
-        for attempt in (1, 2):
-            try:
-                return fn(*args, **kwargs)
-            except (HTTPError, Exception) as e:
-                last_exc = e
-                if attempt == 2:
-                    # After second failure, re-raise
-                    raise
-        # Should never reach here
 
-    return wrapper
+# The steps below are shared with connector_fn_async, which runs the same
+# pipelines on the event loop: only the upstream calls differ.
 
 
-def extract_fields_from_zoho(zohoDetails: dict, name: str, requestId: str) -> dict:
-    try:
-        defendantPlantiff = False
-        caseClientName = name
-        data0 = zohoDetails["data"][0]
-        print("hi")
-
-        outCourtState = data0["State"]
-        outCourtCity = data0["City"]
-        outCourtName = data0["Court_Name"]
-        outCourtAddress = data0["Address"]
-        outCourtZip = data0["Zip_Code"]
-        hearingType = data0["Pick_List_5"]
-        detailedInstructions = data0["Desired_Result"]
-        # detailedInstructions = "Enter (1) any special instructions for this hearing and (2) desired results."
-
-        attorneyRecord = data0["Attorney_of_Record"]
-        fileNumber = data0["Client_Reference"]
-        caseName = data0["Case_Name1"]
-        caseNumber = data0["Case_Number"]
-
-        # Normalize county field
-        outCourtCounty = data0["County2"]["name"]
-        if ":" in outCourtCounty:
-            outCourtCounty = outCourtCounty.split(":", 1)[1].strip()
-
-        # Parse and format hearingDate
-        hearingTime = str(data0["Twenty_Four_Hr_Hearing_Time"])
-        date_part, time_part = hearingTime.split(" ")
-        hour, minute = time_part.split(":")[:2]
-        hour = hour.zfill(2)
-        minute = minute.zfill(2)
-        hearingDate = f"{date_part}T{hour}:{minute}:00"
+def _raise_on_error(res: dict) -> dict:
+    """Raise the error dict an API call returned as an HTTPError, else return it."""
+    if "error" in res:
+        raise HTTPError(res["error"], response=res)
+    return res
 
-        return {
-            "outCourtState": outCourtState,
-            "outCourtCounty": outCourtCounty,
-            "outCourtCity": outCourtCity,
-            "outCourtName": outCourtName,
-            "outCourtAddress": outCourtAddress,
-            "outCourtZip": outCourtZip,
-            "hearingType": hearingType,
-            "hearingDate": hearingDate,
-            "fileNumber": fileNumber,
-            "defendantPlantiff": defendantPlantiff,
-            "detailedInstructions": detailedInstructions,
-            "attorneyRecord": attorneyRecord,
-            "caseName": caseName,
-            "caseClientName": caseClientName,
-            "caseNumber": caseNumber,
-        }
-    except KeyError:
-        return None
 
+def _contact_name(nameRes: dict) -> str:
+    return _raise_on_error(nameRes)["data"][0]["Contact_Name"]["name"]
 
-@retry_once
-def _core_create_case_from_zoho(matterID: int) -> dict:
-    # 1) Lookup Zoho record
-    recs = searchZohoRecords(matterID)
-    if "error" in recs:
-        raise HTTPError(recs["error"], response=recs)
-    print("hello world")
 
-    # 2) Lookup contact name
-    lookupVal = recs["data"][0]["Matter"]["id"]
-    nameRes = searchZohoContacts(lookupVal)
-    print(nameRes)
-    if "error" in nameRes:
-        raise HTTPError(nameRes["error"], response=nameRes)
-    name = nameRes["data"][0]["Contact_Name"]["name"]
-    print("hello world1111111")
-    print(name)
-
-    # 3) Extract fields
-    zohoDetails = extract_fields_from_zoho(recs, name, matterID)
-    if zohoDetails is None:
-        raise KeyError("Missing Zoho fields")
-    print(zohoDetails)
+def _case_request(matterID: int, record: dict, name: str):
+    # Map the record onto postCase's arguments (raises MissingZohoFields)
+    with span("extract"):
+        caseRequest = build_case_request(record, name)
+    logger.debug("zoho fields extracted", extra={"matterID": matterID, "fields": caseRequest.as_kwargs()})
+    return caseRequest
 
-    # 4) Create case in NAA
-    caseID = postCase(
-        outCourtState=zohoDetails["outCourtState"],
-        outCourtCounty=zohoDetails["outCourtCounty"],
-        outCourtCity=zohoDetails["outCourtCity"],
-        outCourtName=zohoDetails["outCourtName"],
-        outCourtAddress=zohoDetails["outCourtAddress"],
-        outCourtZip=zohoDetails["outCourtZip"],
-        hearingType=zohoDetails["hearingType"],
-        hearingDate=zohoDetails["hearingDate"],
-        fileNumber=zohoDetails["fileNumber"],
-        defendantPlantiff=zohoDetails["defendantPlantiff"],
-        detailedInstructions=zohoDetails["detailedInstructions"],
-        attorneyRecord=zohoDetails["attorneyRecord"],
-        caseName=zohoDetails["caseName"],
-        caseClientName=zohoDetails["caseClientName"],
-        caseNumber=zohoDetails["caseNumber"],
-    )
+
+def _check_case_created(matterID: int, caseID: dict) -> None:
     if caseID.get("error") is not None:
         raise HTTPError(
             f"Case not created for {matterID}: {caseID['error']}", response=caseID
         )
 
+
+def _create_failure(e: Exception) -> dict:
+    """The result dict for a create pipeline that raised `e`."""
+    if isinstance(e, MissingZohoFields):
+        # the record itself is incomplete; retrying will not help
+        return {"error": str(e), "missingFields": e.fields, "statusCode": 422}
+    if isinstance(e, HTTPError):
+        # pull statusCode from response dict if present
+        status = (
+            e.response.get("statusCode", 500) if isinstance(e.response, dict) else 500
+        )
+        return {"error": str(e), "statusCode": status}
+    return {"error": str(e), "statusCode": 500}
+
+
+def _check_closed(result) -> dict:
+    if not isinstance(result, str):
+        raise ValueError(f"closeCase returned error: {result}")
+    return {"response": result, "statusCode": 200}
+
+
+# Each upstream call retries on its own inside _request (functions.helpers.retry);
+# the pipeline is never re-run as a whole because postCase is not idempotent.
+def _core_create_case_from_zoho(matterID: int) -> dict:
+    # 1) Lookup Zoho record, as it is now: its fields are copied into NAA
+    with span("zoho_record"), fresh_reads():
+        record = _raise_on_error(searchZohoRecords(matterID))["data"][0]
+    logger.debug("zoho record found", extra={"matterID": matterID})
+
+    # 2) Lookup contact name
+    with span("zoho_contact"):
+        name = _contact_name(searchZohoContacts(record["Matter"]["id"]))
+    logger.debug("zoho contact found", extra={"matterID": matterID, "caseClientName": name})
+
+    # 3) Map the record onto postCase's arguments
+    caseRequest = _case_request(matterID, record, name)
+
+    # 4) Create case in NAA
+    with span("naa_post_case"):
+        caseID = postCase(**caseRequest.as_kwargs())
+    _check_case_created(matterID, caseID)
+
     # 5) Write back to Zoho
-    addCaseIDToZohoRecord(matterID, str(caseID))
+    with span("zoho_write_back"):
+        addCaseIDToZohoRecord(matterID, str(caseID))
 
     return {"response": caseID, "statusCode": 200}
 
 
+@single_flight("create", clears=("close",))
 def create_case_from_zoho(matterID: int) -> dict:
     try:
         return _core_create_case_from_zoho(matterID)
-    except HTTPError as e:
-        # pull statusCode from response dict if present
-        status = (
-            e.response.get("statusCode", 500) if isinstance(e.response, dict) else 500
-        )
-        return {"error": str(e), "statusCode": status}
     except Exception as e:
-        return {"error": str(e), "statusCode": 500}
+        return _create_failure(e)
 
 
-@retry_once
 def _core_close_case_from_zoho(matterID: int) -> dict:
-    zohoDetails = searchZohoRecords(matterID)
-    if "error" in zohoDetails:
-        raise HTTPError(zohoDetails["error"], response=zohoDetails)
+    with span("zoho_record"):
+        zohoDetails = _raise_on_error(searchZohoRecords(matterID))
 
     caseID = zohoDetails["data"][0]["NAAM_CaseID"]
-    result = closeCase(caseID)
-    if not isinstance(result, str):
-        raise ValueError(f"closeCase returned error: {result}")
-
-    return {"response": result, "statusCode": 200}
+    with span("naa_close_case"):
+        return _check_closed(closeCase(caseID))
 
 
+@single_flight("close", clears=("create",))
 def close_case_from_zoho(matterID: int) -> dict:
     try:
         return _core_close_case_from_zoho(matterID)
     except Exception as e:
+        # the cached record may be what failed (a stale NAAM_CaseID)
+        invalidate("record", matterID)
         return {"error": str(e), "statusCode": 500}
 
 
-@retry_once
+BATCH_OPERATIONS = {"create": create_case_from_zoho, "close": close_case_from_zoho}
+
+
+def matter_result(matterID: int, result: dict, exc: BaseException = None) -> dict:
+    """One batch entry: `result` (or `exc`) tagged with its matterID and statusCode."""
+    result = {"error": str(exc), "statusCode": 500} if exc is not None else dict(result)
+    status = result.pop("statusCode", None)
+    if status is None:
+        status = 200 if "response" in result else 500
+    return {"matterID": matterID, "statusCode": status, **result}
+
+
+def iter_batch(operation: str, matterIDs: list, max_workers: int = None):
+    """
+    Run the create or close pipeline for every matter, up to `max_workers`
+    (BATCH_MAX_WORKERS, default 8) at a time, and yield each matter_result
+    as soon as it finishes. Each matter keeps its own single-flight
+    idempotency, and the batch shares the lookup cache and connection pools.
+    """
+    if max_workers is None:
+        max_workers = get_settings().batch_max_workers
+    fn = BATCH_OPERATIONS[operation]
+    for matterID, result, exc in iter_bounded(fn, matterIDs, max_workers):
+        yield matter_result(matterID, result, exc)
+
+
+def batch_summary(operation: str, results: list) -> dict:
+    """
+    Fold per-matter results into one response body with a statusCode: 200
+    when all succeeded, 207 when only some did, otherwise the last failure's.
+    """
+    verb = "created" if operation == "create" else "closed"
+    failed = [r for r in results if r["statusCode"] != 200]
+    if not failed:
+        return {"response": f"{verb} {len(results)} cases", "results": results, "statusCode": 200}
+    if len(failed) < len(results):
+        return {
+            "response": f"{verb} {len(results) - len(failed)} of {len(results)} cases",
+            "error": f"{len(failed)} cases failed",
+            "results": results,
+            "statusCode": 207,
+        }
+    return {"error": f"No cases {verb}", "results": results, "statusCode": failed[-1]["statusCode"]}
+
+
+def run_batch(operation: str, matterIDs: list, max_workers: int = None) -> dict:
+    """iter_batch collected into a batch_summary, with results in input order."""
+    order = {m: i for i, m in enumerate(matterIDs)}
+    results = sorted(iter_batch(operation, matterIDs, max_workers), key=lambda r: order[r["matterID"]])
+    return batch_summary(operation, results)
+
+
+def _stream_doc_from_zoho_to_naa(docID: str, docName: str, caseID: str) -> dict:
+    # Download into a spool that stays in memory up to DOC_SPOOL_THRESHOLD
+    # bytes and spills to a temp file beyond that, then stream it back out.
+    with new_spool() as spool:
+        # 1) fetch from Zoho
+        with span("download"):
+            res0 = _raise_on_error(downloadFileFromZoho(docID, spool))
+        DOC_BYTES.inc(res0["size"], direction="download")
+
+        # 2) upload to NAA
+        with span("upload"):
+            result = uploadFileStream(caseID, spool, res0["size"], docName)
+        if "error" not in result:
+            DOC_BYTES.inc(res0["size"], direction="upload")
+        return result
+
+
+def _file_bytes(raw) -> bytes:
+    if isinstance(raw, str):
+        return base64.b64decode(raw)
+    if isinstance(raw, (bytes, bytearray)):
+        return bytes(raw)
+    raise TypeError(f"Unexpected payload type: {type(raw)}")
+
+
 def _core_get_doc_from_zoho_upload_to_naa(
     docID: str, docName: str, caseID: str
 ) -> dict:
+    if get_settings().doc_transfer_streaming:
+        return _stream_doc_from_zoho_to_naa(docID, docName, caseID)
+
     # 1) fetch from Zoho
-    res0 = getFileFromZoho(docID)
-    raw = res0["response"]
+    with span("download"):
+        res0 = getFileFromZoho(docID)
 
     # 2) decode if base64
-    if isinstance(raw, str):
-        file_bytes = base64.b64decode(raw)
-    elif isinstance(raw, (bytes, bytearray)):
-        file_bytes = bytes(raw)
-    else:
-        raise TypeError(f"Unexpected payload type: {type(raw)}")
+    with span("decode"):
+        file_bytes = _file_bytes(res0["response"])
+    DOC_BYTES.inc(len(file_bytes), direction="download")
 
     # 3) upload to NAA
-    return uploadFile(caseID, file_bytes, docName)
+    with span("upload"):
+        result = uploadFile(caseID, file_bytes, docName)
+    if "error" not in result:
+        DOC_BYTES.inc(len(file_bytes), direction="upload")
+    return result
 
 
 def get_doc_from_zoho_upload_to_naa(docID: str, docName: str, caseID: str) -> dict:
@@ -201,26 +251,191 @@ def get_doc_from_zoho_upload_to_naa(docID: str, docName: str, caseID: str) -> di
         return {"error": str(e), "statusCode": 500}
 
 
-def sync_cases():
+def upload_docs_from_zoho_to_naa(
+    attachments: list, caseID: int, max_workers: int = None
+) -> list:
+    """
+    Transfer every attachment to NAA case `caseID`, up to `max_workers` at a
+    time (UPLOAD_MAX_WORKERS, default 4). Returns one result per attachment, in
+    input order, each carrying its own statusCode so partial failures survive.
+    """
+    if max_workers is None:
+        max_workers = get_settings().upload_max_workers
+
+    def _transfer(attachment: dict) -> dict:
+        return get_doc_from_zoho_upload_to_naa(
+            attachment["document_id"], attachment["document_name"], caseID
+        )
+
+    return [
+        _attachment_result(attachment, result, exc)
+        for attachment, (result, exc) in zip(
+            attachments, map_bounded(_transfer, attachments, max_workers)
+        )
+    ]
+
+
+def _attachment_result(attachment: dict, result: dict, exc: BaseException = None) -> dict:
+    """One upload entry: `result` (or `exc`) tagged with its document and statusCode."""
+    if exc is not None:
+        result = {"error": str(exc), "statusCode": 500}
+    status = result.pop("statusCode", None)
+    if status is None:
+        status = 200 if "response" in result else 500
+    DOC_TRANSFERS.inc(outcome="ok" if status == 200 else "failed")
+    return {
+        "document_id": attachment["document_id"],
+        "document_name": attachment["document_name"],
+        "statusCode": status,
+        **result,
+    }
+
+
+STATUS_MAP = {
+    1: "Available",
+    2: "Assigned",
+    3: "Closed",
+    5: "Cancelled",
+    6: "Pending",
+    7: "Open",
+    9: "Soft Lock",
+}
+
+
+def _naa_status_for(record: dict, index: dict = None):
+    """
+    Look up the NAA case behind one listSyncRecords row, in `index` (from
+    getCaseStatusIndex) when given and otherwise with getCaseByID. Returns
+    the ``(matterID, status, detailedResults)`` update, or None if no case
+    is linked.
+    """
+    matterId = record["id"]
+    caseID = record.get("NAAM_CaseID")
+    if caseID is None:
+        return None
+
+    if index is not None and str(caseID) in index:
+        caseStatus, results = index[str(caseID)]
+    else:
+        with upstream_slot("naa"):
+            naaCaseDetails = getCaseByID(caseID)
+        if "error" in naaCaseDetails:
+            raise HTTPError(naaCaseDetails["error"], response=naaCaseDetails)
+        caseStatus = naaCaseDetails["caseStatus"]
+        results = naaCaseDetails.get("detailedResults", "")
+    logger.debug(
+        "naa case fetched",
+        extra={"matterID": matterId, "caseID": caseID, "caseStatus": caseStatus, "sample": True},
+    )
+    return (matterId, STATUS_MAP.get(caseStatus, "Unknown"), results)
+
+
+def _records_for(matterIDs: list):
+    """
+    Sync rows for an explicit list of matters, plus lookup failures. The
+    records are read from Zoho, not the lookup cache: the sync compares
+    them with NAA and skips matters that already match.
+    """
+    records, failures = [], []
+    with fresh_reads():
+        lookups = map_bounded(searchZohoRecords, matterIDs, get_settings().sync_zoho_concurrency)
+    for matterId, (res, exc) in zip(matterIDs, lookups):
+        if exc is None and isinstance(res, dict) and res.get("data"):
+            rec = res["data"][0]
+            records.append({field: rec.get(field) for field in SYNC_FIELDS})
+        else:
+            error = str(exc) if exc is not None else res.get("error", "record not found")
+            failures.append({"matterID": matterId, "error": error})
+    return records, failures
+
+
+def sync_cases(matterIDs: list = None, modifiedSince: float = None):
+    """
+    Sync NAA case status back to every open Zoho appearance (or only
+    `matterIDs`, or only those Zoho modified after `modifiedSince`): NAA
+    lookups run in parallel (or as one paged sweep above SYNC_BULK_THRESHOLD
+    linked cases), matters whose status and results are unchanged since the
+    last push are skipped, and the rest go out through updateResultsBulk.
+    Returns the run summary from functions.sync_engine.run_sync.
+    """
+    # the sync yields Zoho capacity to interactive endpoints
+    with background_priority():
+        return _sync_cases(matterIDs, modifiedSince)
+
+
+def _bulk_status_index(records: list):
+    """
+    getCaseStatusIndex for the linked cases in `records` when there are at
+    least SYNC_BULK_THRESHOLD of them: one paged sweep of NAA is cheaper
+    than that many point lookups. Returns None to use point lookups.
+    """
+    caseIDs = [r["NAAM_CaseID"] for r in records if r.get("NAAM_CaseID") is not None]
+    if not caseIDs or len(caseIDs) < get_settings().sync_bulk_threshold:
+        return None
     try:
-        matterIds = getListOfSyncIds()["response"]
-        for matterId in matterIds:
-            zohoRec = searchZohoRecords(matterId)
-            caseID = zohoRec["data"][0].get("NAAM_CaseID")
-            if caseID is not None:
-                naaCaseDetails = getCaseByID(caseID)
-                caseStatus = naaCaseDetails["caseStatus"]
-                results = naaCaseDetails.get("detailedResults", "")
-                print("naaCaseDetails:", naaCaseDetails)
-                status_map = {
-                    1: "Available",
-                    2: "Assigned",
-                    3: "Closed",
-                    5: "Cancelled",
-                    6: "Pending",
-                    7: "Open",
-                    9: "Soft Lock",
-                }
-                updateResults(matterId, status_map.get(caseStatus, "Unknown"), results)
+        with upstream_slot("naa"):
+            return getCaseStatusIndex(caseIDs)
     except Exception as e:
-        return {"error": str(e)}
+        logger.warning("naa bulk sweep failed, using per-case lookups", extra={"error": str(e)})
+        return None
+
+
+def _sync_cases(matterIDs: list = None, modifiedSince: float = None):
+    lookup_failures = []
+    if matterIDs is None:
+        try:
+            records = listSyncRecords(modifiedSince=modifiedSince)
+        except Exception as e:
+            return {"error": str(e)}
+        if "error" in records:
+            return records
+        records = records["response"]
+    else:
+        records, lookup_failures = _records_for(list(matterIDs))
+
+    known = load_states()
+    pending = []
+    digests = {}
+    t0 = time.perf_counter()
+    index = _bulk_status_index(records)
+    sweepMs = round((time.perf_counter() - t0) * 1000, 1)
+
+    def _fetch(record: dict) -> str:
+        update = _naa_status_for(record, index)
+        if update is None:
+            return "noCase"
+        matterId, status, results = update
+        digest = results_hash(status, results)
+        if known.get(str(matterId)) == (status, digest):
+            return "unchanged"
+        digests[str(matterId)] = (record.get("NAAM_CaseID"), status, digest)
+        # Zoho already shows these values (e.g. first run against a fresh store)
+        if record.get("NAAM_Results") == status and (record.get("Results") or "") == (results or ""):
+            return "unchanged"
+        pending.append(update)
+        return "fetched"
+
+    summary = run_sync(records, _fetch)
+    summary["naaLookup"] = "point" if index is None else "bulk"
+    if index is not None:
+        summary["naaSweepMs"] = sweepMs
+        summary["durationMs"] += sweepMs
+    summary["total"] += len(lookup_failures)
+    summary["failures"].extend(lookup_failures)
+    t0 = time.perf_counter()
+    with upstream_slot("zoho"):
+        written = updateResultsBulk(pending)
+    summary["writeDurationMs"] = round((time.perf_counter() - t0) * 1000, 1)
+    summary["durationMs"] += summary["writeDurationMs"]
+
+    # Remember what Zoho now holds so the next pass can skip these matters
+    save_states(
+        (matterId, *digests[matterId])
+        for matterId in digests
+        if written.get(matterId, {"ok": True})["ok"]
+    )
+
+    summary = merge_write_results(summary, "fetched", written)
+    summary["skipped"] = summary["outcomes"].get("unchanged", 0)
+    summary["written"] = summary["outcomes"].get("updated", 0)
+    return summary
@@ -0,0 +1,198 @@
+import asyncio
+
+from functions.api.naa_async import closeCase, postCase, uploadFile, uploadFileStream
+from functions.api.zoho_async import (
+    addCaseIDToZohoRecord,
+    downloadFileFromZoho,
+    getFileFromZoho,
+    searchZohoContacts,
+    searchZohoRecords,
+)
+from functions.connector_fn import (
+    DOC_BYTES,
+    _attachment_result,
+    _case_request,
+    _check_case_created,
+    _check_closed,
+    _contact_name,
+    _create_failure,
+    _file_bytes,
+    _raise_on_error,
+    batch_summary,
+    logger,
+    matter_result,
+)
+from functions.helpers.cache import fresh_reads, invalidate_async
+from functions.helpers.settings import get_settings
+from functions.helpers.singleflight import single_flight_async
+from functions.helpers.streaming import new_spool
+from functions.helpers.tracing import span
+
+# asyncio versions of the create, close and upload pipelines in
+# connector_fn.py, for the ASGI app. Only the upstream calls live here: the
+# steps between them (error checks, the case mapping, result shapes) are
+# connector_fn's, so both pipelines return the same result dicts.
+
+
+async def _core_create_case_from_zoho(matterID: int) -> dict:
+    # 1) Lookup Zoho record, as it is now: its fields are copied into NAA
+    with span("zoho_record"), fresh_reads():
+        record = _raise_on_error(await searchZohoRecords(matterID))["data"][0]
+    logger.debug("zoho record found", extra={"matterID": matterID})
+
+    # 2) Lookup contact name
+    with span("zoho_contact"):
+        name = _contact_name(await searchZohoContacts(record["Matter"]["id"]))
+    logger.debug("zoho contact found", extra={"matterID": matterID, "caseClientName": name})
+
+    # 3) Map the record onto postCase's arguments
+    caseRequest = _case_request(matterID, record, name)
+
+    # 4) Create case in NAA
+    with span("naa_post_case"):
+        caseID = await postCase(**caseRequest.as_kwargs())
+    _check_case_created(matterID, caseID)
+
+    # 5) Write back to Zoho
+    with span("zoho_write_back"):
+        await addCaseIDToZohoRecord(matterID, str(caseID))
+
+    return {"response": caseID, "statusCode": 200}
+
+
+@single_flight_async("create", clears=("close",))
+async def create_case_from_zoho(matterID: int) -> dict:
+    try:
+        return await _core_create_case_from_zoho(matterID)
+    except Exception as e:
+        return _create_failure(e)
+
+
+async def _core_close_case_from_zoho(matterID: int) -> dict:
+    with span("zoho_record"):
+        zohoDetails = _raise_on_error(await searchZohoRecords(matterID))
+
+    caseID = zohoDetails["data"][0]["NAAM_CaseID"]
+    with span("naa_close_case"):
+        return _check_closed(await closeCase(caseID))
+
+
+@single_flight_async("close", clears=("create",))
+async def close_case_from_zoho(matterID: int) -> dict:
+    try:
+        return await _core_close_case_from_zoho(matterID)
+    except Exception as e:
+        # the cached record may be what failed (a stale NAAM_CaseID)
+        await invalidate_async("record", matterID)
+        return {"error": str(e), "statusCode": 500}
+
+
+BATCH_OPERATIONS = {"create": create_case_from_zoho, "close": close_case_from_zoho}
+
+
+async def iter_batch(operation: str, matterIDs: list, max_workers: int = None):
+    """
+    connector_fn.iter_batch on the event loop: yields each matter_result as
+    it finishes, at most `max_workers` (BATCH_MAX_WORKERS) matters at a time.
+    Closing it early cancels only the matters that have not started.
+    """
+    if max_workers is None:
+        max_workers = get_settings().batch_max_workers
+    fn = BATCH_OPERATIONS[operation]
+    slots = asyncio.Semaphore(max(1, int(max_workers)))
+    started = set()
+
+    async def _run(matterID: int) -> dict:
+        async with slots:
+            started.add(matterID)
+            try:
+                return matter_result(matterID, await fn(matterID))
+            except Exception as e:
+                return matter_result(matterID, None, e)
+
+    tasks = {matterID: asyncio.ensure_future(_run(matterID)) for matterID in matterIDs}
+    try:
+        for done in asyncio.as_completed(list(tasks.values())):
+            yield await done
+    finally:
+        for matterID, task in tasks.items():
+            if matterID not in started:
+                task.cancel()
+
+
+async def run_batch(operation: str, matterIDs: list, max_workers: int = None) -> dict:
+    """iter_batch collected into a batch_summary, with results in input order."""
+    order = {m: i for i, m in enumerate(matterIDs)}
+    results = [r async for r in iter_batch(operation, matterIDs, max_workers)]
+    results.sort(key=lambda r: order[r["matterID"]])
+    return batch_summary(operation, results)
+
+
+async def _stream_doc_from_zoho_to_naa(docID: str, docName: str, caseID: str) -> dict:
+    with new_spool() as spool:
+        # 1) fetch from Zoho
+        with span("download"):
+            res0 = _raise_on_error(await downloadFileFromZoho(docID, spool))
+        DOC_BYTES.inc(res0["size"], direction="download")
+
+        # 2) upload to NAA
+        with span("upload"):
+            result = await uploadFileStream(caseID, spool, res0["size"], docName)
+        if "error" not in result:
+            DOC_BYTES.inc(res0["size"], direction="upload")
+        return result
+
+
+async def _core_get_doc_from_zoho_upload_to_naa(docID: str, docName: str, caseID: str) -> dict:
+    if get_settings().doc_transfer_streaming:
+        return await _stream_doc_from_zoho_to_naa(docID, docName, caseID)
+
+    # 1) fetch from Zoho
+    with span("download"):
+        res0 = await getFileFromZoho(docID)
+
+    # 2) decode if base64
+    with span("decode"):
+        file_bytes = _file_bytes(res0["response"])
+    DOC_BYTES.inc(len(file_bytes), direction="download")
+
+    # 3) upload to NAA
+    with span("upload"):
+        result = await uploadFile(caseID, file_bytes, docName)
+    if "error" not in result:
+        DOC_BYTES.inc(len(file_bytes), direction="upload")
+    return result
+
+
+async def get_doc_from_zoho_upload_to_naa(docID: str, docName: str, caseID: str) -> dict:
+    try:
+        return await _core_get_doc_from_zoho_upload_to_naa(docID, docName, caseID)
+    except Exception as e:
+        return {"error": str(e), "statusCode": 500}
+
+
+async def upload_docs_from_zoho_to_naa(
+    attachments: list, caseID: int, max_workers: int = None
+) -> list:
+    """
+    Transfer every attachment to NAA case `caseID`, at most `max_workers`
+    (UPLOAD_MAX_WORKERS) at a time. Returns one result per attachment, in
+    input order, exactly like the threaded version.
+    """
+    if max_workers is None:
+        max_workers = get_settings().upload_max_workers
+    slots = asyncio.Semaphore(max(1, int(max_workers)))
+
+    async def _transfer(attachment: dict) -> dict:
+        async with slots:
+            return await get_doc_from_zoho_upload_to_naa(
+                attachment["document_id"], attachment["document_name"], caseID
+            )
+
+    outcomes = await asyncio.gather(*(_transfer(a) for a in attachments), return_exceptions=True)
+    return [
+        _attachment_result(attachment, None, result)
+        if isinstance(result, BaseException)
+        else _attachment_result(attachment, result)
+        for attachment, result in zip(attachments, outcomes)
+    ]
@@ -0,0 +1,116 @@
+import httpx
+import requests
+from typing import Optional, Dict, Any, AsyncIterator, Callable
+
+from functions.helpers import async_http_client
+from functions.helpers.http_client import endpoint_template
+from functions.helpers.log import get_logger
+from functions.helpers.retry import call_with_retry_async
+
+logger = get_logger(__name__)
+
+# asyncio versions of the helpers in helpers.py, with the same error
+# contract: a non-2xx response raises requests.exceptions.HTTPError whose
+# `.response` (an httpx.Response here) has status_code and json().
+
+
+async def _request_async(
+    method: str,
+    url: str,
+    headers: Optional[Dict[str, Any]] = None,
+    params: Optional[Dict[str, Any]] = None,
+    json: Optional[Dict[str, Any]] = None,
+    data: Optional[Dict[str, Any]] = None,
+    files: Optional[Dict[str, Any]] = None,
+    content: Optional[Callable[[], AsyncIterator[bytes]]] = None,
+    timeout: Optional[Any] = None,
+    stream: bool = False,
+    idempotent: Optional[bool] = None,
+) -> httpx.Response:
+    """
+    _request for the event loop: pooled AsyncClient, same retry policy and
+    circuit breaker, same HTTPError on failure. A streamed body can only be
+    sent once, so `content` is a factory called for a fresh iterator on
+    every attempt.
+    """
+    response = await call_with_retry_async(
+        method,
+        url,
+        lambda budget: async_http_client.send(
+            method,
+            url,
+            timeout=timeout,
+            budget=budget,
+            stream=stream,
+            headers=headers,
+            params=params,
+            json=json,
+            data=data,
+            files=files,
+            content=content() if content is not None else None,
+        ),
+        idempotent=idempotent,
+    )
+    if response.is_success:
+        return response
+
+    if stream:
+        await response.aread()
+    try:
+        detail = response.json().get("message", response.text)
+    except ValueError:
+        detail = response.text
+    if method.upper() == "POST":
+        logger.warning(
+            "upstream POST failed",
+            extra={"status": response.status_code, "endpoint": endpoint_template(url), "detail": str(detail)[:500]},
+        )
+    raise requests.exceptions.HTTPError(
+        f"HTTP {response.status_code} Error for {url!r}: {detail!r}",
+        response=response
+    )
+
+
+async def requestPostAsync(
+    url: str,
+    payload: Optional[Dict[str, Any]] = None,
+    formbody: Optional[Dict[str, Any]] = None,
+    files: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, Any]] = None,
+    content: Optional[Callable[[], AsyncIterator[bytes]]] = None,
+    idempotent: Optional[bool] = None
+) -> httpx.Response:
+    """
+    requestPost for the event loop. `content` replaces `data` for raw or
+    streamed bodies (a function returning a fresh async iterator of bytes
+    per attempt; set Content-Type and Content-Length in `headers`).
+    """
+    if files is not None:
+        return await _request_async("POST", url, headers=headers, files=files, idempotent=idempotent)
+    if content is not None:
+        return await _request_async("POST", url, headers=headers, content=content, idempotent=idempotent)
+    return await _request_async(
+        "POST",
+        url,
+        headers=headers,
+        data=formbody,
+        json=None if formbody is not None else payload,
+        idempotent=idempotent
+    )
+
+
+async def requestGetAsync(
+    url: str,
+    headers: Dict[str, Any],
+    params: Optional[Dict[str, Any]] = None,
+    stream: bool = False
+) -> httpx.Response:
+    return await _request_async("GET", url, headers=headers, params=params, stream=stream)
+
+
+async def requestPutAsync(
+    url: str,
+    headers: Dict[str, Any],
+    data: Optional[Dict[str, Any]] = None
+) -> httpx.Response:
+    return await _request_async("PUT", url, headers=headers, json=data)
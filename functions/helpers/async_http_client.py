@@ -0,0 +1,120 @@
+import asyncio
+import itertools
+import os
+import time
+import weakref
+from typing import Any, Dict, List, Optional
+
+import httpx
+import requests
+
+from functions.helpers.http_client import (
+    UPSTREAM_IN_FLIGHT,
+    UPSTREAM_LATENCY,
+    UPSTREAM_REQUESTS,
+    bounded_timeout,
+    endpoint_template,
+    host_key,
+)
+from functions.helpers.settings import get_settings
+
+# asyncio counterpart of http_client: pooled httpx.AsyncClients per
+# upstream host and event loop (clients are bound to the loop that created
+# them). Transport errors are re-raised as the equivalent requests
+# exceptions, so the retry policy and every caller's error handling treat
+# both paths the same way.
+#
+# Each host's connections are split over _SHARDS clients used round-robin:
+# httpcore rescans its whole pool for every request it queues, which with
+# one 100-connection pool cost more CPU than the requests themselves at a
+# few hundred in flight.
+#
+# Clients are held per loop in a WeakKeyDictionary, so a loop that is
+# dropped without close_all() (a finished asyncio.run()) takes its clients
+# with it instead of leaving them in the registry.
+_SHARDS = 8
+
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, List[httpx.AsyncClient]]]" = weakref.WeakKeyDictionary()
+_next = itertools.count()
+_pid = os.getpid()
+
+
+def _reset_after_fork() -> None:
+    global _clients, _pid
+    _clients = weakref.WeakKeyDictionary()
+    _pid = os.getpid()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _timeout(timeout: Optional[Any] = None, budget: Optional[float] = None) -> httpx.Timeout:
+    connect, read = bounded_timeout(timeout, budget)
+    return httpx.Timeout(read, connect=connect)
+
+
+def get_client(url: str) -> httpx.AsyncClient:
+    """A pooled AsyncClient for `url`'s host on the running loop."""
+    if os.getpid() != _pid:
+        _reset_after_fork()
+    per_loop = _clients.setdefault(asyncio.get_running_loop(), {})
+    key = host_key(url)
+    shards = per_loop.get(key)
+    if shards is None:
+        per_shard = max(1, get_settings().async_http_max_connections // _SHARDS)
+        limits = httpx.Limits(max_connections=per_shard, max_keepalive_connections=per_shard)
+        shards = per_loop[key] = [
+            httpx.AsyncClient(timeout=_timeout(), limits=limits) for _ in range(_SHARDS)
+        ]
+    return shards[next(_next) % len(shards)]
+
+
+def _translate(exc: httpx.TransportError) -> requests.exceptions.RequestException:
+    if isinstance(exc, httpx.ConnectTimeout):
+        return requests.exceptions.ConnectTimeout(str(exc))
+    if isinstance(exc, httpx.TimeoutException):
+        return requests.exceptions.ReadTimeout(str(exc))
+    return requests.exceptions.ConnectionError(str(exc) or type(exc).__name__)
+
+
+async def send(
+    method: str,
+    url: str,
+    timeout: Optional[Any] = None,
+    stream: bool = False,
+    budget: Optional[float] = None,
+    **kwargs,
+) -> httpx.Response:
+    """
+    Issue a request through the pooled AsyncClient for `url`'s host, with
+    `timeout` capped at `budget` seconds. With `stream=True` the body is
+    not read; the caller must `aclose()` it.
+    """
+    client = get_client(url)
+    key = host_key(url)
+    labels = {"host": key, "method": method.upper(), "endpoint": endpoint_template(url)}
+    status = "error"
+    UPSTREAM_IN_FLIGHT.inc(host=key)
+    started = time.perf_counter()
+    try:
+        request = client.build_request(
+            method, url, timeout=_timeout(timeout, budget), **kwargs
+        )
+        response = await client.send(request, stream=stream)
+        status = str(response.status_code)
+        return response
+    except httpx.TransportError as exc:
+        raise _translate(exc) from exc
+    finally:
+        UPSTREAM_LATENCY.observe(time.perf_counter() - started, **labels)
+        UPSTREAM_REQUESTS.inc(status=status, **labels)
+        UPSTREAM_IN_FLIGHT.dec(host=key)
+
+
+async def close_all() -> None:
+    """Close the clients created on the running loop."""
+    per_loop = _clients.pop(asyncio.get_running_loop(), {})
+    for shards in per_loop.values():
+        for client in shards:
+            await client.aclose()
@@ -0,0 +1,255 @@
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Dict, Optional
+
+from functions.helpers.settings import get_settings
+from functions.helpers.sqlite_store import connect
+
+# Read-through cache for Zoho lookups. Entries expire after a per-kind TTL
+# and the least recently used ones are evicted past CACHE_MAX_ENTRIES.
+# CACHE_BACKEND=memory keeps one cache per worker; CACHE_BACKEND=sqlite
+# shares one on-disk cache between the gunicorn workers on a host.
+# Cached values are shared between callers: treat them as read-only.
+#
+# Callers that act on what they read (create copies a record into NAA, the
+# sync compares it with NAA) wrap the lookup in fresh_reads(): it goes to
+# Zoho and replaces the cached entry instead of trusting it.
+
+_MISSING = object()
+_fresh: ContextVar[bool] = ContextVar("cache_fresh_reads", default=False)
+
+
+@contextmanager
+def fresh_reads():
+    """Cached lookups made inside the block skip the cache but still refill it."""
+    token = _fresh.set(True)
+    try:
+        yield
+    finally:
+        _fresh.reset(token)
+
+
+class MemoryBackend:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, kind: str, key: str):
+        with self._lock:
+            entry = self._data.get((kind, key))
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self._data[(kind, key)]
+                return _MISSING
+            self._data.move_to_end((kind, key))
+            return value
+
+    def set(self, kind: str, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._data[(kind, key)] = (time.time() + ttl, value)
+            self._data.move_to_end((kind, key))
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, kind: str, key: str) -> None:
+        with self._lock:
+            self._data.pop((kind, key), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def size(self) -> int:
+        return len(self._data)
+
+
+class SqliteBackend:
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS cache (
+        kind        TEXT NOT NULL,
+        key         TEXT NOT NULL,
+        value       TEXT NOT NULL,
+        expires_at  REAL NOT NULL,
+        accessed_at REAL NOT NULL,
+        PRIMARY KEY (kind, key)
+    )
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+
+    def _db(self):
+        conn = connect(self.path)
+        conn.execute(self._SCHEMA)
+        return conn
+
+    def get(self, kind: str, key: str):
+        now = time.time()
+        conn = self._db()
+        row = conn.execute(
+            "SELECT value FROM cache WHERE kind = ? AND key = ? AND expires_at > ?",
+            (kind, key, now),
+        ).fetchone()
+        if row is None:
+            return _MISSING
+        conn.execute(
+            "UPDATE cache SET accessed_at = ? WHERE kind = ? AND key = ?", (now, kind, key)
+        )
+        return json.loads(row[0])
+
+    def set(self, kind: str, key: str, value: Any, ttl: float) -> None:
+        now = time.time()
+        conn = self._db()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (kind, key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+            (kind, key, json.dumps(value), now + ttl, now),
+        )
+        conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+        conn.execute(
+            "DELETE FROM cache WHERE rowid IN ("
+            " SELECT rowid FROM cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def delete(self, kind: str, key: str) -> None:
+        self._db().execute("DELETE FROM cache WHERE kind = ? AND key = ?", (kind, key))
+
+    def clear(self) -> None:
+        self._db().execute("DELETE FROM cache")
+
+    def size(self) -> int:
+        return self._db().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+class TTLCache:
+    def __init__(self, backend, ttls: Dict[str, float]):
+        self.backend = backend
+        self.ttls = ttls
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def _count(self, kind: str, what: str) -> None:
+        with self._lock:
+            counters = self._stats.setdefault(
+                kind, {"hits": 0, "misses": 0, "bypassed": 0, "invalidations": 0}
+            )
+            counters[what] += 1
+
+    def get(self, kind: str, key) -> Any:
+        if _fresh.get():
+            self._count(kind, "bypassed")
+            return _MISSING
+        value = self.backend.get(kind, str(key))
+        self._count(kind, "misses" if value is _MISSING else "hits")
+        return value
+
+    def set(self, kind: str, key, value: Any) -> None:
+        ttl = self.ttls.get(kind, 0)
+        if ttl > 0:
+            self.backend.set(kind, str(key), value, ttl)
+
+    def invalidate(self, kind: str, key) -> None:
+        self.backend.delete(kind, str(key))
+        self._count(kind, "invalidations")
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = {kind: dict(c) for kind, c in self._stats.items()}
+        out["entries"] = self.backend.size()
+        return out
+
+
+_cache: Optional[TTLCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> TTLCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                settings = get_settings()
+                if settings.cache_backend == "sqlite":
+                    backend = SqliteBackend(settings.cache_path, settings.cache_max_entries)
+                else:
+                    backend = MemoryBackend(settings.cache_max_entries)
+                _cache = TTLCache(
+                    backend,
+                    {"record": settings.cache_ttl_record, "contact": settings.cache_ttl_contact},
+                )
+    return _cache
+
+
+def cached(kind: str):
+    """
+    Read-through cache for single-key lookups. Results carrying an "error"
+    (the ensure_authorized error dicts) are never cached.
+    """
+
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(key):
+            cache = get_cache()
+            value = cache.get(kind, key)
+            if value is not _MISSING:
+                return value
+            value = fn(key)
+            if not (isinstance(value, dict) and "error" in value):
+                cache.set(kind, key, value)
+            return value
+
+        return wrapper
+
+    return decorator
+
+
+async def _off_loop(method, *args):
+    # the sqlite backend can wait on another worker's write: use a thread
+    if isinstance(get_cache().backend, SqliteBackend):
+        return await asyncio.to_thread(method, *args)
+    return method(*args)
+
+
+def cached_async(kind: str):
+    """
+    cached() for coroutine functions. With the sqlite backend the lookups
+    run in a thread, so a locked cache file never blocks the loop.
+    """
+
+    def decorator(fn):
+        @wraps(fn)
+        async def wrapper(key):
+            cache = get_cache()
+            value = await _off_loop(cache.get, kind, key)
+            if value is not _MISSING:
+                return value
+            value = await fn(key)
+            if not (isinstance(value, dict) and "error" in value):
+                await _off_loop(cache.set, kind, key, value)
+            return value
+
+        return wrapper
+
+    return decorator
+
+
+def invalidate(kind: str, key) -> None:
+    get_cache().invalidate(kind, key)
+
+
+async def invalidate_async(kind: str, key) -> None:
+    await _off_loop(get_cache().invalidate, kind, key)
+
+
+def cache_stats() -> dict:
+    return get_cache().stats()
@@ -1,2 +1,5 @@
-loginNAAPostUrl = "https://nationwideappearanceattorneys.net/api/users/login"
-getNAACasesUrl = 'https://nationwideappearanceattorneys.net/api/cases'
\ No newline at end of file
+from functions.helpers.settings import get_settings
+
+naaBaseUrl = get_settings().naa_base_url
+loginNAAPostUrl = f"{naaBaseUrl}/api/users/login"
+getNAACasesUrl = f"{naaBaseUrl}/api/cases"
\ No newline at end of file
@@ -0,0 +1,66 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+
+def map_bounded(
+    fn: Callable[[Any], Any],
+    items: Iterable[Any],
+    max_workers: int,
+) -> List[Tuple[Any, Optional[BaseException]]]:
+    """
+    Run `fn` over `items` with at most `max_workers` calls in flight.
+
+    Returns one `(result, exception)` pair per item, in input order. A failing
+    item never cancels the others; its exception is handed back instead.
+    Worker threads run in a copy of the caller's context, so contextvars such
+    as the rate-limit priority carry over.
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    def _call(item):
+        try:
+            return fn(item), None
+        except Exception as exc:
+            return None, exc
+
+    workers = max(1, min(int(max_workers), len(items)))
+    if workers == 1:
+        return [_call(item) for item in items]
+
+    ctx = contextvars.copy_context()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda item: ctx.copy().run(_call, item), items))
+
+
+def iter_bounded(
+    fn: Callable[[Any], Any],
+    items: Iterable[Any],
+    max_workers: int,
+) -> Iterator[Tuple[Any, Any, Optional[BaseException]]]:
+    """
+    Like map_bounded, but yields `(item, result, exception)` as each call
+    finishes instead of waiting for all of them. Closing the iterator early
+    cancels the calls that have not started yet.
+    """
+    items = list(items)
+    if not items:
+        return
+
+    def _call(item):
+        try:
+            return fn(item), None
+        except Exception as exc:
+            return None, exc
+
+    ctx = contextvars.copy_context()
+    workers = max(1, min(int(max_workers), len(items)))
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = {pool.submit(ctx.copy().run, _call, item): item for item in items}
+        for future in as_completed(futures):
+            yield (futures[future], *future.result())
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
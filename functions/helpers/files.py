@@ -0,0 +1,47 @@
+import fcntl
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+
+@contextmanager
+def file_lock(path: str, shared: bool = False):
+    """
+    Hold an advisory flock on `path` (created if missing) for the duration of
+    the block. Serialises work across gunicorn workers on the same host.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        yield
+    finally:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+
+def atomic_write_json(path: str, data: dict) -> None:
+    """
+    Write `data` to `path` via a temp file + rename so readers in other
+    processes only ever see the old or the new file, never a torn one.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
@@ -1,6 +1,12 @@
 import requests
 from typing import Optional, Dict, Any
 
+from functions.helpers import http_client
+from functions.helpers.log import get_logger
+from functions.helpers.retry import call_with_retry
+
+logger = get_logger(__name__)
+
 def _request(
     method: str,
     url: str,
@@ -9,21 +15,36 @@ def _request(
     json: Optional[Dict[str, Any]] = None,
     data: Optional[Dict[str, Any]] = None,
     files: Optional[Dict[str, Any]] = None,
+    timeout: Optional[Any] = None,
+    stream: bool = False,
+    idempotent: Optional[bool] = None,
 ) -> requests.Response:
     """
     Internal helper to make an HTTP request with uniform error handling.
-    Prints the error detail only for POST requests, then raises a new HTTPError
-    with status code and detail. Supports JSON, form-encoded data, or multipart files.
+    Logs the error detail as a warning (POST requests only), then raises a
+    new HTTPError with status code and detail. Supports JSON, form-encoded data, or multipart files.
+    Requests go through the pooled keep-alive session for the target host, with
+    retries and circuit breaking from functions.helpers.retry; `idempotent`
+    overrides the per-method default (POST is not retried once sent).
     """
-    response = requests.request(
-        method,
-        url,
-        headers=headers,
-        params=params,
-        json=json,
-        data=data,
-        files=files,            # ← pass through multipart uploads
-    )
+    def send(budget):
+        if hasattr(data, "rewind"):
+            # a streamed body (MultipartStream) is used up by the last attempt
+            data.rewind()
+        return http_client.send(
+            method,
+            url,
+            timeout=timeout,
+            budget=budget,
+            stream=stream,
+            headers=headers,
+            params=params,
+            json=json,
+            data=data,
+            files=files,            # ← pass through multipart uploads
+        )
+
+    response = call_with_retry(method, url, send, idempotent=idempotent)
     try:
         response.raise_for_status()
     except requests.exceptions.HTTPError:
@@ -33,9 +54,12 @@ def _request(
         except ValueError:
             detail = response.text
 
-        # Only POST prints the detail, just like the original
+        # Only POST logs the detail, just like the original
         if method.upper() == "POST":
-            print(f"detail {detail}")
+            logger.warning(
+                "upstream POST failed",
+                extra={"status": response.status_code, "endpoint": http_client.endpoint_template(url), "detail": str(detail)[:500]},
+            )
 
         # Re-raise with more context
         raise requests.exceptions.HTTPError(
@@ -50,13 +74,17 @@ def requestPost(
     formbody: Optional[Dict[str, Any]] = None,
     files:   Optional[Dict[str, Any]] = None,
     headers: Optional[Dict[str, Any]] = None,
-    data: Optional[Dict[str, Any]] = None
+    data: Optional[Any] = None,
+    idempotent: Optional[bool] = None
 ) -> requests.Response:
     """
     Sends a POST request.
       - If `files` is provided, does a multipart/form-data upload.
+      - Elif `data` is provided, sends it as the raw body (bytes or a
+        file-like stream); set Content-Type in `headers`.
       - Elif `formbody` is provided, sends application/x-www-form-urlencoded.
       - Else, sends JSON (`payload`).
+    Pass `idempotent=True` for POSTs that are safe to resend (e.g. logins).
     """
     if files is not None:
         # multipart/form-data; requests will set Content-Type and boundary
@@ -64,7 +92,17 @@ def requestPost(
             "POST",
             url,
             headers=headers,
-            files=files
+            files=files,
+            idempotent=idempotent
+        )
+
+    if data is not None:
+        return _request(
+            "POST",
+            url,
+            headers=headers,
+            data=data,
+            idempotent=idempotent
         )
 
     # fall back to form-encoded vs JSON
@@ -73,16 +111,18 @@ def requestPost(
         url,
         headers=headers,
         data=formbody,
-        json=None if formbody is not None else payload
+        json=None if formbody is not None else payload,
+        idempotent=idempotent
     )
 
 
 def requestGet(
     url: str,
     headers: Dict[str, Any],
-    params: Optional[Dict[str, Any]] = None
+    params: Optional[Dict[str, Any]] = None,
+    stream: bool = False
 ) -> requests.Response:
-    return _request("GET", url, headers=headers, params=params)
+    return _request("GET", url, headers=headers, params=params, stream=stream)
 
 def requestPatch(
     url: str,
@@ -0,0 +1,206 @@
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from functions.helpers import metrics
+from functions.helpers.settings import get_settings
+
+# One keep-alive Session per upstream host (Zoho API, Zoho accounts, NAA).
+# Sessions hold open sockets, so they must never be shared between a gunicorn
+# master and its forked workers: the registry is dropped in every child.
+_sessions: Dict[str, requests.Session] = {}
+_stats: Dict[str, Dict[str, int]] = {}
+_lock = threading.Lock()
+_pid = os.getpid()
+
+_ID_SEGMENT = re.compile(r"^(\d+|[0-9a-fA-F-]{16,})$")
+
+UPSTREAM_REQUESTS = metrics.Counter(
+    "upstream_requests_total",
+    "Upstream HTTP attempts by host, method, endpoint template and status.",
+    ("host", "method", "endpoint", "status"),
+)
+UPSTREAM_LATENCY = metrics.Histogram(
+    "upstream_request_duration_seconds",
+    "Time to response headers for upstream HTTP attempts.",
+    ("host", "method", "endpoint"),
+)
+UPSTREAM_IN_FLIGHT = metrics.Gauge(
+    "upstream_requests_in_flight",
+    "Upstream HTTP attempts currently waiting on a response.",
+    ("host",),
+)
+
+
+def default_timeout() -> Tuple[float, float]:
+    """(connect, read) timeout applied to every upstream call."""
+    settings = get_settings()
+    return (settings.http_connect_timeout, settings.http_read_timeout)
+
+
+# floor for a retry's timeout when little of the retry budget is left
+MIN_ATTEMPT_SECONDS = 0.5
+
+
+def bounded_timeout(timeout: Optional[Any] = None, budget: Optional[float] = None) -> Tuple[float, float]:
+    """
+    `timeout` (default: default_timeout()) as (connect, read), with each part
+    capped at `budget` seconds when given. The retry policy passes a budget
+    only for retries (see functions.helpers.retry), so a first attempt always
+    waits the full HTTP_READ_TIMEOUT even when RETRY_BUDGET_SECONDS is shorter.
+    """
+    if timeout is None:
+        timeout = default_timeout()
+    connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+    if budget is not None:
+        budget = max(budget, MIN_ATTEMPT_SECONDS)
+        connect, read = min(connect, budget), min(read, budget)
+    return (connect, read)
+
+
+def host_key(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def endpoint_template(url: str) -> str:
+    """
+    The URL path with record/case/file ids replaced by ":id", so metrics are
+    labelled per endpoint rather than per record.
+    """
+    segments = urlsplit(url).path.split("/")
+    return "/".join(":id" if _ID_SEGMENT.match(s) else s for s in segments) or "/"
+
+
+def _new_session() -> requests.Session:
+    pool_size = get_settings().http_pool_maxsize
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=pool_size,
+        pool_block=False,
+        max_retries=0,
+    )
+    session = requests.Session()
+    session.headers["Connection"] = "keep-alive"
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _reset_after_fork() -> None:
+    global _sessions, _stats, _lock, _pid
+    # Don't close the inherited sessions: the sockets belong to the parent.
+    _sessions = {}
+    _stats = {}
+    _lock = threading.Lock()
+    _pid = os.getpid()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_session(url: str) -> requests.Session:
+    """
+    Return the pooled Session for the host in `url`, creating it on first use.
+    """
+    if os.getpid() != _pid:
+        _reset_after_fork()
+
+    key = host_key(url)
+    session = _sessions.get(key)
+    if session is not None:
+        return session
+
+    with _lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = _new_session()
+            # _sessions is read without the lock: publish the stats first
+            _stats[key] = {"requests": 0, "errors": 0, "inFlight": 0}
+            _sessions[key] = session
+    return session
+
+
+def send(
+    method: str,
+    url: str,
+    timeout: Optional[Any] = None,
+    budget: Optional[float] = None,
+    **kwargs,
+) -> requests.Response:
+    """
+    Issue a request through the pooled Session for `url`'s host, with
+    `timeout` capped at `budget` seconds (see bounded_timeout).
+    """
+    session = get_session(url)
+    key = host_key(url)
+    stats = _stats[key]
+    labels = {"host": key, "method": method.upper(), "endpoint": endpoint_template(url)}
+    status = "error"
+    with _lock:
+        stats["requests"] += 1
+        stats["inFlight"] += 1
+    UPSTREAM_IN_FLIGHT.inc(host=key)
+    started = time.perf_counter()
+    try:
+        response = session.request(
+            method,
+            url,
+            timeout=bounded_timeout(timeout, budget),
+            **kwargs,
+        )
+        status = str(response.status_code)
+        return response
+    except requests.exceptions.RequestException:
+        with _lock:
+            stats["errors"] += 1
+        raise
+    finally:
+        UPSTREAM_LATENCY.observe(time.perf_counter() - started, **labels)
+        UPSTREAM_REQUESTS.inc(status=status, **labels)
+        UPSTREAM_IN_FLIGHT.dec(host=key)
+        with _lock:
+            stats["inFlight"] -= 1
+
+
+def pool_stats() -> Dict[str, Dict[str, int]]:
+    """
+    Per-host usage counters: requests sent, transport errors, requests in
+    flight, connections opened and connections currently idle in the pool.
+    """
+    out = {}
+    with _lock:
+        items = list(_sessions.items())
+        snapshot = {k: dict(v) for k, v in _stats.items()}
+    for key, session in items:
+        opened = idle = 0
+        adapter = session.get_adapter(key + "/")
+        for pool_key in list(adapter.poolmanager.pools.keys()):
+            pool = adapter.poolmanager.pools.get(pool_key)
+            if pool is None:
+                continue
+            opened += pool.num_connections
+            if pool.pool is not None:
+                # unfilled slots are held as None placeholders
+                idle += sum(1 for conn in list(pool.pool.queue) if conn is not None)
+        entry = snapshot.get(key, {})
+        entry["connectionsOpened"] = opened
+        entry["connectionsIdle"] = idle
+        out[key] = entry
+    return out
+
+
+def close_all() -> None:
+    """Close every pooled Session owned by this process."""
+    with _lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.close()
@@ -0,0 +1,186 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from functions.helpers.settings import get_settings
+from functions.helpers.sqlite_store import connect
+
+# Background jobs for endpoints that opt into async mode. State lives in
+# SQLite so any gunicorn worker can answer GET /jobs/<id>, and a job whose
+# worker died (e.g. --max-requests recycling) is reported as interrupted
+# instead of sitting in "running" forever. A job records its worker's PID and
+# start time, so a PID the OS has since handed to another process doesn't
+# keep a dead worker's jobs "running".
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          TEXT PRIMARY KEY,
+    kind        TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    payload     TEXT,
+    result      TEXT,
+    status_code INTEGER,
+    pid         INTEGER,
+    pid_start   INTEGER,
+    created_at  REAL NOT NULL,
+    started_at  REAL,
+    finished_at REAL
+)
+"""
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_pid: Optional[int] = None
+_lock = threading.Lock()
+_migrated = set()
+
+
+def _db():
+    path = get_settings().job_store_path
+    conn = connect(path)
+    conn.execute(_SCHEMA)
+    if path not in _migrated:
+        try:
+            # stores created before jobs recorded their worker's start time
+            conn.execute("ALTER TABLE jobs ADD COLUMN pid_start INTEGER")
+        except sqlite3.OperationalError:
+            pass
+        _migrated.add(path)
+    return conn
+
+
+def _start_time(pid: int) -> Optional[int]:
+    """When `pid` started, in clock ticks since boot; None where /proc can't say."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # the command name (field 2) may contain spaces; starttime is field 22
+    try:
+        return int(stat[stat.rindex(")") + 2:].split()[19])
+    except (ValueError, IndexError):
+        return None
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _owner_alive(pid: int, pid_start: Optional[int]) -> bool:
+    """Whether the process that queued a job (its PID and start time) still runs."""
+    if not _pid_alive(pid):
+        return False
+    if pid_start is None:
+        return True
+    started = _start_time(pid)
+    return started is None or started == pid_start
+
+
+def _reap(conn) -> None:
+    """Mark jobs owned by dead processes as interrupted; drop expired ones."""
+    now = time.time()
+    rows = conn.execute(
+        "SELECT id, pid, pid_start FROM jobs WHERE status IN ('queued', 'running')"
+    ).fetchall()
+    for job_id, pid, pid_start in rows:
+        if pid is not None and not _owner_alive(pid, pid_start):
+            conn.execute(
+                "UPDATE jobs SET status = 'interrupted', finished_at = ? "
+                "WHERE id = ? AND status IN ('queued', 'running')",
+                (now, job_id),
+            )
+    conn.execute(
+        "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+        (now - get_settings().job_retention_seconds,),
+    )
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        with _lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(
+                    max_workers=get_settings().job_max_workers,
+                    thread_name_prefix="job",
+                )
+                _executor_pid = os.getpid()
+    return _executor
+
+
+def _run(job_id: str, fn: Callable[..., dict], args: tuple) -> None:
+    conn = _db()
+    conn.execute(
+        "UPDATE jobs SET status = 'running', started_at = ? WHERE id = ?",
+        (time.time(), job_id),
+    )
+    try:
+        result = fn(*args)
+    except Exception as e:
+        result = {"error": str(e), "statusCode": 500}
+    result = dict(result) if isinstance(result, dict) else {"response": result}
+    status_code = result.pop("statusCode", None)
+    if status_code is None:
+        status_code = 200 if "error" not in result else 500
+    conn.execute(
+        "UPDATE jobs SET status = ?, result = ?, status_code = ?, finished_at = ? WHERE id = ?",
+        (
+            "succeeded" if status_code < 400 else "failed",
+            json.dumps(result, default=str),
+            status_code,
+            time.time(),
+            job_id,
+        ),
+    )
+
+
+def submit(kind: str, fn: Callable[..., dict], *args: Any, payload: Optional[dict] = None) -> str:
+    """
+    Queue `fn(*args)` on this worker's background executor. `fn` returns the
+    same ``{..., "statusCode"}`` dicts the synchronous endpoints use.
+    Returns the new job id.
+    """
+    job_id = uuid.uuid4().hex
+    conn = _db()
+    _reap(conn)
+    conn.execute(
+        "INSERT INTO jobs (id, kind, status, payload, pid, pid_start, created_at) "
+        "VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+        (job_id, kind, json.dumps(payload or {}), os.getpid(), _start_time(os.getpid()), time.time()),
+    )
+    _pool().submit(_run, job_id, fn, args)
+    return job_id
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    conn = _db()
+    _reap(conn)
+    row = conn.execute(
+        "SELECT id, kind, status, payload, result, status_code, created_at, started_at, finished_at "
+        "FROM jobs WHERE id = ?",
+        (job_id,),
+    ).fetchone()
+    if row is None:
+        return None
+    job_id, kind, status, payload, result, status_code, created, started, finished = row
+    return {
+        "jobID": job_id,
+        "kind": kind,
+        "status": status,
+        "request": json.loads(payload) if payload else None,
+        "result": json.loads(result) if result else None,
+        "resultStatusCode": status_code,
+        "createdAt": created,
+        "startedAt": started,
+        "finishedAt": finished,
+    }
@@ -0,0 +1,57 @@
+import time
+from typing import Optional, Tuple
+
+from functions.helpers.sqlite_store import connect
+
+# Named, expiring leases. The holder must renew before `ttl` runs out;
+# if its process dies the lease simply lapses and another owner takes over.
+# Put the database on storage shared by all nodes to elect across hosts.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    name       TEXT PRIMARY KEY,
+    owner      TEXT NOT NULL,
+    expires_at REAL NOT NULL
+)
+"""
+
+
+def _db(path: str):
+    conn = connect(path)
+    conn.execute(_SCHEMA)
+    return conn
+
+
+def acquire(path: str, name: str, owner: str, ttl: float) -> bool:
+    """Take or renew lease `name` for `owner`. True if `owner` now holds it."""
+    conn = _db(path)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        now = time.time()
+        row = conn.execute(
+            "SELECT owner, expires_at FROM leases WHERE name = ?", (name,)
+        ).fetchone()
+        if row is not None and row[0] != owner and row[1] > now:
+            conn.execute("COMMIT")
+            return False
+        conn.execute(
+            "INSERT OR REPLACE INTO leases (name, owner, expires_at) VALUES (?, ?, ?)",
+            (name, owner, now + ttl),
+        )
+        conn.execute("COMMIT")
+        return True
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def release(path: str, name: str, owner: str) -> None:
+    _db(path).execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+
+def holder(path: str, name: str) -> Optional[Tuple[str, float]]:
+    """(owner, expires_at) of a live lease, or None."""
+    row = _db(path).execute(
+        "SELECT owner, expires_at FROM leases WHERE name = ? AND expires_at > ?",
+        (name, time.time()),
+    ).fetchone()
+    return (row[0], row[1]) if row else None
@@ -0,0 +1,180 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Optional
+
+from functions.helpers.settings import get_settings
+
+# Structured JSON logging that never blocks a request on stdout.
+#
+# Callers log through the standard `logging` API, with their fields passed as
+# `extra`:
+#
+#     logger = get_logger(__name__)
+#     logger.info("case created", extra={"matterID": matterID, "caseID": caseID})
+#
+# Records go through a bounded queue; one background thread per process
+# formats them as JSON lines on stdout. When the queue is full, records are
+# dropped and counted rather than blocking the caller.
+#
+# Importing this module configures nothing. Each process entry point calls
+# configure_logging() once it is running: gunicorn's post_worker_init, the
+# ASGI app's before_serving hook and `python server.py`. That keeps the
+# writer thread (and the root logger's setup) out of the --preload'ed
+# master, and out of anything that merely imports the package.
+#
+# - Redaction: values under client-name and credential keys are masked, and
+#   bearer/Zoho tokens are masked inside strings.
+# - Sampling: records logged with extra={"sample": True} (or a float rate) are
+#   kept at LOG_SAMPLE_RATE. Use it for per-record messages in loops.
+
+REDACTED = "[redacted]"
+REDACT_KEYS = {
+    "authorization",
+    "token",
+    "access_token",
+    "refresh_token",
+    "client_secret",
+    "password",
+    "casename",
+    "caseclientname",
+    "contact_name",
+    "client_name",
+    # Zoho's Matter lookup: its name is the deal's, usually the client's
+    "matter",
+    "email",
+}
+_TOKEN_PATTERN = re.compile(r"(?i)\b(bearer|zoho-oauthtoken)\s+[\w.\-~+/=]+")
+_STANDARD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "sample"}
+
+_lock = threading.Lock()
+_handler: Optional["_NonBlockingHandler"] = None
+
+
+def redact(value: Any, _depth: int = 0) -> Any:
+    """Copy of `value` with client names and credentials masked."""
+    if _depth > 8:
+        return value
+    if isinstance(value, dict):
+        return {
+            k: REDACTED if str(k).lower() in REDACT_KEYS else redact(v, _depth + 1)
+            for k, v in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(v, _depth + 1) for v in value]
+    if isinstance(value, str):
+        return _TOKEN_PATTERN.sub(lambda m: f"{m.group(1)} {REDACTED}", value)
+    return value
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        out = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+            + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": redact(record.getMessage()),
+            "pid": record.process,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                out[key] = REDACTED if key.lower() in REDACT_KEYS else redact(value)
+        if record.exc_text:
+            out["exc"] = redact(record.exc_text)
+        return json.dumps(out, default=str)
+
+
+class _SamplingFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        sample = getattr(record, "sample", None)
+        if sample is None or sample is False:
+            return True
+        rate = get_settings().log_sample_rate if sample is True else float(sample)
+        if random.random() >= rate:
+            return False
+        record.sampleRate = rate
+        return True
+
+
+class _NonBlockingHandler(QueueHandler):
+    """
+    QueueHandler with a bounded queue that drops instead of blocking, and
+    that restarts its writer thread in forked children (gunicorn --preload).
+    """
+
+    def __init__(self, maxsize: int):
+        self._maxsize = maxsize
+        self.dropped = 0
+        super().__init__(queue.Queue(maxsize))
+        self.addFilter(_SamplingFilter())
+        self._start()
+
+    def _start(self) -> None:
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(JsonFormatter())
+        self._pid = os.getpid()
+        self.listener = QueueListener(self.queue, stream)
+        self.listener.start()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Leave JSON encoding to the writer thread; only resolve what can't
+        # cross threads (args may be mutated, tracebacks are frame-bound).
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self._pid != os.getpid():
+            with _lock:
+                if self._pid != os.getpid():
+                    self.queue = queue.Queue(self._maxsize)
+                    self.dropped = 0
+                    self._start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self) -> None:
+        if self._pid == os.getpid():
+            self.listener.stop()
+
+
+def configure_logging() -> None:
+    """Install the JSON queue handler on the root logger (once per process)."""
+    global _handler
+    if _handler is not None:
+        return
+    with _lock:
+        if _handler is not None:
+            return
+        settings = get_settings()
+        handler = _NonBlockingHandler(settings.log_queue_size)
+        root = logging.getLogger()
+        root.handlers = [h for h in root.handlers if not isinstance(h, _NonBlockingHandler)]
+        root.addHandler(handler)
+        root.setLevel(settings.log_level)
+        atexit.register(handler.stop)
+        _handler = handler
+
+
+def get_logger(name: str) -> logging.Logger:
+    """A standard logger; its records reach stdout once configure_logging() ran."""
+    return logging.getLogger(name)
+
+
+def dropped() -> int:
+    """Records dropped by this process because the log queue was full."""
+    return _handler.dropped if _handler is not None else 0
@@ -0,0 +1,373 @@
+import atexit
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from functions.helpers.files import atomic_write_json, file_lock
+from functions.helpers.log import get_logger
+from functions.helpers.settings import get_settings
+
+# Prometheus-style metrics that add up across gunicorn workers.
+#
+# Each process keeps its samples in memory and writes them to
+# METRICS_DIR/<pid>-<token>.json every METRICS_FLUSH_INTERVAL seconds and at
+# exit, where <token> is a random id drawn once per process. /metrics merges
+# every snapshot: counters and histograms are summed, gauges are combined per
+# their `aggregate` mode over live workers only. Counters of workers that have
+# exited (--max-requests recycles them often) are folded into archive.json so
+# totals never go backwards. The token keeps a recycled PID from overwriting
+# its predecessor's snapshot: a process's first flush folds any other
+# snapshot under its own PID, which can only be a dead one's. METRICS_DIR must
+# be local to the host; scrape each host separately.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, float("inf"))
+
+_ARCHIVE = "archive.json"
+
+logger = get_logger(__name__)
+
+_metrics: Dict[str, "_Metric"] = {}
+_collectors: List[Callable[[], Iterable[dict]]] = []
+_lock = threading.Lock()
+_pid = os.getpid()
+_token = uuid.uuid4().hex
+_claimed = False
+_flusher: Optional[threading.Thread] = None
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        with _lock:
+            _metrics[name] = self
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _family(self) -> dict:
+        return {
+            "kind": self.kind,
+            "help": self.help,
+            "labelnames": list(self.labelnames),
+            "samples": [[list(k), v] for k, v in self._values.items()],
+        }
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        _ensure_flusher()
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), aggregate: str = "sum"):
+        super().__init__(name, help, labelnames)
+        self.aggregate = aggregate
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        _ensure_flusher()
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        _ensure_flusher()
+        with _lock:
+            self._values[self._key(labels)] = value
+
+    def _family(self) -> dict:
+        out = super()._family()
+        out["aggregate"] = self.aggregate
+        return out
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        buckets = tuple(sorted(buckets))
+        if buckets[-1] != float("inf"):
+            buckets += (float("inf"),)
+        self.buckets = buckets
+
+    def observe(self, value: float, **labels) -> None:
+        _ensure_flusher()
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # per-bucket (non-cumulative) counts, then sum and count
+                entry = [0] * len(self.buckets) + [0.0, 0]
+                self._values[key] = entry
+            entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def _family(self) -> dict:
+        out = super()._family()
+        out["samples"] = [[k, list(v)] for k, v in out["samples"]]
+        out["buckets"] = [_fmt(b) for b in self.buckets]
+        return out
+
+
+def register_collector(fn: Callable[[], Iterable[dict]]) -> None:
+    """
+    Add a callable evaluated at every flush. It yields metric families:
+    dicts with "name", "kind" ("counter" or "gauge"), "help", "labelnames",
+    "samples" ([[labelvalues], value] pairs) and optionally "aggregate".
+    Use it to export counters a module already keeps for its *_stats().
+    """
+    with _lock:
+        _collectors.append(fn)
+
+
+def _reset_after_fork() -> None:
+    global _lock, _pid, _token, _claimed, _flusher
+    _lock = threading.Lock()
+    _pid = os.getpid()
+    _token = uuid.uuid4().hex
+    _claimed = False
+    _flusher = None
+    for metric in _metrics.values():
+        metric._values = {}
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _metrics_dir() -> str:
+    return get_settings().metrics_dir
+
+
+def _snapshot() -> dict:
+    with _lock:
+        families = {name: m._family() for name, m in _metrics.items()}
+        collectors = list(_collectors)
+    for collect in collectors:
+        try:
+            for family in collect():
+                family = dict(family)
+                families[family.pop("name")] = family
+        except Exception as e:
+            logger.warning(
+                "metrics collector failed",
+                extra={"collector": getattr(collect, "__name__", str(collect)), "error": str(e)},
+            )
+    return {"pid": os.getpid(), "written": time.time(), "metrics": families}
+
+
+def _snapshot_pid(path: str) -> Optional[int]:
+    """The PID in a snapshot's file name (<pid>-<token>.json, or <pid>.json)."""
+    base = os.path.basename(path)[: -len(".json")]
+    try:
+        return int(base.partition("-")[0])
+    except ValueError:
+        return None
+
+
+def _fold(directory: str, paths: List[str]) -> Dict[str, dict]:
+    """
+    Add the counters of exited processes' snapshots at `paths` to the archive,
+    remove them, and return the archive. Call with the directory lock held.
+    """
+    archive_path = os.path.join(directory, _ARCHIVE)
+    archive: Dict[str, dict] = {}
+    archive_data = _read(archive_path)
+    if archive_data:
+        _merge(archive, archive_data["metrics"], include_gauges=False)
+    folded = []
+    for path in paths:
+        data = _read(path)
+        if data is None:
+            continue
+        _merge(archive, data["metrics"], include_gauges=False)
+        folded.append(path)
+    if folded:
+        atomic_write_json(archive_path, {"metrics": _archive_families(archive)})
+        for path in folded:
+            os.unlink(path)
+    return archive
+
+
+def _claim(directory: str) -> None:
+    """Fold snapshots left under this PID by an exited process that had it."""
+    global _claimed
+    own = f"{os.getpid()}-{_token}.json"
+    with file_lock(os.path.join(directory, ".lock")):
+        _fold(directory, [
+            path for path in glob.glob(os.path.join(directory, "*.json"))
+            if os.path.basename(path) not in (_ARCHIVE, own) and _snapshot_pid(path) == os.getpid()
+        ])
+    _claimed = True
+
+
+def flush() -> None:
+    """Write this process's snapshot for /metrics to pick up."""
+    if not get_settings().metrics_enabled:
+        return
+    if os.getpid() != _pid:
+        _reset_after_fork()
+    directory = _metrics_dir()
+    if not _claimed:
+        _claim(directory)
+    atomic_write_json(os.path.join(directory, f"{os.getpid()}-{_token}.json"), _snapshot())
+
+
+def _flush_loop() -> None:
+    interval = get_settings().metrics_flush_interval
+    while True:
+        time.sleep(interval)
+        try:
+            flush()
+        except Exception as e:
+            logger.warning("metrics flush failed", extra={"error": str(e)})
+
+
+def _ensure_flusher() -> None:
+    global _flusher
+    if os.getpid() != _pid:
+        _reset_after_fork()
+    if _flusher is not None:
+        return
+    with _lock:
+        if _flusher is None and get_settings().metrics_enabled:
+            _flusher = threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True)
+            _flusher.start()
+            atexit.register(flush)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _read(path: str) -> Optional[dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _merge(into: Dict[str, dict], families: Dict[str, dict], include_gauges: bool) -> None:
+    for name, family in families.items():
+        kind = family["kind"]
+        if kind == "gauge" and not include_gauges:
+            continue
+        target = into.setdefault(name, {k: v for k, v in family.items() if k != "samples"})
+        target.setdefault("values", {})
+        aggregate = family.get("aggregate", "sum")
+        for labelvalues, value in family["samples"]:
+            key = tuple(labelvalues)
+            current = target["values"].get(key)
+            if current is None:
+                target["values"][key] = list(value) if kind == "histogram" else value
+            elif kind == "histogram":
+                target["values"][key] = [a + b for a, b in zip(current, value)]
+            elif kind == "gauge" and aggregate == "max":
+                target["values"][key] = max(current, value)
+            elif kind == "gauge" and aggregate == "min":
+                target["values"][key] = min(current, value)
+            else:
+                target["values"][key] = current + value
+
+
+def _archive_families(merged: Dict[str, dict]) -> Dict[str, dict]:
+    out = {}
+    for name, family in merged.items():
+        family = dict(family)
+        values = family.pop("values")
+        family["samples"] = [[list(k), v] for k, v in values.items()]
+        out[name] = family
+    return out
+
+
+def collect() -> Dict[str, dict]:
+    """Merge the snapshots of every worker on this host."""
+    directory = _metrics_dir()
+    flush()
+    merged: Dict[str, dict] = {}
+    with file_lock(os.path.join(directory, ".lock")):
+        exited = []
+        for path in glob.glob(os.path.join(directory, "*.json")):
+            if os.path.basename(path) == _ARCHIVE:
+                continue
+            pid = _snapshot_pid(path)
+            if pid is None:
+                continue
+            if not _alive(pid):
+                exited.append(path)
+                continue
+            data = _read(path)
+            if data is not None:
+                _merge(merged, data["metrics"], include_gauges=True)
+        archive = _fold(directory, exited)
+    _merge(merged, _archive_families(archive), include_gauges=False)
+    return merged
+
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(str(v))}"' for n, v in pairs) + "}"
+
+
+def render() -> str:
+    """The merged metrics in the Prometheus text exposition format."""
+    lines = []
+    for name, family in sorted(collect().items()):
+        kind = family["kind"]
+        names = family.get("labelnames", [])
+        lines.append(f"# HELP {name} {family.get('help', '')}")
+        lines.append(f"# TYPE {name} {kind}")
+        for key, value in sorted(family["values"].items()):
+            if kind != "histogram":
+                lines.append(f"{name}{_labels(names, key)} {_fmt(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(family["buckets"], value[:-2]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(names, key, (('le', bound),))} {_fmt(cumulative)}")
+            lines.append(f"{name}_sum{_labels(names, key)} {_fmt(value[-2])}")
+            lines.append(f"{name}_count{_labels(names, key)} {_fmt(value[-1])}")
+    return "\n".join(lines) + "\n"
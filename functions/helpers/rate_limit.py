@@ -0,0 +1,188 @@
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Dict, Tuple
+
+from functions.helpers.settings import get_settings
+from functions.helpers.sqlite_store import connect
+
+# Token buckets for Zoho API credits, shared by every gunicorn worker on the
+# host through one SQLite row per bucket (updated inside BEGIN IMMEDIATE, so
+# refill + take is atomic across processes).
+#
+# Background work (the sync) may not dip into the last
+# RATE_LIMIT_BACKGROUND_RESERVE share of a bucket, which keeps headroom for
+# interactive endpoints when both compete.
+#
+# @rate_limited goes inside @ensure_authorized, so the retry after a token
+# refresh (a second upstream request) takes its own token.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    name       TEXT PRIMARY KEY,
+    tokens     REAL NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+_priority: ContextVar[str] = ContextVar("rate_limit_priority", default=INTERACTIVE)
+
+_stats: Dict[Tuple[str, str], Dict[str, float]] = {}
+_stats_lock = threading.Lock()
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a bucket stays empty for longer than RATE_LIMIT_MAX_WAIT."""
+
+
+@contextmanager
+def background_priority():
+    """Mark calls made inside the block as background (lower priority)."""
+    token = _priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def _rate(bucket: str) -> float:
+    """Tokens per second for `bucket`."""
+    settings = get_settings()
+    per_minute = {
+        "zoho_read": settings.zoho_read_per_minute,
+        "zoho_write": settings.zoho_write_per_minute,
+        "zoho_file": settings.zoho_file_per_minute,
+    }[bucket]
+    return per_minute / 60.0
+
+
+def _try_take(bucket: str, priority: str) -> float:
+    """Take one token if allowed; returns 0 on success, else seconds to wait."""
+    settings = get_settings()
+    rate = _rate(bucket)
+    capacity = max(1.0, rate * settings.rate_limit_burst_seconds)
+    floor = 0.0
+    if priority == BACKGROUND:
+        floor = min(capacity * settings.rate_limit_background_reserve, capacity - 1.0)
+
+    conn = connect(settings.rate_limit_path)
+    conn.execute(_SCHEMA)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        now = time.time()
+        row = conn.execute(
+            "SELECT tokens, updated_at FROM buckets WHERE name = ?", (bucket,)
+        ).fetchone()
+        tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+        if tokens - 1.0 >= floor:
+            tokens -= 1.0
+            wait = 0.0
+        else:
+            wait = (1.0 + floor - tokens) / rate
+        conn.execute(
+            "INSERT OR REPLACE INTO buckets (name, tokens, updated_at) VALUES (?, ?, ?)",
+            (bucket, tokens, now),
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return wait
+
+
+def _record(bucket: str, priority: str, waited: float) -> None:
+    with _stats_lock:
+        s = _stats.setdefault(
+            (bucket, priority),
+            {"acquired": 0, "waited": 0, "waitSecondsTotal": 0.0, "waitSecondsMax": 0.0},
+        )
+        s["acquired"] += 1
+        if waited > 0:
+            s["waited"] += 1
+            s["waitSecondsTotal"] += waited
+            s["waitSecondsMax"] = max(s["waitSecondsMax"], waited)
+
+
+def acquire(bucket: str) -> float:
+    """
+    Block until `bucket` ("zoho_read", "zoho_write" or "zoho_file") grants a
+    token for the current priority. Returns the seconds spent waiting.
+    """
+    settings = get_settings()
+    if not settings.rate_limit_enabled:
+        return 0.0
+    priority = _priority.get()
+    start = time.monotonic()
+    slept = False
+    while True:
+        wait = _try_take(bucket, priority)
+        waited = time.monotonic() - start if slept else 0.0
+        if wait <= 0:
+            _record(bucket, priority, waited)
+            return waited
+        if waited + wait > settings.rate_limit_max_wait:
+            raise RateLimitExceeded(
+                f"{bucket} rate limit: no capacity within {settings.rate_limit_max_wait}s ({priority})"
+            )
+        time.sleep(min(wait, 0.5))
+        slept = True
+
+
+async def acquire_async(bucket: str) -> float:
+    """acquire() that sleeps on the event loop instead of the thread."""
+    settings = get_settings()
+    if not settings.rate_limit_enabled:
+        return 0.0
+    priority = _priority.get()
+    start = time.monotonic()
+    slept = False
+    while True:
+        # BEGIN IMMEDIATE can wait on another worker: keep it off the loop
+        wait = await asyncio.to_thread(_try_take, bucket, priority)
+        waited = time.monotonic() - start if slept else 0.0
+        if wait <= 0:
+            _record(bucket, priority, waited)
+            return waited
+        if waited + wait > settings.rate_limit_max_wait:
+            raise RateLimitExceeded(
+                f"{bucket} rate limit: no capacity within {settings.rate_limit_max_wait}s ({priority})"
+            )
+        await asyncio.sleep(min(wait, 0.5))
+        slept = True
+
+
+def rate_limited(bucket: str):
+    """Decorator: take one `bucket` token before each call."""
+
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            acquire(bucket)
+            return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def rate_limited_async(bucket: str):
+    """rate_limited for coroutine functions."""
+
+    def decorator(fn):
+        @wraps(fn)
+        async def wrapper(*args, **kwargs):
+            await acquire_async(bucket)
+            return await fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def limiter_stats() -> dict:
+    with _stats_lock:
+        return {f"{bucket}:{priority}": dict(s) for (bucket, priority), s in _stats.items()}
@@ -0,0 +1,335 @@
+import asyncio
+import email.utils
+import os
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import requests
+from urllib3.exceptions import NewConnectionError
+
+from functions.helpers.http_client import host_key
+from functions.helpers.log import get_logger
+from functions.helpers.settings import get_settings
+
+logger = get_logger(__name__)
+
+# Retry policy for single upstream calls, applied inside _request:
+#   - transport errors and 429/5xx are retryable; other statuses are not;
+#   - non-idempotent calls (POST unless told otherwise) are only retried when
+#     the request provably never reached the server: a connect timeout, a
+#     connection that could not be opened, a 429, or an open circuit;
+#   - exponential backoff with full jitter, Retry-After honoured on 429/503,
+#     and a total time budget per call (RETRY_BUDGET_SECONDS). The budget
+#     bounds when retries may start and caps the timeouts of attempts after
+#     the first; the first attempt always gets the configured
+#     HTTP_CONNECT_TIMEOUT/HTTP_READ_TIMEOUT, so a slow upload is not cut
+#     short by a budget sized for retries. A first attempt that outlasts the
+#     budget is not retried;
+#   - a circuit breaker per host fails fast while an upstream is down.
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised without calling the upstream while its circuit is open."""
+
+
+class CircuitBreaker:
+    def __init__(self, host: str, failure_threshold: int, reset_seconds: float):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self.state == "closed":
+                return
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = "half_open"
+                self._probe_in_flight = False
+            if self.state == "half_open" and not self._probe_in_flight:
+                # let exactly one probe through
+                self._probe_in_flight = True
+                return
+        raise CircuitOpenError(f"circuit open for {self.host}; failing fast")
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def release_probe(self) -> None:
+        """
+        Resolve a half-open probe without a verdict (a 429, or an error that
+        says nothing about the host), so the next call may probe again.
+        """
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.opens += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+_stats = {"attempts": 0, "retries": 0, "giveUps": 0, "circuitRejections": 0}
+_stats_lock = threading.Lock()
+
+
+def _reset_after_fork() -> None:
+    global _breakers_lock, _stats_lock
+    _breakers.clear()
+    _breakers_lock = threading.Lock()
+    _stats_lock = threading.Lock()
+    # the parent's counts are the parent's: each process reports its own
+    for key in _stats:
+        _stats[key] = 0
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _count(key: str) -> None:
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def breaker_for(url: str) -> CircuitBreaker:
+    key = host_key(url)
+    breaker = _breakers.get(key)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(key)
+            if breaker is None:
+                settings = get_settings()
+                breaker = CircuitBreaker(
+                    key, settings.breaker_failure_threshold, settings.breaker_reset_seconds
+                )
+                _breakers[key] = breaker
+    return breaker
+
+
+def retry_after_seconds(response: requests.Response) -> Optional[float]:
+    """Seconds requested by a Retry-After header (delta or HTTP-date)."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def _backoff(attempt: int) -> float:
+    settings = get_settings()
+    ceiling = min(settings.retry_max_delay, settings.retry_base_delay * (2 ** (attempt - 1)))
+    return random.uniform(0, ceiling)
+
+
+def _never_connected(exc: BaseException) -> bool:
+    """
+    Whether `exc` wraps a failure to open the connection: urllib3's
+    NewConnectionError (refused, unreachable, DNS) or a ConnectionRefusedError,
+    anywhere in its cause/context chain or in urllib3's MaxRetryError.reason.
+    """
+    seen = set()
+    pending = [exc]
+    while pending:
+        current = pending.pop()
+        if current is None or id(current) in seen:
+            continue
+        seen.add(id(current))
+        if isinstance(current, (NewConnectionError, ConnectionRefusedError)):
+            return True
+        pending.extend((current.__cause__, current.__context__, getattr(current, "reason", None)))
+        pending.extend(arg for arg in current.args if isinstance(arg, BaseException))
+    return False
+
+
+def _safe_to_resend(exc: Exception, idempotent: bool) -> bool:
+    if isinstance(exc, CircuitOpenError):
+        return False
+    if idempotent:
+        return isinstance(exc, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+    # the request never left this host
+    return isinstance(exc, requests.exceptions.ConnectTimeout) or (
+        isinstance(exc, requests.exceptions.ConnectionError)
+        and not isinstance(exc, requests.exceptions.ReadTimeout)
+        and _never_connected(exc)
+    )
+
+
+def _start_attempt(breaker: CircuitBreaker) -> None:
+    try:
+        breaker.before_call()
+    except CircuitOpenError:
+        _count("circuitRejections")
+        raise
+    _count("attempts")
+
+
+def _next_delay(
+    method: str,
+    url: str,
+    attempt: int,
+    idempotent: bool,
+    breaker: CircuitBreaker,
+    response,
+    error: Optional[Exception],
+    deadline: float,
+) -> Optional[float]:
+    """
+    Record one attempt's outcome on the breaker and decide what happens next:
+    seconds to wait before retrying, or None to hand the outcome back (return
+    `response` / re-raise `error`).
+    """
+    settings = get_settings()
+    if error is not None:
+        breaker.record_failure()
+        if attempt >= settings.retry_max_attempts or not _safe_to_resend(error, idempotent):
+            if attempt > 1:
+                _count("giveUps")
+            return None
+        delay = _backoff(attempt)
+    else:
+        status = response.status_code
+        if status not in RETRY_STATUSES:
+            breaker.record_success()
+            return None
+        if status >= 500:
+            breaker.record_failure()
+        else:
+            # a 429 says the host is up but busy: neither heals nor trips it
+            breaker.release_probe()
+        if attempt >= settings.retry_max_attempts or not (idempotent or status == 429):
+            if attempt > 1:
+                _count("giveUps")
+            return None
+        delay = _backoff(attempt)
+        if status in (429, 503):
+            delay = max(delay, retry_after_seconds(response) or 0.0)
+
+    if time.monotonic() + delay > deadline:
+        _count("giveUps")
+        return None
+
+    _count("retries")
+    logger.info(
+        "retrying upstream call",
+        extra={"method": method, "host": host_key(url), "delay": round(delay, 2), "attempt": attempt + 1},
+    )
+    return delay
+
+
+def _attempt_budget(attempt: int, deadline: float) -> Optional[float]:
+    # retries fit in what is left of the budget; the first attempt doesn't
+    return None if attempt == 1 else deadline - time.monotonic()
+
+
+def call_with_retry(
+    method: str,
+    url: str,
+    send: Callable[[float], requests.Response],
+    idempotent: Optional[bool] = None,
+) -> requests.Response:
+    """
+    Call `send(budget)` under the retry policy and the circuit breaker for
+    `url`'s host. `budget` is None for the first attempt, which runs on the
+    configured timeouts, and the seconds left of RETRY_BUDGET_SECONDS for
+    each retry, to cap its timeout. Returns the last response (which may still be an error status for
+    the caller to raise on) or re-raises the last transport error.
+    """
+    if idempotent is None:
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+    breaker = breaker_for(url)
+    deadline = time.monotonic() + get_settings().retry_budget_seconds
+    attempt = 0
+
+    while True:
+        attempt += 1
+        _start_attempt(breaker)
+        response = error = None
+        try:
+            response = send(_attempt_budget(attempt, deadline))
+        except requests.exceptions.RequestException as exc:
+            error = exc
+        except BaseException:
+            breaker.release_probe()
+            raise
+        delay = _next_delay(method, url, attempt, idempotent, breaker, response, error, deadline)
+        if delay is None:
+            if error is not None:
+                raise error
+            return response
+        if response is not None:
+            response.close()
+        time.sleep(delay)
+
+
+async def call_with_retry_async(
+    method: str,
+    url: str,
+    send: Callable[[float], Awaitable[Any]],
+    idempotent: Optional[bool] = None,
+):
+    """call_with_retry for coroutine senders (async_http_client)."""
+    if idempotent is None:
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+    breaker = breaker_for(url)
+    deadline = time.monotonic() + get_settings().retry_budget_seconds
+    attempt = 0
+
+    while True:
+        attempt += 1
+        _start_attempt(breaker)
+        response = error = None
+        try:
+            response = await send(_attempt_budget(attempt, deadline))
+        except requests.exceptions.RequestException as exc:
+            error = exc
+        except BaseException:
+            # includes cancellation: never leave a probe outstanding
+            breaker.release_probe()
+            raise
+        delay = _next_delay(method, url, attempt, idempotent, breaker, response, error, deadline)
+        if delay is None:
+            if error is not None:
+                raise error
+            return response
+        if response is not None:
+            await response.aclose()
+        await asyncio.sleep(delay)
+
+
+def retry_stats() -> dict:
+    with _stats_lock:
+        out = dict(_stats)
+    with _breakers_lock:
+        out["circuits"] = {
+            host: {"state": b.state, "failures": b.failures, "opens": b.opens}
+            for host, b in _breakers.items()
+        }
+    return out
@@ -0,0 +1,239 @@
+import os
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+from dotenv import load_dotenv
+
+# All configuration is read here, once per process, from the environment
+# (with .env taking precedence, as before). Nothing in this module touches
+# the network, so importing the app stays cheap for recycled workers.
+
+
+def _int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() not in ("0", "false", "no", "off", "")
+
+
+@dataclass(frozen=True)
+class Settings:
+    # auth / upstream credentials
+    server_pass: Optional[str]
+    naa_email: Optional[str]
+    naa_password: Optional[str]
+    naa_base_url: str
+    zoho_client_id: Optional[str]
+    zoho_client_secret: Optional[str]
+    zoho_refresh_token: Optional[str]
+    zoho_api_domain: Optional[str]
+    zoho_accounts_url: str
+    zoho_access_token: Optional[str]
+
+    # http client
+    http_pool_maxsize: int
+    http_connect_timeout: float
+    http_read_timeout: float
+    async_http_max_connections: int
+
+    # document transfer
+    upload_max_workers: int
+    doc_transfer_streaming: bool
+    doc_spool_threshold: int
+
+    # batch endpoints
+    batch_max_workers: int
+    batch_max_matters: int
+    batch_sync_max_matters: int
+
+    # sync
+    sync_max_workers: int
+    sync_zoho_concurrency: int
+    sync_naa_concurrency: int
+    sync_state_path: str
+    sync_bulk_threshold: int
+    naa_page_size: int
+    naa_prefetch_pages: int
+
+    # tokens
+    token_refresh_ahead: float
+
+    # sync scheduler
+    sync_scheduler_enabled: bool
+    sync_interval_seconds: float
+    sync_scheduler_tick: float
+    sync_lease_path: str
+    sync_lease_ttl: float
+    sync_incremental: bool
+    sync_full_interval_seconds: float
+    sync_watermark_overlap: float
+    webhook_secret: Optional[str]
+
+    # background jobs
+    job_store_path: str
+    job_max_workers: int
+    job_retention_seconds: int
+
+    # request coalescing
+    lock_dir: str
+    idempotency_store_path: str
+    idempotency_ttl: int
+
+    # retries / circuit breaker
+    retry_max_attempts: int
+    retry_base_delay: float
+    retry_max_delay: float
+    retry_budget_seconds: float
+    breaker_failure_threshold: int
+    breaker_reset_seconds: float
+
+    # zoho rate limiting
+    rate_limit_enabled: bool
+    rate_limit_path: str
+    zoho_read_per_minute: float
+    zoho_write_per_minute: float
+    zoho_file_per_minute: float
+    rate_limit_burst_seconds: float
+    rate_limit_background_reserve: float
+    rate_limit_max_wait: float
+
+    # lookup cache
+    cache_backend: str
+    cache_path: str
+    cache_max_entries: int
+    cache_ttl_record: float
+    cache_ttl_contact: float
+
+    # metrics
+    metrics_enabled: bool
+    metrics_dir: str
+    metrics_flush_interval: float
+
+    # tracing / profiling
+    profile_sample_rate: float
+    profile_dir: str
+
+    # logging
+    log_level: str
+    log_sample_rate: float
+    log_queue_size: int
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        return cls(
+            server_pass=os.getenv("SERVER_PASS"),
+            naa_email=os.getenv("NAA_EMAIL"),
+            naa_password=os.getenv("NAA_PASSWORD"),
+            naa_base_url=os.getenv("NAA_BASE_URL", "https://nationwideappearanceattorneys.net").rstrip("/"),
+            zoho_client_id=os.getenv("ZOHO_CLIENT_ID"),
+            zoho_client_secret=os.getenv("ZOHO_CLIENT_SECRET"),
+            zoho_refresh_token=os.getenv("ZOHOCRM_REFRESH_TOKEN"),
+            zoho_api_domain=os.getenv("ZOHO_API_DOMAIN"),
+            zoho_accounts_url=os.getenv("ZOHO_ACCOUNTS_URL", "https://accounts.zoho.com").rstrip("/"),
+            zoho_access_token=os.getenv("ACCESS_TOKEN"),
+            http_pool_maxsize=_int("HTTP_POOL_MAXSIZE", 10),
+            http_connect_timeout=_float("HTTP_CONNECT_TIMEOUT", 3.05),
+            http_read_timeout=_float("HTTP_READ_TIMEOUT", 15.0),
+            async_http_max_connections=_int("ASYNC_HTTP_MAX_CONNECTIONS", 100),
+            upload_max_workers=_int("UPLOAD_MAX_WORKERS", 4),
+            doc_transfer_streaming=_bool("DOC_TRANSFER_STREAMING", True),
+            doc_spool_threshold=_int("DOC_SPOOL_THRESHOLD", 5 * 1024 * 1024),
+            batch_max_workers=_int("BATCH_MAX_WORKERS", 8),
+            batch_max_matters=_int("BATCH_MAX_MATTERS", 200),
+            # ~2 Zoho reads per create against a burst of 25: larger synchronous
+            # batches wait on the rate limiter past gunicorn's 20 s timeout
+            batch_sync_max_matters=_int("BATCH_SYNC_MAX_MATTERS", 10),
+            sync_max_workers=_int("SYNC_MAX_WORKERS", 8),
+            sync_zoho_concurrency=_int("SYNC_ZOHO_CONCURRENCY", 4),
+            sync_naa_concurrency=_int("SYNC_NAA_CONCURRENCY", 6),
+            sync_state_path=os.getenv("SYNC_STATE_PATH", "credentials/sync_state.db"),
+            sync_bulk_threshold=_int("SYNC_BULK_THRESHOLD", 100),
+            naa_page_size=_int("NAA_PAGE_SIZE", 100),
+            naa_prefetch_pages=_int("NAA_PREFETCH_PAGES", 2),
+            token_refresh_ahead=_float("TOKEN_REFRESH_AHEAD", 300.0),
+            sync_scheduler_enabled=_bool("SYNC_SCHEDULER_ENABLED", True),
+            sync_interval_seconds=_float("SYNC_INTERVAL_SECONDS", 3600.0),
+            sync_scheduler_tick=_float("SYNC_SCHEDULER_TICK", 30.0),
+            sync_lease_path=os.getenv("SYNC_LEASE_PATH", "credentials/scheduler.db"),
+            sync_lease_ttl=_float("SYNC_LEASE_TTL", 120.0),
+            sync_incremental=_bool("SYNC_INCREMENTAL", False),
+            sync_full_interval_seconds=_float("SYNC_FULL_INTERVAL_SECONDS", 86400.0),
+            sync_watermark_overlap=_float("SYNC_WATERMARK_OVERLAP", 300.0),
+            webhook_secret=os.getenv("WEBHOOK_SECRET"),
+            job_store_path=os.getenv("JOB_STORE_PATH", "credentials/jobs.db"),
+            job_max_workers=_int("JOB_MAX_WORKERS", 4),
+            job_retention_seconds=_int("JOB_RETENTION_SECONDS", 7 * 24 * 3600),
+            lock_dir=os.getenv("LOCK_DIR", "credentials/locks"),
+            idempotency_store_path=os.getenv("IDEMPOTENCY_STORE_PATH", "credentials/idempotency.db"),
+            # long enough for double clicks and workflow re-fires, no longer
+            idempotency_ttl=_int("IDEMPOTENCY_TTL", 60),
+            retry_max_attempts=_int("RETRY_MAX_ATTEMPTS", 3),
+            retry_base_delay=_float("RETRY_BASE_DELAY", 0.25),
+            retry_max_delay=_float("RETRY_MAX_DELAY", 4.0),
+            # when retries may still start, and the cap on their timeouts; a
+            # first attempt always gets HTTP_CONNECT_TIMEOUT/HTTP_READ_TIMEOUT
+            retry_budget_seconds=_float("RETRY_BUDGET_SECONDS", 8.0),
+            breaker_failure_threshold=_int("BREAKER_FAILURE_THRESHOLD", 5),
+            breaker_reset_seconds=_float("BREAKER_RESET_SECONDS", 30.0),
+            rate_limit_enabled=_bool("RATE_LIMIT_ENABLED", True),
+            rate_limit_path=os.getenv("RATE_LIMIT_PATH", "credentials/ratelimit.db"),
+            zoho_read_per_minute=_float("ZOHO_READ_PER_MINUTE", 100.0),
+            zoho_write_per_minute=_float("ZOHO_WRITE_PER_MINUTE", 50.0),
+            zoho_file_per_minute=_float("ZOHO_FILE_PER_MINUTE", 30.0),
+            rate_limit_burst_seconds=_float("RATE_LIMIT_BURST_SECONDS", 15.0),
+            rate_limit_background_reserve=_float("RATE_LIMIT_BACKGROUND_RESERVE", 0.25),
+            rate_limit_max_wait=_float("RATE_LIMIT_MAX_WAIT", 10.0),
+            cache_backend=os.getenv("CACHE_BACKEND", "memory").lower(),
+            cache_path=os.getenv("CACHE_PATH", "credentials/cache.db"),
+            cache_max_entries=_int("CACHE_MAX_ENTRIES", 2048),
+            cache_ttl_record=_float("CACHE_TTL_RECORD", 30.0),
+            cache_ttl_contact=_float("CACHE_TTL_CONTACT", 300.0),
+            metrics_enabled=_bool("METRICS_ENABLED", True),
+            metrics_dir=os.getenv("METRICS_DIR", "credentials/metrics"),
+            metrics_flush_interval=_float("METRICS_FLUSH_INTERVAL", 5.0),
+            profile_sample_rate=_float("PROFILE_SAMPLE_RATE", 0.0),
+            profile_dir=os.getenv("PROFILE_DIR", "credentials/profiles"),
+            log_level=os.getenv("LOG_LEVEL", "INFO").upper(),
+            log_sample_rate=_float("LOG_SAMPLE_RATE", 0.01),
+            log_queue_size=_int("LOG_QUEUE_SIZE", 10000),
+        )
+
+
+_settings: Optional[Settings] = None
+_lock = threading.Lock()
+
+
+def get_settings() -> Settings:
+    """The process-wide Settings, loaded (and .env read) on first call."""
+    global _settings
+    if _settings is None:
+        with _lock:
+            if _settings is None:
+                # DOTENV_PATH picks a specific file (benchmarks point it at an
+                # empty one so a checked-out .env can't redirect them)
+                load_dotenv(os.getenv("DOTENV_PATH") or None, override=True)
+                _settings = Settings.from_env()
+    return _settings
+
+
+def reload_settings() -> Settings:
+    """Re-read the environment; for scripts and benchmarks that change it."""
+    global _settings
+    with _lock:
+        _settings = None
+    return get_settings()
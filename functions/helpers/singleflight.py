@@ -0,0 +1,215 @@
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future
+from functools import wraps
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from functions.helpers.files import file_lock
+from functions.helpers.settings import get_settings
+from functions.helpers.sqlite_store import connect
+
+# Coalesces concurrent identical calls (same operation + matterID):
+#   1. a recent successful result is replayed from the idempotency store;
+#   2. inside one worker, duplicates wait on the in-flight call's Future;
+#   3. across workers, an flock per key serialises the leaders, and the
+#      one that gets the lock second finds the first one's stored result.
+# A success also clears the stored results of the operations it `clears`
+# for the same key: once a case is closed, a new create must run rather
+# than replay the old case.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS idempotency (
+    operation  TEXT NOT NULL,
+    key        TEXT NOT NULL,
+    result     TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (operation, key)
+)
+"""
+
+_inflight: Dict[Tuple[str, str], Future] = {}
+_inflight_lock = threading.Lock()
+_async_inflight: Dict[Tuple[str, str], "asyncio.Future"] = {}
+_stats = {"leaders": 0, "coalesced": 0, "replayed": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(what: str) -> None:
+    with _stats_lock:
+        _stats[what] += 1
+
+
+def _db():
+    conn = connect(get_settings().idempotency_store_path)
+    conn.execute(_SCHEMA)
+    return conn
+
+
+def _recent_result(operation: str, key: str) -> Optional[dict]:
+    row = _db().execute(
+        "SELECT result FROM idempotency WHERE operation = ? AND key = ? AND expires_at > ?",
+        (operation, key, time.time()),
+    ).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def _remember(operation: str, key: str, result: dict) -> None:
+    now = time.time()
+    conn = _db()
+    conn.execute(
+        "INSERT OR REPLACE INTO idempotency (operation, key, result, expires_at) VALUES (?, ?, ?, ?)",
+        (operation, key, json.dumps(result, default=str), now + get_settings().idempotency_ttl),
+    )
+    conn.execute("DELETE FROM idempotency WHERE expires_at < ?", (now,))
+
+
+def _forget(operations: Iterable[str], key: str) -> None:
+    conn = _db()
+    for operation in operations:
+        conn.execute("DELETE FROM idempotency WHERE operation = ? AND key = ?", (operation, key))
+
+
+def _succeeded_with(operation: str, key: str, result: dict, clears: Tuple[str, ...]) -> None:
+    """Store a successful result, and drop the ones it supersedes."""
+    _remember(operation, key, result)
+    if clears:
+        _forget(clears, key)
+
+
+def _lock_path(operation: str, key: str) -> str:
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", f"{operation}-{key}")
+    return os.path.join(get_settings().lock_dir, f"{safe}.lock")
+
+
+def _succeeded(result) -> bool:
+    return isinstance(result, dict) and result.get("statusCode", 200) < 400 and "error" not in result
+
+
+def _lead(operation: str, key: str, fn: Callable[[], dict], clears: Tuple[str, ...]) -> dict:
+    with file_lock(_lock_path(operation, key)):
+        # another worker may have finished the same call while we waited
+        previous = _recent_result(operation, key)
+        if previous is not None:
+            _count("replayed")
+            return previous
+        _count("leaders")
+        result = fn()
+        if _succeeded(result):
+            _succeeded_with(operation, key, result, clears)
+        return result
+
+
+def run_once(operation: str, key, fn: Callable[[], dict], clears: Tuple[str, ...] = ()) -> dict:
+    """
+    Run `fn()` unless an identical `operation`/`key` call is already in
+    flight (join it) or succeeded within IDEMPOTENCY_TTL seconds (replay it).
+    Only successful results are remembered, so failures can be retried; a
+    success forgets the results of the `clears` operations for `key`.
+    """
+    key = str(key)
+    previous = _recent_result(operation, key)
+    if previous is not None:
+        _count("replayed")
+        return previous
+
+    with _inflight_lock:
+        future = _inflight.get((operation, key))
+        leader = future is None
+        if leader:
+            future = _inflight[(operation, key)] = Future()
+
+    if not leader:
+        _count("coalesced")
+        return dict(future.result())
+
+    try:
+        result = _lead(operation, key, fn, clears)
+        future.set_result(result)
+        return dict(result)
+    except BaseException as exc:
+        future.set_exception(exc)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop((operation, key), None)
+
+
+async def run_once_async(
+    operation: str, key, fn: Callable[[], Awaitable[dict]], clears: Tuple[str, ...] = ()
+) -> dict:
+    """
+    run_once for coroutine functions. Duplicates on the same event loop wait
+    on the leader's asyncio Future; the flock and the idempotency store still
+    coalesce with other workers and with threaded callers. Store reads and
+    writes run in a thread so they never block the loop.
+    """
+    key = str(key)
+    previous = await asyncio.to_thread(_recent_result, operation, key)
+    if previous is not None:
+        _count("replayed")
+        return previous
+
+    future = _async_inflight.get((operation, key))
+    if future is not None:
+        _count("coalesced")
+        return dict(await asyncio.shield(future))
+
+    future = _async_inflight[(operation, key)] = asyncio.get_running_loop().create_future()
+    try:
+        lock = file_lock(_lock_path(operation, key))
+        # flock may block on another worker: wait for it off the loop
+        await asyncio.to_thread(lock.__enter__)
+        try:
+            result = await asyncio.to_thread(_recent_result, operation, key)
+            if result is not None:
+                _count("replayed")
+            else:
+                _count("leaders")
+                result = await fn()
+                if _succeeded(result):
+                    await asyncio.to_thread(_succeeded_with, operation, key, result, clears)
+        finally:
+            lock.__exit__(None, None, None)
+        future.set_result(result)
+        return dict(result)
+    except BaseException as exc:
+        future.set_exception(exc)
+        # consume it here so an unawaited future doesn't log a warning
+        future.exception()
+        raise
+    finally:
+        _async_inflight.pop((operation, key), None)
+
+
+def single_flight(operation: str, clears: Tuple[str, ...] = ()):
+    """Decorator form of run_once, keyed by the function's first argument."""
+
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(key, *args, **kwargs):
+            return run_once(operation, key, lambda: fn(key, *args, **kwargs), clears)
+
+        return wrapper
+
+    return decorator
+
+
+def single_flight_async(operation: str, clears: Tuple[str, ...] = ()):
+    """Decorator form of run_once_async, keyed by the first argument."""
+
+    def decorator(fn):
+        @wraps(fn)
+        async def wrapper(key, *args, **kwargs):
+            return await run_once_async(operation, key, lambda: fn(key, *args, **kwargs), clears)
+
+        return wrapper
+
+    return decorator
+
+
+def singleflight_stats() -> dict:
+    with _stats_lock:
+        return dict(_stats)
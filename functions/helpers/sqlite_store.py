@@ -0,0 +1,30 @@
+import os
+import sqlite3
+import threading
+
+# One connection per (process, thread, path). sqlite3 connections must not
+# cross threads or survive a fork, and WAL mode lets the gunicorn workers
+# read while another one writes.
+_local = threading.local()
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """
+    Return this thread's connection to the SQLite file at `path`, creating
+    the parent directory and enabling WAL on first use.
+    """
+    conns = getattr(_local, "conns", None)
+    if conns is None or getattr(_local, "pid", None) != os.getpid():
+        conns = _local.conns = {}
+        _local.pid = os.getpid()
+
+    conn = conns.get(path)
+    if conn is None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conns[path] = conn
+    return conn
@@ -0,0 +1,61 @@
+import hashlib
+import time
+from typing import Dict, Iterable, Tuple
+
+from functions.helpers.settings import get_settings
+from functions.helpers.sqlite_store import connect
+
+# Last status/results pushed to Zoho for each matter, so the sync can skip
+# matters whose NAA state has not moved since the previous run.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS matter_state (
+    matter_id    TEXT PRIMARY KEY,
+    case_id      TEXT,
+    status       TEXT,
+    results_hash TEXT,
+    pushed_at    REAL
+)
+"""
+
+
+def _db():
+    conn = connect(get_settings().sync_state_path)
+    conn.execute(_SCHEMA)
+    return conn
+
+
+def results_hash(status: str, results: str) -> str:
+    digest = hashlib.sha256()
+    digest.update((status or "").encode("utf-8"))
+    digest.update(b"\0")
+    digest.update((results or "").encode("utf-8"))
+    return digest.hexdigest()
+
+
+def load_states() -> Dict[str, Tuple[str, str]]:
+    """{matterID: (status, results_hash)} for every matter pushed so far."""
+    rows = _db().execute("SELECT matter_id, status, results_hash FROM matter_state")
+    return {matter_id: (status, digest) for matter_id, status, digest in rows}
+
+
+def save_states(rows: Iterable[Tuple[str, str, str, str]]) -> None:
+    """Record ``(matterID, caseID, status, results_hash)`` rows as pushed now."""
+    now = time.time()
+    conn = _db()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany(
+            "INSERT INTO matter_state (matter_id, case_id, status, results_hash, pushed_at) "
+            "VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(matter_id) DO UPDATE SET case_id = excluded.case_id, "
+            "status = excluded.status, results_hash = excluded.results_hash, "
+            "pushed_at = excluded.pushed_at",
+            [
+                (str(matter_id), None if case_id is None else str(case_id), status, digest, now)
+                for matter_id, case_id, status, digest in rows
+            ],
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
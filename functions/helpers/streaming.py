@@ -0,0 +1,103 @@
+import uuid
+from tempfile import SpooledTemporaryFile
+from typing import IO, Iterator
+
+import requests
+
+from functions.helpers.settings import get_settings
+
+CHUNK_SIZE = 64 * 1024
+
+
+def spool_threshold() -> int:
+    """Bytes kept in memory per transfer before spilling to a temp file."""
+    return get_settings().doc_spool_threshold
+
+
+def new_spool() -> SpooledTemporaryFile:
+    return SpooledTemporaryFile(max_size=spool_threshold(), mode="w+b")
+
+
+def copy_response_to(response: requests.Response, dest: IO[bytes]) -> int:
+    """
+    Drain a `stream=True` response into `dest` chunk by chunk.
+    Returns the number of bytes written; the response is always closed.
+    """
+    size = 0
+    try:
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            if chunk:
+                dest.write(chunk)
+                size += len(chunk)
+    finally:
+        response.close()
+    return size
+
+
+class MultipartStream:
+    """
+    Single-file multipart/form-data body that reads the file lazily.
+
+    requests sends any object with `read` and `__len__` as a streamed body
+    with a fixed Content-Length, so at most one chunk of the file is held in
+    memory while it goes out on the wire. The body is read from the file's
+    position at construction; `rewind()` restarts it there, so each retry
+    of the request sends the whole body again.
+    """
+
+    def __init__(
+        self,
+        field: str,
+        filename: str,
+        fileobj: IO[bytes],
+        size: int,
+        content_type: str = "application/octet-stream",
+    ):
+        boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        safe_name = filename.replace('"', "%22").replace("\r", "").replace("\n", "")
+        self._head = (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="{field}"; filename="{safe_name}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode("utf-8")
+        self._tail = f"\r\n--{boundary}--\r\n".encode("utf-8")
+        self._file = fileobj
+        self._start = fileobj.tell()
+        self._size = size
+        self._parts = self._iter_parts()
+        self._buffer = b""
+
+    def rewind(self) -> None:
+        self._file.seek(self._start)
+        self._parts = self._iter_parts()
+        self._buffer = b""
+
+    def __len__(self) -> int:
+        return len(self._head) + self._size + len(self._tail)
+
+    def _iter_parts(self) -> Iterator[bytes]:
+        yield self._head
+        while True:
+            chunk = self._file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+        yield self._tail
+
+    def __iter__(self) -> Iterator[bytes]:
+        if self._buffer:
+            yield self._buffer
+            self._buffer = b""
+        yield from self._parts
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            return b"".join(self)
+        while len(self._buffer) < size:
+            part = next(self._parts, None)
+            if part is None:
+                break
+            self._buffer += part
+        out, self._buffer = self._buffer[:size], self._buffer[size:]
+        return out
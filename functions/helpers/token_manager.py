@@ -0,0 +1,201 @@
+import asyncio
+import base64
+import json
+import os
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+from functions.helpers.files import atomic_write_json, file_lock
+from functions.helpers.log import get_logger
+from functions.helpers.settings import get_settings
+
+logger = get_logger(__name__)
+
+
+def _jwt_expiry(token: str) -> Optional[float]:
+    """`exp` claim of a JWT, or None if `token` isn't one."""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload)).get("exp")
+        return float(exp) if exp is not None else None
+    except Exception:
+        return None
+
+
+class TokenManager:
+    """
+    Process- and worker-safe holder for one upstream access token.
+
+    - Tokens are refreshed `refresh_ahead` seconds before they expire, not
+      after a 401.
+    - Only one thread per process refreshes (the rest keep using the still
+      valid token, or wait if it has expired), and an flock on
+      ``<cred_path>.lock`` makes the other gunicorn workers wait and then
+      reuse the token written by whoever refreshed first.
+    - The credentials file is rewritten atomically.
+
+    `fetch` returns ``(token, expires_in_seconds)``; expires_in may be None,
+    in which case a JWT `exp` claim is used, else the token is assumed valid
+    until the upstream rejects it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        cred_path: str,
+        fetch: Callable[[], Tuple[str, Optional[float]]],
+        token_key: str = "token",
+        refresh_ahead: float = None,
+        initial_token: Optional[str] = None,
+    ):
+        self.name = name
+        self.cred_path = cred_path
+        self.token_key = token_key
+        self._fetch = fetch
+        self._initial_token = initial_token
+        if refresh_ahead is None:
+            refresh_ahead = get_settings().token_refresh_ahead
+        self.refresh_ahead = refresh_ahead
+        self._token = None
+        self._expires_at = 0.0
+        self._reset_locks()
+        self._stats = {
+            "refreshes": 0,
+            "refreshFailures": 0,
+            "reused": 0,
+            "refreshSecondsTotal": 0.0,
+            "lastRefreshSeconds": 0.0,
+            "lastRefreshAt": None,
+        }
+
+    def _reset_locks(self):
+        self._pid = os.getpid()
+        self._refresh_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    # ––– credentials file ––––––––––––––––––––––––––––––––––––––––––––––––
+    def _read_file(self) -> dict:
+        try:
+            with open(self.cred_path, "r") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _load_file(self) -> None:
+        data = self._read_file()
+        token = data.get(self.token_key)
+        if not token:
+            if self._token is None and self._initial_token:
+                self._token, self._expires_at = self._initial_token, self._expiry_for(self._initial_token, None)
+            return
+        expires_at = data.get("expires_at")
+        if expires_at is None:
+            expires_at = self._expiry_for(token, None)
+        self._token, self._expires_at = token, float(expires_at)
+
+    def _expiry_for(self, token: str, expires_in: Optional[float]) -> float:
+        if expires_in is not None:
+            return time.time() + float(expires_in)
+        exp = _jwt_expiry(token)
+        return exp if exp is not None else float("inf")
+
+    def _fresh(self) -> bool:
+        return bool(self._token) and time.time() < self._expires_at - self.refresh_ahead
+
+    def _usable(self) -> bool:
+        return bool(self._token) and time.time() < self._expires_at
+
+    # ––– refresh ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+    def _refresh_locked(self, stale: Optional[str]) -> str:
+        with file_lock(self.cred_path + ".lock"):
+            # Another worker may have refreshed while we waited for the lock
+            self._load_file()
+            if self._fresh() and self._token != stale:
+                self._count("reused")
+                return self._token
+
+            start = time.perf_counter()
+            try:
+                token, expires_in = self._fetch()
+            except Exception:
+                self._count("refreshFailures")
+                raise
+            elapsed = time.perf_counter() - start
+
+            expires_at = self._expiry_for(token, expires_in)
+            data = self._read_file()
+            data[self.token_key] = token
+            if expires_in is not None:
+                data["expires_in"] = expires_in
+            data["expires_at"] = None if expires_at == float("inf") else expires_at
+            atomic_write_json(self.cred_path, data)
+            self._token, self._expires_at = token, expires_at
+
+        with self._stats_lock:
+            self._stats["refreshes"] += 1
+            self._stats["refreshSecondsTotal"] += elapsed
+            self._stats["lastRefreshSeconds"] = elapsed
+            self._stats["lastRefreshAt"] = time.time()
+        logger.info("token refreshed", extra={"upstream": self.name, "seconds": round(elapsed, 3)})
+        return token
+
+    def _count(self, key: str) -> None:
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def get_token(self) -> str:
+        """Current token, refreshing first if it is expired or about to be."""
+        if os.getpid() != self._pid:
+            self._reset_locks()
+        if self._fresh():
+            return self._token
+        if self._token is None:
+            self._load_file()
+            if self._fresh():
+                return self._token
+
+        if self._usable():
+            # Still valid: let one thread renew it, everyone else carries on
+            if not self._refresh_lock.acquire(blocking=False):
+                return self._token
+        else:
+            self._refresh_lock.acquire()
+        try:
+            if self._fresh():
+                return self._token
+            return self._refresh_locked(stale=None)
+        finally:
+            self._refresh_lock.release()
+
+    def invalidate(self, stale: Optional[str]) -> str:
+        """
+        Called after the upstream rejected `stale`. Returns a new token,
+        reusing one another thread/worker already fetched when possible.
+        """
+        if os.getpid() != self._pid:
+            self._reset_locks()
+        with self._refresh_lock:
+            if self._token != stale and self._fresh():
+                self._count("reused")
+                return self._token
+            return self._refresh_locked(stale=stale)
+
+    async def get_token_async(self) -> str:
+        """get_token() that refreshes on a worker thread, off the event loop."""
+        if os.getpid() == self._pid and self._fresh():
+            return self._token
+        return await asyncio.to_thread(self.get_token)
+
+    async def invalidate_async(self, stale: str) -> str:
+        return await asyncio.to_thread(self.invalidate, stale)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            out = dict(self._stats)
+        out["expiresIn"] = (
+            None if self._expires_at == float("inf") else round(self._expires_at - time.time(), 1)
+        )
+        return out
@@ -0,0 +1,162 @@
+import contextvars
+import cProfile
+import os
+import random
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, Optional
+
+from functions.helpers.log import get_logger
+from functions.helpers.settings import get_settings
+
+logger = get_logger(__name__)
+
+# Request-scoped phase timing. A Trace lives in a ContextVar for the duration
+# of a request; `span("name")` adds the time spent in a block to it. Worker
+# threads started through map_bounded copy the context, so spans from
+# concurrent uploads land in the same Trace (repeated names are summed).
+# Outside a request (sync runs, jobs) spans are a no-op.
+# A streamed response's trace stays open until its body ends
+# (RequestMetrics.streamed), so it is logged but has no Server-Timing header.
+
+_current: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("trace", default=None)
+
+# cProfile and tracemalloc are process-wide: profile one request at a time
+_profile_lock = threading.Lock()
+
+
+class Trace:
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.phases: Dict[str, list] = {}
+        self.profile: Optional[dict] = None
+        self._lock = threading.Lock()
+        self._profiler: Optional[cProfile.Profile] = None
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            phase = self.phases.setdefault(name, [0.0, 0])
+            phase[0] += seconds
+            phase[1] += 1
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        """The phases as a Server-Timing header value (durations in ms)."""
+        with self._lock:
+            phases = list(self.phases.items())
+        parts = []
+        for name, (seconds, count) in phases:
+            entry = f"{name};dur={seconds * 1000:.1f}"
+            if count > 1:
+                entry += f';desc="x{count}"'
+            parts.append(entry)
+        parts.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(parts)
+
+    def summary(self) -> dict:
+        with self._lock:
+            phases = {
+                name: {"ms": round(seconds * 1000, 1), "count": count}
+                for name, (seconds, count) in self.phases.items()
+            }
+        out = {"trace": self.name, "totalMs": round(self.elapsed() * 1000, 1), "phases": phases}
+        if self.profile is not None:
+            out["profile"] = self.profile
+        return out
+
+
+def current() -> Optional[Trace]:
+    return _current.get()
+
+
+@contextmanager
+def span(name: str):
+    """Time the enclosed block as phase `name` of the current request."""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, time.perf_counter() - started)
+
+
+def traced(name: str):
+    """Decorator form of `span`."""
+
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _sampled() -> bool:
+    rate = get_settings().profile_sample_rate
+    return rate > 0 and random.random() < rate
+
+
+def start(name: str):
+    """
+    Begin a Trace for the current request. Returns a token for `finish`.
+    With PROFILE_SAMPLE_RATE > 0 a matching fraction of requests also run
+    under cProfile and tracemalloc.
+    """
+    trace = Trace(name)
+    if _sampled() and _profile_lock.acquire(blocking=False):
+        try:
+            tracemalloc.start()
+            trace._profiler = cProfile.Profile()
+            trace._profiler.enable()
+        except Exception:
+            # another profiler is active; skip this sample
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+            trace._profiler = None
+            _profile_lock.release()
+    return trace, _current.set(trace)
+
+
+def _stop_profile(trace: Trace) -> None:
+    profiler, trace._profiler = trace._profiler, None
+    try:
+        profiler.disable()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        directory = get_settings().profile_dir
+        os.makedirs(directory, exist_ok=True)
+        safe = "".join(c if c.isalnum() else "_" for c in trace.name).strip("_") or "request"
+        path = os.path.join(directory, f"{int(time.time() * 1000)}-{os.getpid()}-{safe}.prof")
+        profiler.dump_stats(path)
+        trace.profile = {"path": path, "tracemallocPeakBytes": peak}
+    finally:
+        _profile_lock.release()
+
+
+def finish(token, **fields) -> Trace:
+    """
+    End the Trace begun by `start` and write its structured log line;
+    `fields` (e.g. the response status) are added to the line.
+    """
+    trace, reset = token
+    try:
+        _current.reset(reset)
+    except ValueError:
+        # finished from a different context than it was started in
+        _current.set(None)
+    if trace._profiler is not None:
+        _stop_profile(trace)
+    logger.info("request timing", extra={"event": "request_timing", **trace.summary(), **fields})
+    return trace
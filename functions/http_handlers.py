@@ -0,0 +1,423 @@
+import hmac
+import json
+import time
+
+from functions import sync_scheduler
+from functions.connector_fn import batch_summary
+from functions.helpers import jobs, metrics, tracing
+from functions.helpers.settings import get_settings
+
+# Request handling shared by server.py (Flask) and asgi_server.py (Quart):
+# auth, validation, response shapes and the job, sync, webhook and metrics
+# handlers. Nothing here touches a framework object. Callers pass in
+# headers, args and the parsed body, and get back ``(body, status)`` or
+# ``(body, status, headers)`` tuples with plain dict bodies for the app to
+# jsonify.
+
+HTTP_REQUESTS = metrics.Counter(
+    "http_requests_total",
+    "Requests served, by endpoint template, method and status.",
+    ("endpoint", "method", "status"),
+)
+HTTP_LATENCY = metrics.Histogram(
+    "http_request_duration_seconds",
+    "Time spent serving requests, by endpoint template and method.",
+    ("endpoint", "method"),
+)
+HTTP_IN_FLIGHT = metrics.Gauge(
+    "http_requests_in_flight",
+    "Requests currently being served, by endpoint template.",
+    ("endpoint",),
+)
+
+
+class RequestMetrics:
+    """
+    Metrics and the phase trace for one request. Each app creates one in
+    its before-request hook, calls `responded` once the response exists and
+    `finished` in its teardown hook.
+
+    A streamed body is passed through `streamed`: its work happens after the
+    headers are sent, so its trace and metrics end when the body is closed
+    instead, and it gets no Server-Timing header (the timing is in the
+    request log line and /metrics).
+    """
+
+    def __init__(self, method: str, endpoint: str):
+        self.method = method
+        self.endpoint = endpoint
+        self.status = 500
+        self._started = time.perf_counter()
+        self._streaming = False
+        self._ended = False
+        HTTP_IN_FLIGHT.inc(endpoint=endpoint)
+        self._trace = tracing.start(f"{method} {endpoint}")
+
+    def responded(self, status: int) -> str:
+        """Record the response status; returns the Server-Timing header value."""
+        self.status = status
+        if self._streaming:
+            return None
+        token, self._trace = self._trace, None
+        if token is None:
+            return None
+        return tracing.finish(token, status=status).server_timing()
+
+    def finished(self, exc: BaseException = None) -> None:
+        if not self._streaming:
+            self._end(exc)
+
+    def streamed(self, body):
+        """Wrap a streamed body (generator or async generator) to end the request with it."""
+        self._streaming = True
+        if hasattr(body, "__anext__"):
+            return _AsyncTimedBody(body, self._end)
+        return _TimedBody(body, self._end)
+
+    def _end(self, exc: BaseException = None) -> None:
+        if self._ended:
+            return
+        self._ended = True
+        if exc is not None:
+            self.status = 500
+        token, self._trace = self._trace, None
+        if token is not None:
+            tracing.finish(token, status=self.status, error=str(exc) if exc else None)
+        HTTP_IN_FLIGHT.dec(endpoint=self.endpoint)
+        HTTP_LATENCY.observe(time.perf_counter() - self._started, endpoint=self.endpoint, method=self.method)
+        HTTP_REQUESTS.inc(endpoint=self.endpoint, method=self.method, status=str(self.status))
+
+
+class _TimedBody:
+    """A streamed body that calls `end` once it is exhausted or closed (even unstarted)."""
+
+    def __init__(self, body, end):
+        self._body = body
+        self._end = end
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._body)
+        except StopIteration:
+            self.close()
+            raise
+        except Exception as e:
+            self.close(e)
+            raise
+
+    def close(self, exc: BaseException = None) -> None:
+        end, self._end = self._end, None
+        if end is not None:
+            self._body.close()
+            end(exc)
+
+
+class _AsyncTimedBody:
+    """_TimedBody for async generators."""
+
+    def __init__(self, body, end):
+        self._body = body
+        self._end = end
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await self._body.__anext__()
+        except StopAsyncIteration:
+            await self.aclose()
+            raise
+        except Exception as e:
+            await self.aclose(e)
+            raise
+
+    async def aclose(self, exc: BaseException = None) -> None:
+        end, self._end = self._end, None
+        if end is not None:
+            await self._body.aclose()
+            end(exc)
+
+
+def secret_matches(token, secret) -> bool:
+    """Constant-time comparison; False when either side is missing."""
+    if not token or not secret:
+        return False
+    return hmac.compare_digest(token.encode(), secret.encode())
+
+
+def checkAuth(token: str):
+    """
+    Check if the provided token matches the server password.
+    """
+    return secret_matches(token, get_settings().server_pass)
+
+
+def auth_error(headers):
+    """
+    Validate the Authorization header ('Bearer <token>' or the bare token).
+    Returns a 401 reply, or None when the caller is authorized.
+    """
+    auth_header = headers.get('Authorization')
+    if not auth_header:
+        return {"error": "Missing Authorization header"}, 401
+
+    parts = auth_header.split()
+    if len(parts) == 2 and parts[0].lower() == 'bearer':
+        token = parts[1]
+    else:
+        token = auth_header
+
+    if not checkAuth(token):
+        return {"error": "Unauthorized"}, 401
+    return None
+
+
+def wants_async(headers, args, data) -> bool:
+    """Async mode is opt-in: `Prefer: respond-async`, ?async=1 or "async": true."""
+    if 'respond-async' in headers.get('Prefer', ''):
+        return True
+    flag = args.get('async', data.get('async') if isinstance(data, dict) else None)
+    return str(flag).lower() in ('1', 'true', 'yes')
+
+
+def wants_stream(headers, args) -> bool:
+    """NDJSON streaming is opt-in: `Accept: application/x-ndjson` or ?stream=1."""
+    if 'application/x-ndjson' in headers.get('Accept', ''):
+        return True
+    return args.get('stream', '').lower() in ('1', 'true', 'yes')
+
+
+def queued(job_id: str):
+    """The 202 reply for a queued job."""
+    status_url = f"/jobs/{job_id}"
+    return {"jobID": job_id, "status": "queued", "statusUrl": status_url}, 202, {"Location": status_url}
+
+
+def submit(kind: str, fn, *args, payload=None):
+    """Queue `fn(*args)` as a job and return its 202 reply."""
+    return queued(jobs.submit(kind, fn, *args, payload=payload))
+
+
+def result_reply(result: dict):
+    """A connector result dict as a reply, its statusCode as the status."""
+    status = result.pop('statusCode', None)
+    if status is None:
+        status = 200 if 'response' in result else 500
+    return result, status
+
+
+def matter_id(data):
+    """body["matterID"] as an int. Returns (matterID, None) or (None, error reply)."""
+    if not data or 'matterID' not in data:
+        return None, ({"error": "Missing 'matterID' in request body"}, 400)
+    try:
+        return int(data['matterID']), None
+    except (ValueError, TypeError):
+        return None, ({"error": "'matterID' must be an integer"}, 400)
+
+
+def batch_matter_ids(data):
+    """
+    Validate body["matterIDs"]: a non-empty list of at most BATCH_MAX_MATTERS
+    integers. Returns (matterIDs, None) with duplicates dropped, or
+    (None, error reply).
+    """
+    matterIDs = data.get('matterIDs') if isinstance(data, dict) else None
+    if not isinstance(matterIDs, list) or not matterIDs:
+        return None, ({"error": "'matterIDs' must be a non-empty list"}, 400)
+    try:
+        matterIDs = list(dict.fromkeys(int(m) for m in matterIDs))
+    except (ValueError, TypeError):
+        return None, ({"error": "'matterIDs' must be integers"}, 400)
+    limit = get_settings().batch_max_matters
+    if len(matterIDs) > limit:
+        return None, ({"error": f"At most {limit} matterIDs per batch"}, 413)
+    return matterIDs, None
+
+
+def batch_as_job(matterIDs: list, wants_async: bool) -> bool:
+    """
+    Batches above BATCH_SYNC_MAX_MATTERS always run as a job: Zoho's rate
+    limit alone keeps them from finishing within a request.
+    """
+    return wants_async or len(matterIDs) > get_settings().batch_sync_max_matters
+
+
+def ndjson_line(obj) -> str:
+    return json.dumps(obj) + "\n"
+
+
+def batch_summary_line(operation: str, results: list) -> str:
+    """The last line of a streamed batch: its summary without the results."""
+    summary = batch_summary(operation, results)
+    summary.pop('results')
+    return ndjson_line({"summary": summary})
+
+
+def batch_reply(result: dict):
+    """A run_batch result as a reply."""
+    status = result.pop('statusCode')
+    return result, status
+
+
+def upload_form(form):
+    """
+    The upload fields from a form body; attachments arrive JSON-encoded.
+    Returns (data, None) or (None, error reply).
+    """
+    data = {
+        'record_id': form.get('record_id'),
+        'NAAM_CaseID': form.get('NAAM_CaseID'),
+    }
+    attachments_raw = form.get('attachments')
+    if not attachments_raw:
+        return None, ({"error": "Missing attachments in form data"}, 400)
+    try:
+        data['attachments'] = json.loads(attachments_raw)
+    except (TypeError, json.JSONDecodeError):
+        return None, ({"error": "Invalid JSON for attachments"}, 400)
+    return data, None
+
+
+def upload_request(data):
+    """
+    Validate an upload body. Returns (caseID, attachments, None), or
+    (None, None, error reply); every attachment is checked before any of
+    them is transferred.
+    """
+    if not all(k in data for k in ('record_id', 'NAAM_CaseID', 'attachments')):
+        return None, None, ({"error": "Missing params in request body"}, 400)
+
+    try:
+        int(data['record_id'])
+        case_id = int(data['NAAM_CaseID'])
+        attachments = data['attachments']
+        if not isinstance(attachments, list):
+            raise ValueError
+    except (ValueError, TypeError):
+        return None, None, (
+            {"error": "'record_id' and 'NAAM_CaseID' must be integers, and attachments must be a list"}, 400
+        )
+
+    for attachment in attachments:
+        # expect each attachment is a dict with those keys
+        if not isinstance(attachment, dict) or not attachment.get('document_id') or not attachment.get('document_name'):
+            return None, None, ({"error": "Each attachment must include document_id and document_name"}, 400)
+    return case_id, attachments, None
+
+
+def upload_reply(results: list):
+    """Per-attachment outcome; 207 when only some uploads failed."""
+    failed = [r for r in results if r['statusCode'] != 200]
+    if not failed:
+        return {
+            "response": f"successfully uploaded {len(results)} docs",
+            "results": results,
+        }, 200
+    if len(failed) < len(results):
+        return {
+            "response": f"uploaded {len(results) - len(failed)} of {len(results)} docs",
+            "error": f"{len(failed)} docs failed to upload",
+            "results": results,
+        }, 207
+    return {"error": "Error uploading docs", "results": results}, failed[-1]['statusCode']
+
+
+def get_job(job_id: str):
+    job = jobs.get_job(job_id)
+    if job is None:
+        return {"error": f"Unknown job {job_id}"}, 404
+    return job, 200
+
+
+def trigger_sync(data):
+    """Queue a sync now: all open matters, or only body["matterIDs"]."""
+    matterIDs = data.get('matterIDs')
+    if matterIDs is not None:
+        if not isinstance(matterIDs, list) or not matterIDs:
+            return {"error": "'matterIDs' must be a non-empty list"}, 400
+        try:
+            matterIDs = [str(int(m)) for m in matterIDs]
+        except (ValueError, TypeError):
+            return {"error": "'matterIDs' must be integers"}, 400
+
+    # "incremental": true reads only what Zoho changed since the last clean run
+    incremental = matterIDs is None and bool(data.get('incremental'))
+    return submit(
+        "sync", sync_scheduler.run_sync_now, matterIDs, "manual", incremental,
+        payload={"matterIDs": matterIDs, "incremental": incremental},
+    )
+
+
+def webhook_auth_error(headers):
+    """
+    Webhooks authenticate with WEBHOOK_SECRET, never the API password, in
+    an X-Webhook-Token header or as a bearer token. Query strings end up in
+    access logs, so the secret is not accepted there. Returns None or an
+    error reply; webhooks are disabled while WEBHOOK_SECRET is unset.
+    """
+    secret = get_settings().webhook_secret
+    if not secret:
+        return {"error": "Webhooks are disabled"}, 404
+    token = headers.get('X-Webhook-Token')
+    if token is None:
+        parts = (headers.get('Authorization') or '').split()
+        token = parts[1] if len(parts) == 2 and parts[0].lower() == 'bearer' else None
+    if not secret_matches(token, secret):
+        return {"error": "Unauthorized"}, 401
+    return None
+
+
+def webhook_targets(data):
+    """
+    The matters a webhook names: Zoho sends matterID(s), NAA sends
+    caseID(s). Returns (matterIDs, caseIDs, None) or (None, None, error reply).
+    """
+    if not isinstance(data, dict):
+        return None, None, ({"error": "Expected a JSON or form body"}, 400)
+    found = {}
+    for key in ('matterID', 'caseID'):
+        values = data.get(key + 's', [])
+        if data.get(key) is not None:
+            values = [data[key], *values] if isinstance(values, list) else values
+        if not isinstance(values, list):
+            return None, None, ({"error": f"'{key}s' must be a list"}, 400)
+        try:
+            found[key] = list(dict.fromkeys(int(v) for v in values))
+        except (ValueError, TypeError):
+            return None, None, ({"error": f"'{key}' values must be integers"}, 400)
+    if not found['matterID'] and not found['caseID']:
+        return None, None, ({"error": "Missing 'matterID' or 'caseID'"}, 400)
+    if len(found['matterID']) + len(found['caseID']) > get_settings().batch_max_matters:
+        return None, None, ({"error": "Too many matters in one webhook"}, 413)
+    return found['matterID'], found['caseID'], None
+
+
+def sync_webhook(data):
+    """Queue a refresh of the matters a Zoho or NAA change notification names."""
+    matterIDs, caseIDs, error = webhook_targets(data)
+    if error:
+        return error
+    return submit(
+        "syncWebhook", sync_scheduler.refresh_from_webhook, matterIDs, caseIDs,
+        payload={"matterIDs": matterIDs, "caseIDs": caseIDs},
+    )
+
+
+def sync_status():
+    return sync_scheduler.status(), 200
+
+
+def metrics_text():
+    """Prometheus text format, summed over every worker on this host; None when disabled."""
+    if not get_settings().metrics_enabled:
+        return None
+    return metrics.render()
+
+
+METRICS_DISABLED = ({"error": "Metrics are disabled"}, 404)
+METRICS_MIMETYPE = "text/plain; version=0.0.4"
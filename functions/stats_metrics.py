@@ -0,0 +1,120 @@
+from functions.api import naa, zoho
+from functions.helpers import metrics
+from functions.helpers.cache import cache_stats
+from functions.helpers.http_client import pool_stats
+from functions.helpers.rate_limit import limiter_stats
+from functions.helpers.retry import retry_stats
+from functions.helpers.settings import get_settings
+from functions.helpers.singleflight import singleflight_stats
+
+# Exports the counters each component already keeps for its *_stats()
+# function, so /metrics covers pooling, tokens, caching, retries, rate
+# limiting and coalescing without instrumenting those modules twice.
+
+
+def _family(name, kind, help, labelnames, samples, aggregate="sum"):
+    return {
+        "name": name,
+        "kind": kind,
+        "help": help,
+        "labelnames": list(labelnames),
+        "samples": [[list(labels), value] for labels, value in samples],
+        "aggregate": aggregate,
+    }
+
+
+def _pool():
+    stats = pool_stats()
+    yield _family(
+        "upstream_transport_errors_total", "counter",
+        "Upstream attempts that failed before a response arrived.",
+        ("host",), [((host,), s.get("errors", 0)) for host, s in stats.items()],
+    )
+    yield _family(
+        "upstream_connections_open", "gauge",
+        "Connections opened by the keep-alive pools.",
+        ("host",), [((host,), s.get("connectionsOpened", 0)) for host, s in stats.items()],
+    )
+    yield _family(
+        "upstream_connections_idle", "gauge",
+        "Connections idle in the keep-alive pools.",
+        ("host",), [((host,), s.get("connectionsIdle", 0)) for host, s in stats.items()],
+    )
+
+
+def _tokens():
+    stats = {"zoho": zoho.token_stats(), "naa": naa.token_stats()}
+    for key, name, help in (
+        ("refreshes", "token_refreshes_total", "Access tokens fetched from the upstream."),
+        ("refreshFailures", "token_refresh_failures_total", "Failed access token fetches."),
+        ("reused", "token_reused_total", "Rejected tokens replaced by one another caller already fetched."),
+        ("refreshSecondsTotal", "token_refresh_seconds_total", "Time spent fetching access tokens."),
+    ):
+        yield _family(name, "counter", help, ("upstream",),
+                      [((upstream,), s.get(key, 0)) for upstream, s in stats.items()])
+    yield _family(
+        "token_expires_in_seconds", "gauge", "Seconds until the cached access token expires.",
+        ("upstream",),
+        [((upstream,), s["expiresIn"]) for upstream, s in stats.items() if s.get("expiresIn") is not None],
+        aggregate="min",
+    )
+
+
+def _cache():
+    stats = cache_stats()
+    entries = stats.pop("entries", 0)
+    for key, name, help in (
+        ("hits", "cache_hits_total", "Lookup cache hits."),
+        ("misses", "cache_misses_total", "Lookup cache misses."),
+        ("bypassed", "cache_bypassed_total", "Lookups that skipped the cache for a fresh read."),
+        ("invalidations", "cache_invalidations_total", "Lookup cache invalidations after writes, failures and webhooks."),
+    ):
+        yield _family(name, "counter", help, ("kind",),
+                      [((kind,), s.get(key, 0)) for kind, s in stats.items()])
+    # a shared sqlite cache reports the same entries from every worker
+    shared = get_settings().cache_backend == "sqlite"
+    yield _family("cache_entries", "gauge", "Entries held in the lookup cache.", (),
+                  [((), entries)], aggregate="max" if shared else "sum")
+
+
+def _retries():
+    stats = retry_stats()
+    circuits = stats.pop("circuits", {})
+    for key, name, help in (
+        ("attempts", "retry_attempts_total", "Upstream attempts made by the retry policy."),
+        ("retries", "retries_total", "Upstream attempts that were retries."),
+        ("giveUps", "retry_give_ups_total", "Calls that still failed after retrying."),
+        ("circuitRejections", "circuit_rejections_total", "Calls failed fast by an open circuit."),
+    ):
+        yield _family(name, "counter", help, (), [((), stats.get(key, 0))])
+    yield _family("circuit_opens_total", "counter", "Times a host's circuit opened.", ("host",),
+                  [((host,), c["opens"]) for host, c in circuits.items()])
+    yield _family("circuit_open", "gauge", "1 while a host's circuit is open or half-open.", ("host",),
+                  [((host,), int(c["state"] != "closed")) for host, c in circuits.items()],
+                  aggregate="max")
+
+
+def _limiter():
+    stats = [(tuple(key.split(":", 1)), s) for key, s in limiter_stats().items()]
+    for key, name, help in (
+        ("acquired", "rate_limit_acquired_total", "Zoho rate-limit tokens granted."),
+        ("waited", "rate_limit_waited_total", "Grants that had to wait for a token."),
+        ("waitSecondsTotal", "rate_limit_wait_seconds_total", "Time spent waiting for rate-limit tokens."),
+    ):
+        yield _family(name, "counter", help, ("bucket", "priority"),
+                      [(labels, s.get(key, 0)) for labels, s in stats])
+
+
+def _singleflight():
+    stats = singleflight_stats()
+    yield _family("singleflight_calls_total", "counter",
+                  "Coalesced create/close calls by outcome.", ("outcome",),
+                  [((outcome,), count) for outcome, count in stats.items()])
+
+
+def collect():
+    for part in (_pool, _tokens, _cache, _retries, _limiter, _singleflight):
+        yield from part()
+
+
+metrics.register_collector(collect)
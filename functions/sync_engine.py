@@ -0,0 +1,118 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable
+
+from functions.helpers.executor import map_bounded
+from functions.helpers.settings import get_settings
+
+# In-flight caps per upstream while a sync is running. The worker pool is
+# wider than either cap so NAA lookups can proceed while Zoho calls are
+# throttled and vice versa.
+_limits: Dict[str, threading.BoundedSemaphore] = {}
+_limits_lock = threading.Lock()
+
+
+def _semaphore(upstream: str) -> threading.BoundedSemaphore:
+    sem = _limits.get(upstream)
+    if sem is None:
+        with _limits_lock:
+            sem = _limits.get(upstream)
+            if sem is None:
+                cap = getattr(get_settings(), f"sync_{upstream}_concurrency", 4)
+                sem = threading.BoundedSemaphore(max(1, cap))
+                _limits[upstream] = sem
+    return sem
+
+
+@contextmanager
+def upstream_slot(upstream: str):
+    """Hold one of the concurrency slots reserved for `upstream` ("zoho"/"naa")."""
+    sem = _semaphore(upstream)
+    sem.acquire()
+    try:
+        yield
+    finally:
+        sem.release()
+
+
+def run_sync(
+    matters: Iterable[Any],
+    work: Callable[[Any], str],
+    max_workers: int = None,
+) -> dict:
+    """
+    Run `work(matter)` for every matter through a bounded worker pool
+    (SYNC_MAX_WORKERS, default 8). A matter is either a matter ID or a
+    Zoho record dict carrying it under "id".
+
+    `work` returns an outcome label such as "updated" or "skipped"; any
+    exception is recorded against that matter only and the run carries on.
+    Returns a summary with per-outcome counts, timings and the failures.
+    """
+    if max_workers is None:
+        max_workers = get_settings().sync_max_workers
+
+    def _timed(matter):
+        start = time.perf_counter()
+        try:
+            return work(matter), None, time.perf_counter() - start
+        except Exception as exc:
+            return None, exc, time.perf_counter() - start
+
+    matters = list(matters)
+    started = time.time()
+    t0 = time.perf_counter()
+    results = map_bounded(_timed, matters, max_workers)
+
+    outcomes: Dict[str, int] = {}
+    failures = []
+    durations = []
+    for matter, (res, _) in zip(matters, results):
+        outcome, exc, elapsed = res
+        durations.append(elapsed)
+        if exc is not None:
+            failures.append(
+                {
+                    "matterID": matter.get("id") if isinstance(matter, dict) else matter,
+                    "error": str(exc),
+                    "durationMs": round(elapsed * 1000, 1),
+                }
+            )
+            continue
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    return {
+        "startedAt": started,
+        "durationMs": round((time.perf_counter() - t0) * 1000, 1),
+        "total": len(matters),
+        "succeeded": len(matters) - len(failures),
+        "failed": len(failures),
+        "outcomes": outcomes,
+        "matterDurationMs": {
+            "avg": round(sum(durations) / len(durations) * 1000, 1) if durations else 0.0,
+            "max": round(max(durations) * 1000, 1) if durations else 0.0,
+        },
+        "failures": failures,
+    }
+
+
+def merge_write_results(summary: dict, pending_label: str, written: Dict[str, dict]) -> dict:
+    """
+    Fold the outcome of a batched write-back into a run_sync summary: the
+    matters counted under `pending_label` become "updated" or failures.
+    """
+    summary["outcomes"].pop(pending_label, None)
+    updated = 0
+    for matterID, res in written.items():
+        if res.get("ok"):
+            updated += 1
+            continue
+        summary["failures"].append(
+            {"matterID": matterID, "error": f"write-back failed: {res.get('code')} {res.get('message')}"}
+        )
+    if updated:
+        summary["outcomes"]["updated"] = updated
+    summary["failed"] = len(summary["failures"])
+    summary["succeeded"] = summary["total"] - summary["failed"]
+    return summary
@@ -0,0 +1,289 @@
+import atexit
+import json
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+
+from functions.api.zoho import findSyncRecordsByCaseID
+from functions.connector_fn import sync_cases
+from functions.helpers import lease
+from functions.helpers.cache import invalidate
+from functions.helpers.files import file_lock
+from functions.helpers.log import get_logger
+from functions.helpers.settings import get_settings
+from functions.helpers.sqlite_store import connect
+
+logger = get_logger(__name__)
+
+# Every gunicorn worker runs a scheduler thread, but only the holder of the
+# "sync-scheduler" lease ever starts a sync, so exactly one runner exists per
+# lease database (per host, or per cluster if SYNC_LEASE_PATH is shared).
+# The time of the last run is stored next to the lease, so recycled workers
+# and new leaders pick up the schedule where the old one left off.
+#
+# By default every scheduled run is a full sweep: the sync exists to copy
+# NAA status changes into Zoho, and those never touch the Zoho record.
+# SYNC_INCREMENTAL=1 is only for deployments where NAA posts its changes to
+# POST /webhooks/sync: most runs then only look at appearances Zoho modified
+# since the high-water mark (the start of the last clean run, less
+# SYNC_WATERMARK_OVERLAP for clock skew), and a full sweep every
+# SYNC_FULL_INTERVAL_SECONDS catches anything both missed.
+LEASE_NAME = "sync-scheduler"
+# sync_runs row for incremental passes; full sweeps use LEASE_NAME
+INCREMENTAL = "sync-incremental"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sync_runs (
+    name          TEXT PRIMARY KEY,
+    last_started  REAL,
+    last_finished REAL,
+    last_reason   TEXT,
+    last_summary  TEXT
+)
+"""
+_WATERMARK_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sync_watermark (
+    name  TEXT PRIMARY KEY,
+    value REAL NOT NULL
+)
+"""
+
+_owner = None
+_owner_pid = None
+_thread = None
+_stop = threading.Event()
+
+
+def _owner_id() -> str:
+    global _owner, _owner_pid
+    if _owner_pid != os.getpid():
+        _owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        _owner_pid = os.getpid()
+    return _owner
+
+
+def _db():
+    conn = connect(get_settings().sync_lease_path)
+    conn.execute(_SCHEMA)
+    conn.execute(_WATERMARK_SCHEMA)
+    return conn
+
+
+def _mark_started(reason: str, name: str = LEASE_NAME) -> None:
+    _db().execute(
+        "INSERT INTO sync_runs (name, last_started, last_reason) VALUES (?, ?, ?) "
+        "ON CONFLICT(name) DO UPDATE SET last_started = excluded.last_started, "
+        "last_reason = excluded.last_reason",
+        (name, time.time(), reason),
+    )
+
+
+def _mark_finished(summary: dict, name: str = LEASE_NAME) -> None:
+    _db().execute(
+        "UPDATE sync_runs SET last_finished = ?, last_summary = ? WHERE name = ?",
+        (time.time(), json.dumps(summary, default=str), name),
+    )
+
+
+def _last_run(name: str = LEASE_NAME):
+    return _db().execute(
+        "SELECT last_started, last_finished, last_reason, last_summary FROM sync_runs WHERE name = ?",
+        (name,),
+    ).fetchone()
+
+
+def _watermark():
+    row = _db().execute("SELECT value FROM sync_watermark WHERE name = ?", (LEASE_NAME,)).fetchone()
+    return row[0] if row else None
+
+
+def _advance_watermark(value: float) -> None:
+    _db().execute(
+        "INSERT INTO sync_watermark (name, value) VALUES (?, ?) "
+        "ON CONFLICT(name) DO UPDATE SET value = max(value, excluded.value)",
+        (LEASE_NAME, value),
+    )
+
+
+def run_sync_now(matterIDs: list = None, reason: str = "manual", incremental: bool = False) -> dict:
+    """
+    Run a sync (all matters, or just `matterIDs`) while holding the host-wide
+    sync lock, so a manual trigger never overlaps the scheduled run.
+    With `incremental`, a run over all matters only reads the appearances
+    Zoho modified since the high-water mark (a full sweep if there is none
+    yet). Runs over all matters are recorded as the schedule's last run.
+    """
+    settings = get_settings()
+    with file_lock(os.path.join(settings.lock_dir, "sync.lock")):
+        full = matterIDs is None
+        since = None
+        if full and incremental:
+            mark = _watermark()
+            if mark is not None:
+                since = mark - settings.sync_watermark_overlap
+        name = INCREMENTAL if since is not None else LEASE_NAME
+        started = time.time()
+        if full:
+            _mark_started(reason, name)
+        summary = dict(sync_cases(matterIDs, modifiedSince=since))
+        summary["mode"] = "partial" if not full else "incremental" if since is not None else "full"
+        if since is not None:
+            summary["modifiedSince"] = since
+        if full:
+            _mark_finished(summary, name)
+            # a failed matter stays inside the incremental window until the
+            # next full sweep, which moves the mark on regardless
+            if "error" not in summary and (since is None or not summary.get("failed")):
+                _advance_watermark(started)
+    summary["statusCode"] = 502 if "error" in summary else 200
+    return summary
+
+
+def _overdue(row, now: float, interval: float) -> bool:
+    if row is None or row[0] is None:
+        return True
+    started, finished = row[0], row[1]
+    if finished is None or finished < started:
+        # the previous leader died mid-run; its lease has lapsed since
+        return now - started > get_settings().sync_lease_ttl
+    return now - started >= interval
+
+
+def _due(now: float):
+    """The kind of run the schedule wants now: "full", "incremental" or None."""
+    settings = get_settings()
+    full = _last_run(LEASE_NAME)
+    if not settings.sync_incremental:
+        return "full" if _overdue(full, now, settings.sync_interval_seconds) else None
+    if _overdue(full, now, settings.sync_full_interval_seconds):
+        return "full"
+    # an incremental pass is due once neither kind has run for an interval
+    if _overdue(full, now, settings.sync_interval_seconds) and _overdue(
+        _last_run(INCREMENTAL), now, settings.sync_interval_seconds
+    ):
+        return "incremental"
+    return None
+
+
+def _run_as_leader(mode: str = "full") -> None:
+    settings = get_settings()
+    runner = threading.Thread(
+        target=run_sync_now,
+        kwargs={"reason": "schedule", "incremental": mode == "incremental"},
+        name="sync-run",
+        daemon=True,
+    )
+    runner.start()
+    # keep the lease alive for as long as the sync takes
+    while runner.is_alive():
+        runner.join(settings.sync_lease_ttl / 3)
+        if not lease.acquire(settings.sync_lease_path, LEASE_NAME, _owner_id(), settings.sync_lease_ttl):
+            logger.warning("sync scheduler lease lost while a sync was running")
+
+
+def _tick() -> bool:
+    """One scheduler step. Returns True if this process is the leader."""
+    settings = get_settings()
+    if not lease.acquire(settings.sync_lease_path, LEASE_NAME, _owner_id(), settings.sync_lease_ttl):
+        return False
+    mode = _due(time.time())
+    if mode is not None:
+        _run_as_leader(mode)
+    return True
+
+
+def _loop() -> None:
+    tick = get_settings().sync_scheduler_tick
+    # spread the workers' first attempts so they don't all race at boot
+    delay = random.uniform(0, tick)
+    while not _stop.wait(delay):
+        try:
+            _tick()
+        except Exception:
+            logger.exception("sync scheduler tick failed")
+        delay = tick
+
+
+def _release() -> None:
+    try:
+        lease.release(get_settings().sync_lease_path, LEASE_NAME, _owner_id())
+    except Exception:
+        pass
+
+
+def start() -> bool:
+    """
+    Start this worker's scheduler thread (once per process). Call it after
+    the fork, e.g. from gunicorn's post_worker_init hook.
+    """
+    global _thread
+    if not get_settings().sync_scheduler_enabled:
+        return False
+    if _thread is not None and _thread.is_alive() and _owner_pid == os.getpid():
+        return True
+    _stop.clear()
+    _owner_id()
+    _thread = threading.Thread(target=_loop, name="sync-scheduler", daemon=True)
+    _thread.start()
+    atexit.register(_release)
+    return True
+
+
+def stop() -> None:
+    _stop.set()
+    _release()
+
+
+def status() -> dict:
+    settings = get_settings()
+    current = lease.holder(settings.sync_lease_path, LEASE_NAME)
+    row = _last_run()
+    inc = _last_run(INCREMENTAL)
+    return {
+        "enabled": settings.sync_scheduler_enabled,
+        "intervalSeconds": settings.sync_interval_seconds,
+        "incremental": settings.sync_incremental,
+        "fullIntervalSeconds": settings.sync_full_interval_seconds,
+        "watermark": _watermark(),
+        "leader": current[0] if current else None,
+        "isLeader": bool(current) and current[0] == _owner_id(),
+        "lastStarted": row[0] if row else None,
+        "lastFinished": row[1] if row else None,
+        "lastReason": row[2] if row else None,
+        "lastSummary": json.loads(row[3]) if row and row[3] else None,
+        "lastIncremental": {
+            "started": inc[0],
+            "finished": inc[1],
+            "reason": inc[2],
+            "summary": json.loads(inc[3]) if inc[3] else None,
+        } if inc else None,
+    }
+
+
+def refresh_from_webhook(matterIDs: list = None, caseIDs: list = None) -> dict:
+    """
+    Sync the matters a webhook named: Zoho sends matter ids, NAA sends case
+    ids, which are first resolved to their Zoho appearances.
+    """
+    matterIDs = [str(m) for m in matterIDs or []]
+    unresolved = []
+    for caseID in caseIDs or []:
+        found = findSyncRecordsByCaseID(caseID)
+        if "error" in found or not found["response"]:
+            unresolved.append({"caseID": caseID, "error": found.get("error", "no appearance links this case")})
+            continue
+        matterIDs.extend(str(rec["id"]) for rec in found["response"])
+    matterIDs = list(dict.fromkeys(matterIDs))
+    if not matterIDs:
+        return {"error": "no matters to refresh", "failures": unresolved, "statusCode": 404}
+    # these changed upstream: drop the cached records now, since the sync
+    # below may wait for the lock behind a running sweep
+    for matterID in matterIDs:
+        invalidate("record", matterID)
+    summary = run_sync_now(matterIDs, reason="webhook")
+    if unresolved:
+        summary["failures"] = summary.get("failures", []) + unresolved
+    return summary
@@ -0,0 +1,11 @@
+# Loaded by start_flask.sh (gunicorn -c gunicorn.conf.py ...).
+
+
+def post_worker_init(worker):
+    # Background threads must start after the fork: anything started in the
+    # --preload'ed master would not exist in the workers.
+    from functions.helpers.log import configure_logging
+    from server import start_background_sync
+
+    configure_logging()
+    start_background_sync()
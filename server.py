@@ -1,176 +1,218 @@
-from flask import Flask, request, jsonify
-from dotenv import load_dotenv
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 import os
-import threading
-import time
-import json
 
-from functions.connector_fn import create_case_from_zoho, close_case_from_zoho, sync_cases,get_doc_from_zoho_upload_to_naa
+from functions import http_handlers as handlers
+from functions import sync_scheduler
+from functions.connector_fn import (
+    close_case_from_zoho,
+    create_case_from_zoho,
+    iter_batch,
+    run_batch,
+    upload_docs_from_zoho_to_naa,
+)
+from functions import stats_metrics  # registers the component stats with /metrics
+from functions.helpers.log import configure_logging
+from functions.helpers.settings import get_settings
+from functions.http_handlers import checkAuth
 
 app = Flask(__name__)
-load_dotenv(override=True)
-SERVER_PASS = os.getenv("SERVER_PASS")
 
-def checkAuth(token: str):
-    """
-    Check if the provided token matches the server password.
-    """
-    return token == SERVER_PASS
+
+def _endpoint_label() -> str:
+    return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+
+def _reply(reply):
+    """A handlers reply, (body, status[, headers]), as a Flask response."""
+    body, *rest = reply
+    return (jsonify(body), *rest)
+
+
+@app.before_request
+def _start_request_metrics():
+    g.request_metrics = handlers.RequestMetrics(request.method, _endpoint_label())
+
+
+@app.after_request
+def _capture_status(response):
+    request_metrics = g.get('request_metrics')
+    if request_metrics is not None:
+        server_timing = request_metrics.responded(response.status_code)
+        if server_timing is not None:
+            response.headers['Server-Timing'] = server_timing
+    return response
+
+
+@app.teardown_request
+def _finish_request_metrics(exc):
+    request_metrics = g.pop('request_metrics', None)
+    if request_metrics is not None:
+        request_metrics.finished(exc)
+
+
+def _auth_error():
+    error = handlers.auth_error(request.headers)
+    return _reply(error) if error else None
+
+
+def _wants_async(data: dict) -> bool:
+    return handlers.wants_async(request.headers, request.args, data)
+
 
 @app.route('/createNAACaseFromZoho', methods=['POST'])
 def create_naa_case_endpoint():
-    # Extract token from Authorization header
-    auth_header = request.headers.get('Authorization')
-    if not auth_header:
-        return jsonify({"error": "Missing Authorization header"}), 401
-
-    # Support 'Bearer <token>' format
-    parts = auth_header.split()
-    if len(parts) == 2 and parts[0].lower() == 'bearer':
-        token = parts[1]
-    else:
-        token = auth_header
-
-    if not checkAuth(token):
-        return jsonify({"error": "Unauthorized"}), 401
+    auth_error = _auth_error()
+    if auth_error:
+        return auth_error
 
     data = request.get_json(force=True) if request.is_json else request.form.to_dict()
-    if not data or 'matterID' not in data:
-        return jsonify({"error": "Missing 'matterID' in request body"}), 400
+    matterID, error = handlers.matter_id(data)
+    if error:
+        return _reply(error)
 
-    try:
-        matterID = int(data['matterID'])
-    except (ValueError, TypeError):
-        return jsonify({"error": "'matterID' must be an integer"}), 400
+    if _wants_async(data):
+        return _reply(handlers.submit("createNAACaseFromZoho", create_case_from_zoho, matterID, payload={"matterID": matterID}))
 
-    result = create_case_from_zoho(matterID)
-    status = result.pop('statusCode', None)
-    if status is None:
-        status = 200 if 'response' in result else 500
-
-    return jsonify(result), status
+    return _reply(handlers.result_reply(create_case_from_zoho(matterID)))
 
 @app.route('/closeNAACaseFromZoho', methods=['POST'])
 def close_naa_case_endpoint():
-    # Extract token from Authorization header
-    auth_header = request.headers.get('Authorization')
-    if not auth_header:
-        return jsonify({"error": "Missing Authorization header"}), 401
-
-    # Support 'Bearer <token>' format
-    parts = auth_header.split()
-    if len(parts) == 2 and parts[0].lower() == 'bearer':
-        token = parts[1]
-    else:
-        token = auth_header
-
-    if not checkAuth(token):
-        return jsonify({"error": "Unauthorized"}), 401
+    auth_error = _auth_error()
+    if auth_error:
+        return auth_error
 
     data = request.get_json(force=True) if request.is_json else request.form.to_dict()
-    if not data or 'matterID' not in data:
-        return jsonify({"error": "Missing 'matterID' in request body"}), 400
+    matterID, error = handlers.matter_id(data)
+    if error:
+        return _reply(error)
+
+    return _reply(handlers.result_reply(close_case_from_zoho(matterID)))
+
+
+def _batch_endpoint(operation: str):
+    auth_error = _auth_error()
+    if auth_error:
+        return auth_error
 
-    try:
-        matterID = int(data['matterID'])
-    except (ValueError, TypeError):
-        return jsonify({"error": "'matterID' must be an integer"}), 400
+    data = request.get_json(silent=True) or {}
+    matterIDs, error = handlers.batch_matter_ids(data)
+    if error:
+        return _reply(error)
 
-    result = close_case_from_zoho(matterID)
-    status = result.pop('statusCode', None)
-    if status is None:
-        status = 200 if 'response' in result else 500
+    if handlers.batch_as_job(matterIDs, _wants_async(data)):
+        return _reply(handlers.submit(f"{operation}NAACasesFromZoho", run_batch, operation, matterIDs, payload={"matterIDs": matterIDs}))
 
-    return jsonify(result), status
+    if handlers.wants_stream(request.headers, request.args):
+        # one line per matter as it finishes, then a summary line
+        def _lines():
+            results = []
+            for result in iter_batch(operation, matterIDs):
+                results.append(result)
+                yield handlers.ndjson_line(result)
+            yield handlers.batch_summary_line(operation, results)
+
+        return Response(stream_with_context(g.request_metrics.streamed(_lines())), mimetype="application/x-ndjson")
+
+    return _reply(handlers.batch_reply(run_batch(operation, matterIDs)))
+
+
+@app.route('/createNAACasesFromZoho', methods=['POST'])
+def create_naa_cases_endpoint():
+    """createNAACaseFromZoho for body["matterIDs"], run concurrently."""
+    return _batch_endpoint("create")
+
+
+@app.route('/closeNAACasesFromZoho', methods=['POST'])
+def close_naa_cases_endpoint():
+    """closeNAACaseFromZoho for body["matterIDs"], run concurrently."""
+    return _batch_endpoint("close")
 
 
 @app.route('/uploadDocsFromZoho', methods=['POST'])
 def upload_docs_endpoint():
-    # 1) Auth as before
-    auth_header = request.headers.get('Authorization')
-    if not auth_header:
-        return jsonify({"error": "Missing Authorization header"}), 401
-    parts = auth_header.split()
-    token = parts[1] if len(parts) == 2 and parts[0].lower() == 'bearer' else auth_header
-    if not checkAuth(token):
-        return jsonify({"error": "Unauthorized"}), 401
-
-    # 2) Parse body
+    auth_error = _auth_error()
+    if auth_error:
+        return auth_error
+
     if request.is_json:
         data = request.get_json(force=True)
     else:
-        # pulling flat form fields
-        data = {
-            'record_id': request.form.get('record_id'),
-            'NAAM_CaseID': request.form.get('NAAM_CaseID'),
-        }
-        attachments_raw = request.form.get('attachments')
-        if not attachments_raw:
-            return jsonify({"error": "Missing attachments in form data"}), 400
-        try:
-            data['attachments'] = json.loads(attachments_raw)
-        except (TypeError, json.JSONDecodeError):
-            return jsonify({"error": "Invalid JSON for attachments"}), 400
-
-    # 3) Validate presence
-    if not all(k in data for k in ('record_id', 'NAAM_CaseID', 'attachments')):
-        return jsonify({"error": "Missing params in request body"}), 400
-
-    # 4) Validate types
-    try:
-        record_id = int(data['record_id'])
-        case_id   = int(data['NAAM_CaseID'])
-        attachments = data['attachments']
-        if not isinstance(attachments, list):
-            raise ValueError
-    except (ValueError, TypeError):
-        return jsonify({"error": "'record_id' and 'NAAM_CaseID' must be integers, and attachments must be a list"}), 400
-
-    # 5) Process each attachment
-    last_status = None
-    for attachment in attachments:
-        # expect each attachment is a dict with those keys
-        doc_id   = attachment.get('document_id')
-        doc_name = attachment.get('document_name')
-        if not doc_id or not doc_name:
-            return jsonify({"error": "Each attachment must include document_id and document_name"}), 400
-
-        result = get_doc_from_zoho_upload_to_naa(doc_id, doc_name, case_id)
-        last_status = result.pop('statusCode', None)
-        if last_status is None:
-            last_status = 200 if 'response' in result else 500
-
-    # 6) Return final outcome
-    if last_status == 200:
-        return jsonify({
-            "response": f"successfully uploaded {len(attachments)} docs"
-        }), 200
-    else:
-        return jsonify({"error": "Error uploading docs"}), last_status
-def _background_sync_loop():
-    """Background thread: sync_cases every hour, forever."""
-    while True:
-        try:
-            sync_cases()
-        except Exception:
-            app.logger.exception("Error during sync_cases")
-        # Sleep for 3600 seconds (1 hour)
-        time.sleep(3600)
+        data, error = handlers.upload_form(request.form)
+        if error:
+            return _reply(error)
+
+    case_id, attachments, error = handlers.upload_request(data)
+    if error:
+        return _reply(error)
+
+    # transfer attachments concurrently, one result per attachment
+    return _reply(handlers.upload_reply(upload_docs_from_zoho_to_naa(attachments, case_id)))
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job_endpoint(job_id):
+    auth_error = _auth_error()
+    if auth_error:
+        return auth_error
+    return _reply(handlers.get_job(job_id))
+
+
+@app.route('/sync', methods=['POST'])
+def trigger_sync_endpoint():
+    """Queue a sync now: all open matters, or only body["matterIDs"]."""
+    auth_error = _auth_error()
+    if auth_error:
+        return auth_error
+    return _reply(handlers.trigger_sync(request.get_json(silent=True) or {}))
+
+
+@app.route('/webhooks/sync', methods=['POST'])
+def sync_webhook_endpoint():
+    """Queue a refresh of the matters a Zoho or NAA change notification names."""
+    auth_error = handlers.webhook_auth_error(request.headers)
+    if auth_error:
+        return _reply(auth_error)
+
+    data = request.get_json(silent=True) if request.is_json else request.form.to_dict()
+    return _reply(handlers.sync_webhook(data))
+
+
+@app.route('/sync', methods=['GET'])
+def sync_status_endpoint():
+    auth_error = _auth_error()
+    if auth_error:
+        return auth_error
+    return _reply(handlers.sync_status())
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus text format, summed over every worker on this host."""
+    auth_error = _auth_error()
+    if auth_error:
+        return auth_error
+    text = handlers.metrics_text()
+    if text is None:
+        return _reply(handlers.METRICS_DISABLED)
+    return Response(text, mimetype=handlers.METRICS_MIMETYPE)
+
 
 def start_background_sync():
     """
-    Spawn and start the daemon thread for hourly sync.
-    Call this before app.run().
+    Start this worker's sync scheduler. Every worker runs one, but only the
+    lease holder syncs (see functions.sync_scheduler). Under gunicorn this is
+    called from post_worker_init in gunicorn.conf.py.
     """
-    thread = threading.Thread(target=_background_sync_loop, daemon=True)
-    thread.start()
-    app.logger.info("Background sync thread started, will run every hour.")
+    if sync_scheduler.start():
+        app.logger.info("Sync scheduler started, will run every %ss.", get_settings().sync_interval_seconds)
 
 if __name__ == '__main__':
-    # Start hourly sync thread
-    # start_background_sync()
+    configure_logging()
+
+    # Start hourly sync scheduler
+    start_background_sync()
 
     # Run Flask app
     app.run(debug=False, host="0.0.0.0", port=int(os.environ.get("PORT", 8080)))
     # prod:
-    # app.run(host='0.0.0.0', port=8765, debug=False)
\ No newline at end of file
+    # app.run(host='0.0.0.0', port=8765, debug=False)
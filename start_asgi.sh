@@ -0,0 +1,7 @@
+#!/bin/bash
+
+# Event-loop server: create/close/upload run on asyncio (see asgi_server.py).
+# The sync scheduler is started from Quart's before_serving hook in each worker.
+hypercorn --bind 0.0.0.0:8080 --workers 3 --keep-alive 20 asgi:app
+
+echo "Server is running..."
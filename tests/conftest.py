@@ -0,0 +1,44 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from functions.helpers.settings import reload_settings  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def settings_env(tmp_path, monkeypatch):
+    """
+    Fresh settings per test, with every on-disk store under `tmp_path` and
+    an empty .env, so tests never see the checkout's credentials or state.
+    Call the fixture with keyword overrides to change settings mid-test.
+    """
+    dotenv = tmp_path / ".env"
+    dotenv.write_text("")
+    monkeypatch.setenv("DOTENV_PATH", str(dotenv))
+    for name, path in {
+        "SYNC_STATE_PATH": "sync_state.db",
+        "SYNC_LEASE_PATH": "scheduler.db",
+        "JOB_STORE_PATH": "jobs.db",
+        "LOCK_DIR": "locks",
+        "IDEMPOTENCY_STORE_PATH": "idempotency.db",
+        "RATE_LIMIT_PATH": "ratelimit.db",
+        "CACHE_PATH": "cache.db",
+        "METRICS_DIR": "metrics",
+        "PROFILE_DIR": "profiles",
+    }.items():
+        monkeypatch.setenv(name, str(tmp_path / path))
+    monkeypatch.setenv("RATE_LIMIT_ENABLED", "0")
+    monkeypatch.setenv("RETRY_BASE_DELAY", "0")
+
+    def configure(**env):
+        for name, value in env.items():
+            monkeypatch.setenv(name, str(value))
+        return reload_settings()
+
+    configure()
+    yield configure
+    reload_settings()
@@ -0,0 +1,29 @@
+import asyncio
+import gc
+
+from functions.helpers import async_http_client
+
+
+def test_clients_of_a_finished_loop_are_released():
+    async_http_client._reset_after_fork()
+
+    async def use():
+        async_http_client.get_client("http://upstream.test/a")
+        async_http_client.get_client("http://other.test/b")
+        return len(async_http_client._clients[asyncio.get_running_loop()])
+
+    for _ in range(3):
+        assert asyncio.run(use()) == 2
+    gc.collect()
+    assert len(async_http_client._clients) == 0
+
+
+def test_close_all_closes_only_the_running_loops_clients():
+    async_http_client._reset_after_fork()
+
+    async def use_and_close():
+        client = async_http_client.get_client("http://upstream.test/a")
+        await async_http_client.close_all()
+        return client.is_closed, asyncio.get_running_loop() in async_http_client._clients
+
+    assert asyncio.run(use_and_close()) == (True, False)
@@ -0,0 +1,51 @@
+import pytest
+
+import server
+from functions.helpers import jobs
+
+AUTH = {"Authorization": "Bearer api-pass"}
+
+
+@pytest.fixture
+def client(settings_env, monkeypatch):
+    settings_env(BATCH_SYNC_MAX_MATTERS=3, SERVER_PASS="api-pass")
+    calls = {"jobs": [], "inline": []}
+    monkeypatch.setattr(
+        jobs, "submit", lambda kind, fn, *args, **kwargs: calls["jobs"].append((kind, args)) or "job1"
+    )
+
+    def run_batch(operation, matterIDs):
+        calls["inline"].append((operation, matterIDs))
+        return {"response": f"created {len(matterIDs)} cases", "results": [], "statusCode": 200}
+
+    monkeypatch.setattr(server, "run_batch", run_batch)
+    client = server.app.test_client()
+    client.calls = calls
+    return client
+
+
+def test_small_batches_run_in_the_request(client):
+    r = client.post("/createNAACasesFromZoho", json={"matterIDs": [1, 2, 3]}, headers=AUTH)
+    assert r.status_code == 200
+    assert client.calls["inline"] == [("create", [1, 2, 3])]
+    assert client.calls["jobs"] == []
+
+
+def test_large_batches_become_jobs(client):
+    r = client.post("/closeNAACasesFromZoho", json={"matterIDs": [1, 2, 3, 4]}, headers=AUTH)
+    assert r.status_code == 202
+    assert r.headers["Location"] == "/jobs/job1"
+    assert client.calls["jobs"] == [("closeNAACasesFromZoho", ("close", [1, 2, 3, 4]))]
+    assert client.calls["inline"] == []
+
+
+def test_large_streamed_batches_become_jobs_too(client):
+    r = client.post("/createNAACasesFromZoho?stream=1", json={"matterIDs": [1, 2, 3, 4, 5]}, headers=AUTH)
+    assert r.status_code == 202
+    assert client.calls["inline"] == []
+
+
+def test_batches_above_the_job_limit_are_rejected(client, settings_env):
+    settings_env(BATCH_SYNC_MAX_MATTERS=3, BATCH_MAX_MATTERS=4)
+    r = client.post("/createNAACasesFromZoho", json={"matterIDs": [1, 2, 3, 4, 5]}, headers=AUTH)
+    assert r.status_code == 413
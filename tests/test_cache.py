@@ -0,0 +1,64 @@
+import pytest
+
+from functions import connector_fn, sync_scheduler
+from functions.api import zoho
+from functions.helpers import cache
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(cache, "_cache", None)
+
+
+class _Response:
+    status_code = 200
+
+    def __init__(self, body):
+        self._body = body
+
+    def json(self):
+        return self._body
+
+
+def _stale(matterID):
+    cache.get_cache().set("record", matterID, {"data": [{"id": str(matterID), "NAAM_CaseID": 1, "Results": "stale"}]})
+
+
+def test_fresh_reads_skip_the_cache_and_refill_it():
+    calls = []
+
+    @cache.cached("record")
+    def lookup(key):
+        calls.append(key)
+        return {"value": len(calls)}
+
+    assert lookup(1) == lookup(1) == {"value": 1}
+    with cache.fresh_reads():
+        assert lookup(1) == {"value": 2}
+    assert lookup(1) == {"value": 2}
+    assert cache.cache_stats()["record"]["bypassed"] == 1
+
+
+def test_sync_rows_are_read_from_zoho(monkeypatch):
+    _stale(5)
+    monkeypatch.setattr(zoho, "get_token", lambda: "token")
+    monkeypatch.setattr(
+        zoho, "requestGet", lambda **kwargs: _Response({"data": [{"id": "5", "NAAM_CaseID": 1, "Results": "edited"}]})
+    )
+    records, failures = connector_fn._records_for([5])
+    assert failures == [] and records[0]["Results"] == "edited"
+    assert cache.get_cache().get("record", 5)["data"][0]["Results"] == "edited"
+
+
+def test_a_failed_close_drops_the_cached_record(monkeypatch):
+    _stale(6)
+    monkeypatch.setattr(connector_fn, "closeCase", lambda caseID: {"error": "not found", "statusCode": 404})
+    assert connector_fn.close_case_from_zoho(6)["statusCode"] == 500
+    assert cache.get_cache().get("record", 6) is cache._MISSING
+
+
+def test_webhook_refresh_drops_the_cached_records(monkeypatch):
+    _stale(7)
+    monkeypatch.setattr(sync_scheduler, "run_sync_now", lambda matterIDs, reason: {"statusCode": 200})
+    sync_scheduler.refresh_from_webhook(matterIDs=[7])
+    assert cache.get_cache().get("record", 7) is cache._MISSING
@@ -0,0 +1,68 @@
+import pytest
+
+from functions.case_mapping import MissingZohoFields, NAACaseRequest, build_case_request
+
+
+def _record(**overrides):
+    record = {
+        "State": "CA",
+        "City": "Los Angeles",
+        "Court_Name": "Stanley Mosk Courthouse",
+        "Address": "111 N Hill St",
+        "Zip_Code": "90012",
+        "Pick_List_5": "Status Conference",
+        "Desired_Result": "Continue the hearing",
+        "Attorney_of_Record": "Attorney",
+        "Client_Reference": "REF-1",
+        "Case_Name1": "Case 1",
+        "Case_Number": "BC000001",
+        "County2": {"name": "CA: Los Angeles"},
+        "Twenty_Four_Hr_Hearing_Time": "2030-01-02 9:30",
+    }
+    record.update(overrides)
+    return record
+
+
+def test_maps_a_complete_record():
+    request = build_case_request(_record(), "Client")
+    assert isinstance(request, NAACaseRequest)
+    kwargs = request.as_kwargs()
+    assert kwargs["outCourtCounty"] == "Los Angeles"
+    assert kwargs["hearingDate"] == "2030-01-02T09:30:00"
+    assert kwargs["caseClientName"] == "Client"
+    assert kwargs["defendantPlantiff"] is False
+    assert list(kwargs) == [
+        "outCourtState", "outCourtCounty", "outCourtCity", "outCourtName", "outCourtAddress",
+        "outCourtZip", "hearingType", "hearingDate", "fileNumber", "defendantPlantiff",
+        "detailedInstructions", "attorneyRecord", "caseName", "caseClientName", "caseNumber",
+    ]
+
+
+def test_null_fields_count_as_missing():
+    # the fields= projection returns empty fields as null rather than omitting them
+    record = _record(Court_Name=None, County2=None, Twenty_Four_Hr_Hearing_Time=None)
+    with pytest.raises(MissingZohoFields) as info:
+        build_case_request(record, "Client")
+    assert info.value.fields == ["County2.name", "Court_Name", "Twenty_Four_Hr_Hearing_Time"]
+
+
+def test_reports_every_absent_or_unusable_field():
+    record = _record(Twenty_Four_Hr_Hearing_Time="soon", County2={"name": None})
+    del record["Case_Number"]
+    with pytest.raises(MissingZohoFields) as info:
+        build_case_request(record, "Client")
+    assert info.value.fields == ["County2.name", "Twenty_Four_Hr_Hearing_Time", "Case_Number"]
+    assert str(info.value) == "Missing Zoho fields: County2.name, Twenty_Four_Hr_Hearing_Time, Case_Number"
+
+
+def test_optional_fields_may_be_empty():
+    # the free-text fields are often left blank; NAA takes the case without them
+    record = _record(Desired_Result=None, Attorney_of_Record=None)
+    del record["Client_Reference"]
+
+    kwargs = build_case_request(record, "Client").as_kwargs()
+
+    assert kwargs["detailedInstructions"] is None
+    assert kwargs["attorneyRecord"] is None
+    assert kwargs["fileNumber"] is None
+    assert kwargs["caseNumber"] == "BC000001"
@@ -0,0 +1,37 @@
+import threading
+
+from functions.helpers import http_client
+
+
+def test_a_published_session_always_has_stats(monkeypatch):
+    """Readers that find a session without the lock must also find its stats."""
+    http_client._reset_after_fork()
+    published = []
+    real_setitem = dict.__setitem__
+
+    class WatchedSessions(dict):
+        def __setitem__(self, key, value):
+            published.append(key in http_client._stats)
+            real_setitem(self, key, value)
+
+    monkeypatch.setattr(http_client, "_sessions", WatchedSessions())
+    http_client.get_session("http://upstream.test/a")
+    assert published == [True]
+
+
+def test_concurrent_first_use_creates_one_session():
+    http_client._reset_after_fork()
+    sessions, start = [], threading.Barrier(8)
+
+    def use():
+        start.wait()
+        session = http_client.get_session("http://upstream.test/b")
+        sessions.append((session, http_client._stats[http_client.host_key("http://upstream.test/b")]))
+
+    threads = [threading.Thread(target=use) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len({id(s) for s, _ in sessions}) == 1
+    http_client.close_all()
@@ -0,0 +1,51 @@
+import os
+import sqlite3
+import time
+
+from functions.helpers import jobs
+from functions.helpers.settings import get_settings
+
+
+def _insert(job_id, pid, pid_start):
+    jobs._db().execute(
+        "INSERT INTO jobs (id, kind, status, pid, pid_start, created_at) VALUES (?, 'test', 'running', ?, ?, ?)",
+        (job_id, pid, pid_start, time.time()),
+    )
+
+
+def test_job_of_a_process_that_had_this_pid_before_is_interrupted():
+    started = jobs._start_time(os.getpid())
+    _insert("mine", os.getpid(), started)
+    _insert("predecessor", os.getpid(), started - 1)
+
+    assert jobs.get_job("mine")["status"] == "running"
+    assert jobs.get_job("predecessor")["status"] == "interrupted"
+
+
+def test_job_of_a_dead_process_is_interrupted():
+    _insert("orphan", 2 ** 22 + 1, None)  # above Linux's pid_max
+
+    assert jobs.get_job("orphan")["status"] == "interrupted"
+
+
+def test_store_without_start_times_is_migrated():
+    path = get_settings().job_store_path
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE jobs (id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, payload TEXT, "
+        "result TEXT, status_code INTEGER, pid INTEGER, created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+    )
+    conn.execute(
+        "INSERT INTO jobs (id, kind, status, pid, created_at) VALUES ('old', 'test', 'running', ?, ?)",
+        (os.getpid(), time.time()),
+    )
+    conn.commit()
+    conn.close()
+
+    assert jobs.get_job("old")["status"] == "running"
+    job_id = jobs.submit("test", lambda: {"statusCode": 200})
+    for _ in range(100):
+        if jobs.get_job(job_id)["status"] == "succeeded":
+            break
+        time.sleep(0.01)
+    assert jobs.get_job(job_id)["status"] == "succeeded"
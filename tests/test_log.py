@@ -0,0 +1,39 @@
+import json
+import logging
+import subprocess
+import sys
+from pathlib import Path
+
+from functions.helpers import log
+
+
+def test_importing_the_app_starts_no_log_writer():
+    # gunicorn --preload imports the app in the master; the writer thread and
+    # the root handler must wait for configure_logging() in the worker
+    code = (
+        "import logging, threading, server; "
+        "from functions.helpers import log; "
+        "log.get_logger('x').info('hello'); "
+        "print(log._handler is None, "
+        "any(isinstance(h, log._NonBlockingHandler) for h in logging.getLogger().handlers), "
+        "threading.active_count())"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                         cwd=Path(__file__).resolve().parents[1])
+    assert out.stdout.split() == ["True", "False", "1"]
+
+
+def _formatted(**extra):
+    record = logging.makeLogRecord({"msg": "m", "levelname": "INFO", **extra})
+    return json.loads(log.JsonFormatter().format(record))
+
+
+def test_lookup_names_are_kept_and_client_names_redacted():
+    line = _formatted(
+        caseClientName="Jane Doe",
+        record={"County2": {"name": "Los Angeles", "id": "1"}, "Matter": {"name": "Doe v. Roe", "id": "2"}},
+    )
+
+    assert line["caseClientName"] == log.REDACTED
+    assert line["record"]["County2"] == {"name": "Los Angeles", "id": "1"}
+    assert line["record"]["Matter"] == log.REDACTED
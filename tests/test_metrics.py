@@ -0,0 +1,60 @@
+import json
+import os
+
+import pytest
+
+from functions.helpers import metrics, retry
+
+
+@pytest.fixture
+def counter(monkeypatch):
+    # no background flusher: it would outlive the test's METRICS_DIR
+    monkeypatch.setattr(metrics, "_flusher", object())
+    monkeypatch.setattr(metrics, "_claimed", False)
+    counter = metrics._metrics.get("test_requests_total") or metrics.Counter("test_requests_total", "test")
+    counter._values = {}
+    yield counter
+    counter._values = {}
+
+
+def _total(name):
+    return sum(metrics.collect()[name]["values"].values())
+
+
+def test_a_recycled_pid_keeps_its_predecessors_counters(counter):
+    # an exited worker's snapshot, left under the PID this process now has
+    stale = os.path.join(metrics._metrics_dir(), f"{os.getpid()}-{'0' * 32}.json")
+    previous = dict(counter._family(), samples=[[[], 5.0]])
+    metrics.atomic_write_json(stale, {"pid": os.getpid(), "metrics": {"test_requests_total": previous}})
+
+    counter.inc(2)
+
+    assert _total("test_requests_total") == 7
+    assert not os.path.exists(stale)
+    counter.inc()
+    assert _total("test_requests_total") == 8
+
+
+def test_snapshots_are_named_per_process(counter):
+    counter.inc()
+    metrics.flush()
+    first = set(os.listdir(metrics._metrics_dir()))
+
+    metrics._reset_after_fork()  # as in a forked child that got the same PID back
+    counter.inc(3)
+    metrics.flush()
+
+    names = set(os.listdir(metrics._metrics_dir())) - {".lock", metrics._ARCHIVE}
+    assert len(names) == 1 and not names & first
+    with open(os.path.join(metrics._metrics_dir(), metrics._ARCHIVE)) as f:
+        assert json.load(f)["metrics"]["test_requests_total"]["samples"] == [[[], 1.0]]
+
+
+def test_retry_stats_start_from_zero_after_fork():
+    retry._count("attempts")
+    retry._count("giveUps")
+
+    retry._reset_after_fork()
+
+    assert retry.retry_stats()["attempts"] == 0
+    assert retry.retry_stats()["giveUps"] == 0
@@ -0,0 +1,50 @@
+from functions import connector_fn
+from functions.api import naa
+from functions.helpers.settings import reload_settings
+
+PAGES = {
+    1: {"totalCount": 4, "items": [
+        {"id": 1, "caseStatus": 2, "detailedResults": "continued to May"},
+        {"id": 2, "caseStatus": 3},
+    ]},
+    2: {"totalCount": 4, "items": [
+        {"id": 3, "detailedResults": "no status"},
+        {"id": 4, "caseStatus": 7, "detailedResults": ""},
+    ]},
+}
+
+
+def _listing(monkeypatch):
+    monkeypatch.setenv("NAA_PAGE_SIZE", "2")
+    reload_settings()
+    monkeypatch.setattr(naa, "getNAACases", lambda pageIndex, pageSize: PAGES[pageIndex])
+
+
+def test_index_skips_cases_listed_without_detailed_results(monkeypatch):
+    _listing(monkeypatch)
+    index = naa.getCaseStatusIndex()
+    assert index == {"1": (2, "continued to May"), "4": (7, "")}
+
+
+def test_index_keeps_only_wanted_cases(monkeypatch):
+    _listing(monkeypatch)
+    assert naa.getCaseStatusIndex([4, 2]) == {"4": (7, "")}
+
+
+def test_sync_looks_up_cases_missing_from_the_index(monkeypatch):
+    _listing(monkeypatch)
+    looked_up = []
+
+    def getCaseByID(caseID):
+        looked_up.append(caseID)
+        return {"caseStatus": 3, "detailedResults": "heard and closed"}
+
+    monkeypatch.setattr(connector_fn, "getCaseByID", getCaseByID)
+    index = naa.getCaseStatusIndex()
+
+    indexed = connector_fn._naa_status_for({"id": "m1", "NAAM_CaseID": 1}, index)
+    unlisted = connector_fn._naa_status_for({"id": "m2", "NAAM_CaseID": 2}, index)
+
+    assert indexed == ("m1", "Assigned", "continued to May")
+    assert unlisted == ("m2", "Closed", "heard and closed")
+    assert looked_up == [2]
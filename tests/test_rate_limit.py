@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+from requests.exceptions import HTTPError
+
+from functions.api import zoho, zoho_async
+from functions.helpers import cache, rate_limit
+
+
+@pytest.fixture(autouse=True)
+def limiter(settings_env, monkeypatch):
+    # one read token per second, a burst of five
+    monkeypatch.setattr(cache, "_cache", None)
+    settings_env(
+        RATE_LIMIT_ENABLED=1,
+        ZOHO_READ_PER_MINUTE=60,
+        RATE_LIMIT_BURST_SECONDS=5,
+        RATE_LIMIT_BACKGROUND_RESERVE=0.4,
+        RATE_LIMIT_MAX_WAIT=0.2,
+    )
+    return settings_env
+
+
+def _drain(bucket, priority=rate_limit.INTERACTIVE):
+    taken = 0
+    while rate_limit._try_take(bucket, priority) == 0:
+        taken += 1
+    return taken
+
+
+def test_bucket_grants_its_burst_then_asks_to_wait():
+    assert _drain("zoho_read") == 5
+    assert 0.9 < rate_limit._try_take("zoho_read", rate_limit.INTERACTIVE) <= 1.0
+
+
+def test_background_work_leaves_the_reserve_to_interactive_calls():
+    # 40% of five tokens is held back from the sync
+    assert _drain("zoho_read", rate_limit.BACKGROUND) == 3
+    assert _drain("zoho_read", rate_limit.INTERACTIVE) == 2
+
+
+def test_acquire_gives_up_after_max_wait():
+    _drain("zoho_read")
+    with pytest.raises(rate_limit.RateLimitExceeded):
+        rate_limit.acquire("zoho_read")
+    with pytest.raises(rate_limit.RateLimitExceeded):
+        asyncio.run(rate_limit.acquire_async("zoho_read"))
+
+
+def test_acquire_waits_for_a_refill(limiter):
+    limiter(RATE_LIMIT_MAX_WAIT=2)
+    _drain("zoho_read")
+    assert 0 < rate_limit.acquire("zoho_read") <= 1.5
+
+
+class _Rejected:
+    status_code = 401
+
+    def json(self):
+        return {"code": "INVALID_TOKEN", "message": "invalid oauth token"}
+
+
+class _Found:
+    status_code = 200
+
+    def json(self):
+        return {"data": [{"id": "1"}]}
+
+
+def _taken(monkeypatch):
+    taken = []
+    monkeypatch.setattr(rate_limit, "acquire", taken.append)
+
+    async def acquire_async(bucket):
+        taken.append(bucket)
+
+    monkeypatch.setattr(rate_limit, "acquire_async", acquire_async)
+    return taken
+
+
+def test_retry_after_a_token_refresh_takes_its_own_rate_token(monkeypatch):
+    taken = _taken(monkeypatch)
+    responses = iter([HTTPError("401", response=_Rejected()), _Found()])
+
+    def request_get(**kwargs):
+        response = next(responses)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    monkeypatch.setattr(zoho, "get_token", lambda: "token")
+    monkeypatch.setattr(zoho, "reInit", lambda stale=None: "fresh")
+    monkeypatch.setattr(zoho, "requestGet", request_get)
+
+    assert zoho.searchZohoContacts("1") == {"data": [{"id": "1"}]}
+    assert taken == ["zoho_read", "zoho_read"]
+
+
+def test_async_retry_after_a_token_refresh_takes_its_own_rate_token(monkeypatch):
+    taken = _taken(monkeypatch)
+    responses = iter([HTTPError("401", response=_Rejected()), _Found()])
+
+    async def request_get(**kwargs):
+        response = next(responses)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    async def get_token():
+        return "token"
+
+    async def invalidate(stale):
+        return "fresh"
+
+    monkeypatch.setattr(zoho_async, "get_token", get_token)
+    monkeypatch.setattr(zoho._tokens, "invalidate_async", invalidate)
+    monkeypatch.setattr(zoho_async, "requestGetAsync", request_get)
+
+    assert asyncio.run(zoho_async.searchZohoContacts("1")) == {"data": [{"id": "1"}]}
+    assert taken == ["zoho_read", "zoho_read"]
@@ -0,0 +1,145 @@
+import socket
+import time
+
+import pytest
+import requests
+import urllib3
+
+from functions.helpers import http_client, retry
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def fresh_breakers():
+    retry._breakers.clear()
+    yield
+    retry._breakers.clear()
+
+
+URL = "http://upstream.test/api/cases"
+
+
+def _half_open_breaker():
+    breaker = retry.breaker_for(URL)
+    breaker.state = "open"
+    breaker.opened_at = time.monotonic() - breaker.reset_seconds - 1
+    return breaker
+
+
+def test_429_on_half_open_probe_does_not_lock_the_host_out():
+    breaker = _half_open_breaker()
+    responses = iter([FakeResponse(429), FakeResponse(200)])
+
+    response = retry.call_with_retry("GET", URL, lambda budget: next(responses))
+
+    assert response.status_code == 200
+    assert breaker.state == "closed"
+    breaker.before_call()
+
+
+def test_429_probe_that_is_not_retried_still_releases_the_probe(settings_env):
+    settings_env(RETRY_MAX_ATTEMPTS=1)
+    breaker = _half_open_breaker()
+
+    response = retry.call_with_retry("POST", URL, lambda budget: FakeResponse(429))
+
+    assert response.status_code == 429
+    assert breaker.state == "half_open"
+    breaker.before_call()  # the next call may probe
+
+
+def test_unexpected_error_in_send_releases_the_probe():
+    breaker = _half_open_breaker()
+
+    def send(budget):
+        raise ValueError("bug in the sender")
+
+    with pytest.raises(ValueError):
+        retry.call_with_retry("GET", URL, send)
+    breaker.before_call()
+
+
+def test_failed_probe_reopens_the_circuit():
+    breaker = _half_open_breaker()
+    with pytest.raises(requests.exceptions.ConnectionError):
+        retry.call_with_retry(
+            "GET", URL, lambda budget: (_ for _ in ()).throw(requests.exceptions.ConnectionError("down"))
+        )
+    assert breaker.state == "open"
+    with pytest.raises(retry.CircuitOpenError):
+        breaker.before_call()
+
+
+def test_retries_get_the_remaining_budget_and_the_first_attempt_its_timeout(settings_env):
+    settings_env(RETRY_BUDGET_SECONDS=5)
+    budgets = []
+    responses = iter([FakeResponse(503), FakeResponse(503), FakeResponse(200)])
+
+    def send(budget):
+        budgets.append(budget)
+        return next(responses)
+
+    assert retry.call_with_retry("GET", URL, send).status_code == 200
+    assert len(budgets) == 3
+    # the budget (5 s) is shorter than HTTP_READ_TIMEOUT (15 s): the first
+    # attempt must still get the whole read timeout
+    assert budgets[0] is None
+    assert all(b <= 5 for b in budgets[1:])
+    assert budgets[1:] == sorted(budgets[1:], reverse=True)
+
+
+def test_bounded_timeout_caps_connect_and_read(settings_env):
+    settings_env(HTTP_CONNECT_TIMEOUT=3, HTTP_READ_TIMEOUT=15)
+    assert http_client.bounded_timeout() == (3, 15)
+    assert http_client.bounded_timeout(budget=6) == (3, 6)
+    assert http_client.bounded_timeout(budget=0) == (http_client.MIN_ATTEMPT_SECONDS,) * 2
+    assert http_client.bounded_timeout(20, budget=8) == (8, 8)
+
+
+def _closed_port_url():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}/api/cases"
+
+
+def test_post_is_resent_when_the_connection_is_refused():
+    url = _closed_port_url()
+    attempts = []
+
+    def send(budget):
+        attempts.append(budget)
+        return http_client.send("POST", url, budget=budget, data=b"{}")
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        retry.call_with_retry("POST", url, send)
+    assert len(attempts) == 3
+
+
+@pytest.mark.parametrize("error", [
+    requests.exceptions.ReadTimeout("read timed out"),
+    requests.exceptions.ConnectionError(
+        urllib3.exceptions.ProtocolError("Connection aborted.", ConnectionResetError(104, "reset"))
+    ),
+    # the message alone must not make it look unsent
+    requests.exceptions.ConnectionError("peer refused to answer"),
+])
+def test_post_is_never_resent_after_a_read_timeout_or_reset(error):
+    attempts = []
+
+    def send(budget):
+        attempts.append(budget)
+        raise error
+
+    with pytest.raises(type(error)):
+        retry.call_with_retry("POST", URL, send)
+    assert len(attempts) == 1
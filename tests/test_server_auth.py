@@ -0,0 +1,76 @@
+import pytest
+
+import server
+from functions.helpers import jobs
+
+
+@pytest.fixture
+def client(settings_env, monkeypatch):
+    settings_env(WEBHOOK_SECRET="hook-secret", SERVER_PASS="api-pass")
+    queued = []
+    monkeypatch.setattr(jobs, "submit", lambda kind, *args, **kwargs: queued.append((kind, args)) or "job1")
+    client = server.app.test_client()
+    client.queued = queued
+    return client
+
+
+def test_check_auth_compares_against_server_pass(settings_env, monkeypatch):
+    settings_env(SERVER_PASS="api-pass")
+    assert server.checkAuth("api-pass")
+    assert not server.checkAuth("api-pas")
+    assert not server.checkAuth(None)
+    monkeypatch.setenv("SERVER_PASS", "")
+    settings_env()
+    assert not server.checkAuth("")
+
+
+def test_webhook_accepts_the_secret_in_headers(client):
+    r = client.post("/webhooks/sync", json={"matterID": 5}, headers={"X-Webhook-Token": "hook-secret"})
+    assert r.status_code == 202
+    r = client.post("/webhooks/sync", json={"caseID": 6}, headers={"Authorization": "Bearer hook-secret"})
+    assert r.status_code == 202
+    assert [kind for kind, _ in client.queued] == ["syncWebhook", "syncWebhook"]
+
+
+def test_webhook_rejects_query_tokens_and_the_api_password(client):
+    assert client.post("/webhooks/sync?token=hook-secret", json={"matterID": 5}).status_code == 401
+    r = client.post("/webhooks/sync", json={"matterID": 5}, headers={"X-Webhook-Token": "api-pass"})
+    assert r.status_code == 401
+    assert client.queued == []
+
+
+def test_webhooks_are_disabled_without_a_secret(client, settings_env, monkeypatch):
+    monkeypatch.delenv("WEBHOOK_SECRET")
+    settings_env()
+    r = client.post("/webhooks/sync", json={"matterID": 5}, headers={"Authorization": "Bearer api-pass"})
+    assert r.status_code == 404
+
+
+def test_asgi_webhook_uses_the_same_check(client, monkeypatch):
+    import asyncio
+
+    import asgi_server
+
+    async def post(**kwargs):
+        return (await asgi_server.app.test_client().post("/webhooks/sync", json={"matterID": 5}, **kwargs)).status_code
+
+    assert asyncio.run(post(query_string={"token": "hook-secret"})) == 401
+    assert asyncio.run(post(headers={"X-Webhook-Token": "hook-secret"})) == 202
+
+
+def test_both_apps_share_request_validation(client):
+    import asyncio
+
+    import asgi_server
+
+    body = {"record_id": 1, "NAAM_CaseID": 2, "attachments": [{"document_id": "d1"}]}
+    flask_reply = client.post("/uploadDocsFromZoho", json=body, headers={"Authorization": "api-pass"})
+
+    async def post():
+        return await asgi_server.app.test_client().post(
+            "/uploadDocsFromZoho", json=body, headers={"Authorization": "api-pass"}
+        )
+
+    asgi_reply = asyncio.run(post())
+    assert flask_reply.status_code == asgi_reply.status_code == 400
+    assert flask_reply.get_json() == asyncio.run(asgi_reply.get_json())
@@ -0,0 +1,77 @@
+import asyncio
+import threading
+
+from functions.helpers import singleflight
+
+
+def test_async_store_access_stays_off_the_loop(monkeypatch):
+    threads = []
+    real_recent, real_remember = singleflight._recent_result, singleflight._remember
+
+    def recent(*args):
+        threads.append(threading.get_ident())
+        return real_recent(*args)
+
+    def remember(*args):
+        threads.append(threading.get_ident())
+        return real_remember(*args)
+
+    monkeypatch.setattr(singleflight, "_recent_result", recent)
+    monkeypatch.setattr(singleflight, "_remember", remember)
+
+    async def create():
+        return {"response": 7}
+
+    async def main():
+        loop_thread = threading.get_ident()
+        first = await singleflight.run_once_async("create", 1, create)
+        replay = await singleflight.run_once_async("create", 1, create)
+        return loop_thread, first, replay
+
+    loop_thread, first, replay = asyncio.run(main())
+    assert first == replay == {"response": 7}
+    assert len(threads) == 4 and loop_thread not in threads
+
+
+def test_duplicate_calls_replay_the_first_success():
+    calls = []
+
+    @singleflight.single_flight("create", clears=("close",))
+    def create(matterID):
+        calls.append(matterID)
+        return {"response": len(calls)}
+
+    assert create(1) == create(1) == {"response": 1}
+    assert calls == [1]
+
+
+def test_a_close_lets_the_next_create_run():
+    calls = []
+
+    @singleflight.single_flight("create", clears=("close",))
+    def create(matterID):
+        calls.append("create")
+        return {"response": len(calls)}
+
+    @singleflight.single_flight("close", clears=("create",))
+    def close(matterID):
+        calls.append("close")
+        return {"response": "closed"}
+
+    create(2)
+    close(2)
+    assert create(2) == {"response": 3}
+    assert close(2) == {"response": "closed"}
+    assert calls == ["create", "close", "create", "close"]
+
+
+def test_failures_are_not_replayed():
+    outcomes = [{"error": "upstream down", "statusCode": 502}, {"response": "ok"}]
+
+    @singleflight.single_flight("create")
+    def create(matterID):
+        return outcomes.pop(0)
+
+    assert create(3)["statusCode"] == 502
+    assert create(3) == {"response": "ok"}
+
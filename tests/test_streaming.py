@@ -0,0 +1,158 @@
+import asyncio
+import io
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from functions.api import zoho_async
+from functions.api.naa_async import _iter_body
+from functions.helpers import async_http_client, rate_limit, retry
+from functions.helpers.async_helpers import requestPostAsync
+from functions.helpers.helpers import requestPost
+from functions.helpers.streaming import MultipartStream
+
+
+@pytest.fixture
+def upload_server():
+    """Answers the first POST with 429, later ones with 200; keeps every body."""
+    bodies = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            bodies.append(self.rfile.read(int(self.headers["Content-Length"])))
+            status = 429 if len(bodies) == 1 else 200
+            self.send_response(status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    retry._breakers.clear()
+    yield f"http://127.0.0.1:{server.server_port}/upload", bodies
+    server.shutdown()
+    server.server_close()
+
+
+def _body(payload: bytes) -> MultipartStream:
+    return MultipartStream("file", "doc.pdf", io.BytesIO(payload), len(payload), "application/pdf")
+
+
+def test_rewind_restarts_the_body_from_the_original_position():
+    fileobj = io.BytesIO(b"skip" + b"x" * 200_000)
+    fileobj.seek(4)
+    body = MultipartStream("file", "doc.pdf", fileobj, 200_000)
+    first = body.read()
+    body.read(10)
+    body.rewind()
+    assert body.read() == first
+    assert len(first) == len(body)
+
+
+def test_retried_streamed_post_resends_the_whole_body(upload_server, settings_env):
+    settings_env(HTTP_READ_TIMEOUT=2)
+    url, bodies = upload_server
+    payload = b"%PDF" + b"x" * 300_000
+    body = _body(payload)
+
+    response = requestPost(url, data=body, headers={"Content-Type": body.content_type})
+
+    assert response.status_code == 200
+    assert len(bodies) == 2
+    assert bodies[0] == bodies[1]
+    assert len(bodies[1]) == len(body)
+    assert payload in bodies[1]
+
+
+def test_retried_async_streamed_post_resends_the_whole_body(upload_server, settings_env):
+    settings_env(HTTP_READ_TIMEOUT=2)
+    url, bodies = upload_server
+    payload = b"%PDF" + b"y" * 300_000
+    body = _body(payload)
+    headers = {"Content-Type": body.content_type, "Content-Length": str(len(body))}
+
+    async def main():
+        try:
+            return await requestPostAsync(url, content=lambda: _iter_body(body), headers=headers)
+        finally:
+            await async_http_client.close_all()
+
+    response = asyncio.run(main())
+
+    assert response.status_code == 200
+    assert len(bodies) == 2
+    assert bodies[0] == bodies[1]
+    assert payload in bodies[1]
+
+
+class _ThreadRecordingFile(io.BytesIO):
+    """BytesIO that notes which threads read and write it."""
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.threads = set()
+
+    def read(self, *args):
+        self.threads.add(threading.get_ident())
+        return super().read(*args)
+
+    def write(self, data):
+        self.threads.add(threading.get_ident())
+        return super().write(data)
+
+    def truncate(self, *args):
+        self.threads.add(threading.get_ident())
+        return super().truncate(*args)
+
+
+def test_async_upload_body_is_read_off_the_event_loop():
+    payload = b"%PDF" + b"z" * 200_000
+    fileobj = _ThreadRecordingFile(payload)
+    body = MultipartStream("file", "doc.pdf", fileobj, len(payload))
+
+    async def main():
+        chunks = [chunk async for chunk in _iter_body(body)]
+        return b"".join(chunks), threading.get_ident()
+
+    sent, loop_thread = asyncio.run(main())
+
+    assert len(sent) == len(body) and payload in sent
+    assert fileobj.threads and loop_thread not in fileobj.threads
+
+
+def test_async_download_writes_the_spool_off_the_event_loop(monkeypatch):
+    payload = b"%PDF" + b"w" * 200_000
+
+    class _Download:
+        status_code = 200
+
+        async def aiter_bytes(self, size):
+            for start in range(0, len(payload), size):
+                yield payload[start:start + size]
+
+        async def aclose(self):
+            pass
+
+    async def request_get(**kwargs):
+        return _Download()
+
+    async def get_token():
+        return "token"
+
+    monkeypatch.setattr(zoho_async, "requestGetAsync", request_get)
+    monkeypatch.setattr(zoho_async, "get_token", get_token)
+    monkeypatch.setattr(rate_limit, "acquire_async", lambda bucket: asyncio.sleep(0))
+    dest = _ThreadRecordingFile()
+
+    async def main():
+        return await zoho_async.downloadFileFromZoho("file-1", dest), threading.get_ident()
+
+    result, loop_thread = asyncio.run(main())
+
+    assert result == {"statusCode": 200, "size": len(payload)}
+    assert dest.getvalue() == payload
+    assert dest.threads and loop_thread not in dest.threads
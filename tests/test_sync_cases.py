@@ -0,0 +1,94 @@
+import pytest
+
+from functions import connector_fn
+from functions.helpers import state_store
+
+# three linked appearances whose Zoho fields lag behind NAA, one unlinked
+RECORDS = [
+    {"id": "m1", "NAAM_CaseID": 11, "NAAM_Results": "Submitted", "Results": ""},
+    {"id": "m2", "NAAM_CaseID": 12, "NAAM_Results": "Submitted", "Results": ""},
+    {"id": "m3", "NAAM_CaseID": 13, "NAAM_Results": "Submitted", "Results": ""},
+    {"id": "m4", "NAAM_CaseID": None, "NAAM_Results": None, "Results": None},
+]
+CASES = {
+    11: {"caseStatus": 2, "detailedResults": "continued to May"},
+    12: {"caseStatus": 3, "detailedResults": "heard and closed"},
+    13: {"caseStatus": 3, "detailedResults": "dismissed"},
+}
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    calls = {"lookups": [], "writes": [], "sweeps": []}
+    failing = set()
+
+    def get_case_by_id(caseID):
+        calls["lookups"].append(caseID)
+        return CASES[caseID]
+
+    def get_case_status_index(caseIDs):
+        calls["sweeps"].append(sorted(caseIDs))
+        return {str(caseID): (CASES[caseID]["caseStatus"], CASES[caseID]["detailedResults"]) for caseID in caseIDs}
+
+    def update_results_bulk(updates):
+        calls["writes"].append(list(updates))
+        return {str(m): {"ok": m not in failing, "code": "SUCCESS", "message": ""} for m, _, _ in updates}
+
+    monkeypatch.setattr(connector_fn, "listSyncRecords", lambda modifiedSince=None: {"response": [dict(r) for r in RECORDS]})
+    monkeypatch.setattr(connector_fn, "getCaseByID", get_case_by_id)
+    monkeypatch.setattr(connector_fn, "getCaseStatusIndex", get_case_status_index)
+    monkeypatch.setattr(connector_fn, "updateResultsBulk", update_results_bulk)
+    calls["failing"] = failing
+    return calls
+
+
+def test_second_run_with_the_same_naa_data_writes_nothing(upstream):
+    first = connector_fn._sync_cases()
+    assert sorted(m for m, _, _ in upstream["writes"][0]) == ["m1", "m2", "m3"]
+    assert first["written"] == 3
+
+    second = connector_fn._sync_cases()
+
+    assert upstream["writes"][1] == []
+    assert second["written"] == 0
+    assert second["skipped"] == 3
+
+
+def test_a_failed_write_is_retried_on_the_next_run(upstream):
+    upstream["failing"].add("m2")
+    connector_fn._sync_cases()
+    upstream["failing"].clear()
+
+    connector_fn._sync_cases()
+
+    assert [m for m, _, _ in upstream["writes"][1]] == ["m2"]
+
+
+def test_matters_zoho_already_shows_are_remembered_without_a_write(upstream, monkeypatch):
+    current = [dict(RECORDS[0], NAAM_Results="Assigned", Results="continued to May")]
+    monkeypatch.setattr(connector_fn, "listSyncRecords", lambda modifiedSince=None: {"response": current})
+
+    connector_fn._sync_cases()
+
+    assert upstream["writes"] == [[]]
+    assert state_store.load_states()["m1"] == ("Assigned", state_store.results_hash("Assigned", "continued to May"))
+
+
+def test_bulk_index_is_used_from_the_threshold(upstream, settings_env):
+    settings_env(SYNC_BULK_THRESHOLD=4)
+    assert connector_fn._sync_cases()["naaLookup"] == "point"
+    assert sorted(upstream["lookups"]) == [11, 12, 13]
+    assert upstream["sweeps"] == []
+
+    settings_env(SYNC_BULK_THRESHOLD=3)
+    upstream["lookups"].clear()
+    assert connector_fn._sync_cases()["naaLookup"] == "bulk"
+    assert upstream["sweeps"] == [[11, 12, 13]]
+    assert upstream["lookups"] == []
+
+
+def test_save_states_upserts():
+    state_store.save_states([("m1", 11, "Submitted", "a"), ("m2", None, "New", "b")])
+    state_store.save_states([("m1", 11, "Closed", "c")])
+
+    assert state_store.load_states() == {"m1": ("Closed", "c"), "m2": ("New", "b")}
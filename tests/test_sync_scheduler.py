@@ -0,0 +1,29 @@
+import time
+
+from functions import sync_scheduler
+
+
+def _record_full_run(started: float) -> None:
+    sync_scheduler._mark_started("schedule")
+    db = sync_scheduler._db()
+    db.execute(
+        "UPDATE sync_runs SET last_started = ?, last_finished = ? WHERE name = ?",
+        (started, started + 1, sync_scheduler.LEASE_NAME),
+    )
+
+
+def test_scheduled_runs_are_full_sweeps_by_default(settings_env):
+    settings = settings_env()
+    assert settings.sync_incremental is False
+    now = time.time()
+    assert sync_scheduler._due(now) == "full"
+
+    _record_full_run(now - settings.sync_interval_seconds - 5)
+    assert sync_scheduler._due(now) == "full"
+
+
+def test_incremental_passes_are_opt_in(settings_env):
+    settings = settings_env(SYNC_INCREMENTAL=1)
+    now = time.time()
+    _record_full_run(now - settings.sync_interval_seconds - 5)
+    assert sync_scheduler._due(now) == "incremental"
@@ -0,0 +1,90 @@
+import base64
+import json
+import time
+
+import pytest
+
+from functions.helpers.token_manager import TokenManager
+
+
+class FakeFetch:
+    """Hands out token-1, token-2, ... and counts the calls."""
+
+    def __init__(self, expires_in=3600):
+        self.expires_in = expires_in
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return f"token-{self.calls}", self.expires_in
+
+
+@pytest.fixture
+def cred_path(tmp_path):
+    return str(tmp_path / "creds.json")
+
+
+def _manager(cred_path, fetch, refresh_ahead=300):
+    return TokenManager("test", cred_path, fetch, refresh_ahead=refresh_ahead)
+
+
+def _jwt(exp):
+    payload = base64.urlsafe_b64encode(json.dumps({"exp": exp}).encode()).rstrip(b"=").decode()
+    return f"header.{payload}.signature"
+
+
+def test_refreshes_ahead_of_expiry(cred_path):
+    fetch = FakeFetch()
+    tokens = _manager(cred_path, fetch)
+    assert tokens.get_token() == "token-1"
+    assert tokens.get_token() == "token-1"
+
+    # inside the refresh_ahead window, though still valid
+    with open(cred_path) as f:
+        data = json.load(f)
+    data["expires_at"] = tokens._expires_at = time.time() + 100
+    with open(cred_path, "w") as f:
+        json.dump(data, f)
+    assert tokens.get_token() == "token-2"
+    assert fetch.calls == 2
+    with open(cred_path) as f:
+        assert json.load(f)["token"] == "token-2"
+
+
+def test_reuses_a_token_another_process_wrote(cred_path):
+    first_fetch, second_fetch = FakeFetch(), FakeFetch()
+    first, second = _manager(cred_path, first_fetch), _manager(cred_path, second_fetch)
+
+    assert first.get_token() == "token-1"
+    assert second.get_token() == "token-1"
+    assert second_fetch.calls == 0
+
+
+def test_invalidate_reuses_a_newer_token_from_the_file(cred_path):
+    fetch = FakeFetch()
+    first, second = _manager(cred_path, fetch), _manager(cred_path, fetch)
+    assert first.get_token() == second.get_token() == "token-1"
+
+    # the other worker saw the 401 first and refreshed
+    assert second.invalidate("token-1") == "token-2"
+    assert first.invalidate("token-1") == "token-2"
+    assert fetch.calls == 2
+    assert first.stats()["reused"] == 1
+
+
+def test_falls_back_to_the_jwt_exp_claim(cred_path):
+    expiring = iter([_jwt(time.time() + 100), _jwt(time.time() + 3600)])
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return next(expiring), None
+
+    tokens = _manager(cred_path, fetch)
+    first = tokens.get_token()
+    # exp is 100 s away, inside refresh_ahead: the next call renews it
+    second = tokens.get_token()
+    assert second != first
+    assert tokens.get_token() == second
+    assert len(calls) == 2
+    assert 3500 < tokens.stats()["expiresIn"] <= 3600
@@ -0,0 +1,107 @@
+import asyncio
+import time
+
+import pytest
+
+import server
+from functions import http_handlers as handlers
+from functions.helpers import tracing
+
+AUTH = {"Authorization": "Bearer api-pass"}
+ENDPOINT = "/createNAACasesFromZoho"
+
+
+@pytest.fixture
+def finished(settings_env, monkeypatch):
+    """The traces the requests finished, in order."""
+    settings_env(SERVER_PASS="api-pass", BATCH_SYNC_MAX_MATTERS=10)
+    traces = []
+    finish = tracing.finish
+
+    def recording_finish(token, **fields):
+        trace = finish(token, **fields)
+        traces.append((trace, fields))
+        return trace
+
+    monkeypatch.setattr(tracing, "finish", recording_finish)
+    return traces
+
+
+def _in_flight():
+    return handlers.HTTP_IN_FLIGHT._values.get(handlers.HTTP_IN_FLIGHT._key({"endpoint": ENDPOINT}), 0.0)
+
+
+def _slow_result(matterID):
+    with tracing.span("batch_item"):
+        time.sleep(0.05)
+    return {"matterID": matterID, "response": "created", "statusCode": 200}
+
+
+def test_span_outside_a_request_is_a_no_op():
+    with tracing.span("anything"):
+        pass
+    assert tracing.current() is None
+
+
+def test_a_plain_response_carries_its_spans_in_server_timing(finished, monkeypatch):
+    def run_batch(operation, matterIDs):
+        results = [_slow_result(matterID) for matterID in matterIDs]
+        return {"response": f"created {len(results)} cases", "results": results, "statusCode": 200}
+
+    monkeypatch.setattr(server, "run_batch", run_batch)
+
+    r = server.app.test_client().post(ENDPOINT, json={"matterIDs": [1, 2]}, headers=AUTH)
+
+    assert r.status_code == 200
+    timing = r.headers["Server-Timing"]
+    assert 'batch_item;dur=' in timing and 'desc="x2"' in timing
+    assert "total;dur=" in timing
+    [(trace, fields)] = finished
+    assert fields == {"status": 200}
+    assert trace.phases["batch_item"][1] == 2
+
+
+def test_a_streamed_batch_is_timed_until_the_body_ends(finished, monkeypatch):
+    def iter_batch(operation, matterIDs):
+        for matterID in matterIDs:
+            yield _slow_result(matterID)
+
+    monkeypatch.setattr(server, "iter_batch", iter_batch)
+    before = _in_flight()
+
+    r = server.app.test_client().post(f"{ENDPOINT}?stream=1", json={"matterIDs": [1, 2, 3]}, headers=AUTH)
+
+    assert r.status_code == 200
+    assert "Server-Timing" not in r.headers
+    assert len(r.get_data(as_text=True).splitlines()) == 4
+    [(trace, fields)] = finished
+    assert fields["status"] == 200
+    assert trace.phases["batch_item"][1] == 3
+    assert trace.summary()["totalMs"] >= 150
+    assert _in_flight() == before
+
+
+def test_an_async_streamed_batch_is_timed_until_the_body_ends(finished, monkeypatch):
+    import asgi_server
+
+    async def iter_batch(operation, matterIDs):
+        for matterID in matterIDs:
+            yield await asyncio.to_thread(_slow_result, matterID)
+
+    monkeypatch.setattr(asgi_server, "iter_batch", iter_batch)
+    before = _in_flight()
+
+    async def post():
+        r = await asgi_server.app.test_client().post(f"{ENDPOINT}?stream=1", json={"matterIDs": [1, 2, 3]}, headers=AUTH)
+        return r, await r.get_data(as_text=True)
+
+    r, body = asyncio.run(post())
+
+    assert r.status_code == 200
+    assert "Server-Timing" not in r.headers
+    assert len(body.splitlines()) == 4
+    [(trace, fields)] = finished
+    assert fields["status"] == 200
+    assert trace.phases["batch_item"][1] == 3
+    assert trace.summary()["totalMs"] >= 150
+    assert _in_flight() == before
@@ -0,0 +1,59 @@
+import pytest
+
+import server
+from functions import connector_fn
+
+AUTH = {"Authorization": "Bearer api-pass"}
+
+
+def _body(*names):
+    return {
+        "record_id": 1,
+        "NAAM_CaseID": 77,
+        "attachments": [{"document_id": name, "document_name": f"{name}.pdf"} for name in names],
+    }
+
+
+@pytest.fixture
+def client(settings_env, monkeypatch):
+    settings_env(SERVER_PASS="api-pass", UPLOAD_MAX_WORKERS=3)
+    transfers = []
+
+    def transfer(docID, docName, caseID):
+        transfers.append((docID, caseID))
+        if docID == "broken":
+            raise RuntimeError("zoho download failed")
+        if docID == "rejected":
+            return {"error": "NAA rejected the file", "statusCode": 415}
+        return {"response": f"uploaded {docName}", "statusCode": 200}
+
+    monkeypatch.setattr(connector_fn, "get_doc_from_zoho_upload_to_naa", transfer)
+    client = server.app.test_client()
+    client.transfers = transfers
+    return client
+
+
+def test_one_failed_attachment_makes_a_207_with_every_result(client):
+    r = client.post("/uploadDocsFromZoho", json=_body("a", "broken", "c", "d"), headers=AUTH)
+
+    assert r.status_code == 207
+    body = r.get_json()
+    assert body["response"] == "uploaded 3 of 4 docs"
+    assert [(x["document_id"], x["statusCode"]) for x in body["results"]] == [
+        ("a", 200), ("broken", 500), ("c", 200), ("d", 200),
+    ]
+    assert body["results"][1]["error"] == "zoho download failed"
+    assert sorted(docID for docID, _ in client.transfers) == ["a", "broken", "c", "d"]
+    assert {caseID for _, caseID in client.transfers} == {77}
+
+
+def test_all_uploads_succeeding_is_a_200(client):
+    r = client.post("/uploadDocsFromZoho", json=_body("a", "b"), headers=AUTH)
+    assert r.status_code == 200
+    assert r.get_json()["response"] == "successfully uploaded 2 docs"
+
+
+def test_all_uploads_failing_keeps_the_upstream_status(client):
+    r = client.post("/uploadDocsFromZoho", json=_body("broken", "rejected"), headers=AUTH)
+    assert r.status_code == 415
+    assert [x["statusCode"] for x in r.get_json()["results"]] == [500, 415]
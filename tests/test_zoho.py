@@ -0,0 +1,142 @@
+import pytest
+
+from functions.api import zoho
+from functions.helpers import cache
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(cache, "_cache", None)
+
+
+def _succeeded(rows):
+    return {
+        "data": [
+            {"status": "success", "code": "SUCCESS", "message": "record updated", "details": {"id": row["id"]}}
+            for row in rows
+        ]
+    }
+
+
+def test_bulk_update_maps_rows_and_chunks_at_the_limit(monkeypatch):
+    calls = []
+
+    def put_records(rows):
+        calls.append(rows)
+        return _succeeded(rows)
+
+    monkeypatch.setattr(zoho, "_putRecords", put_records)
+    updates = [(matterID, "Submitted", f"case {matterID}") for matterID in range(205)]
+
+    outcome = zoho.updateResultsBulk(updates)
+
+    assert [len(rows) for rows in calls] == [100, 100, 5]
+    assert calls[0][0] == {"id": "0", "NAAM_Results": "Submitted", "Results": "case 0"}
+    assert calls[2][-1]["id"] == "204"
+    assert len(outcome) == 205
+    assert all(result["ok"] for result in outcome.values())
+
+
+def test_a_failed_chunk_fails_only_its_own_matters(monkeypatch):
+    def put_records(rows):
+        if rows[0]["id"] == "100":
+            raise zoho.ZohoApiError("rate limited")
+        if rows[0]["id"] == "200":
+            return {"error": "INVALID_DATA", "statusCode": 400}
+        return _succeeded(rows)
+
+    monkeypatch.setattr(zoho, "_putRecords", put_records)
+    updates = [(matterID, "Dead", "") for matterID in range(250)]
+
+    outcome = zoho.updateResultsBulk(updates)
+
+    assert all(outcome[str(m)]["ok"] for m in range(100))
+    assert outcome["100"] == {"ok": False, "code": 500, "message": "rate limited"}
+    assert not any(outcome[str(m)]["ok"] for m in range(100, 250))
+    assert outcome["200"] == {"ok": False, "code": 400, "message": "INVALID_DATA"}
+
+
+def test_per_record_failures_and_omissions_are_reported(monkeypatch):
+    def put_records(rows):
+        body = _succeeded(rows[:2])
+        body["data"][1].update(status="error", code="INVALID_DATA", message="invalid data")
+        return body
+
+    monkeypatch.setattr(zoho, "_putRecords", put_records)
+
+    outcome = zoho.updateResultsBulk([(1, "New", ""), (2, "New", ""), (3, "New", "")])
+
+    assert outcome["1"]["ok"]
+    assert outcome["2"] == {"ok": False, "code": "INVALID_DATA", "message": "invalid data"}
+    assert outcome["3"] == {"ok": False, "code": None, "message": "missing from Zoho response"}
+
+
+def _pages(count, per_page=2):
+    """Search responses for `count` full pages; tokens take over after page 10."""
+    pages = []
+    for page in range(1, count + 1):
+        info = {"more_records": page < count}
+        if page >= 10 and page < count:
+            info["next_page_token"] = f"token-{page + 1}"
+        data = [{"id": f"{page}-{i}", "NAAM_CaseID": None, "Extra": "x"} for i in range(per_page)]
+        pages.append({"data": data, "info": info})
+    return pages
+
+
+def test_search_follows_more_records_and_page_tokens(monkeypatch):
+    pages = _pages(12)
+    requests_made = []
+
+    def search_page(criteria, fields, page, per_page, page_token=None):
+        requests_made.append((page, page_token))
+        if page_token:
+            return pages[int(page_token.split("-")[1]) - 1]
+        return pages[page - 1]
+
+    monkeypatch.setattr(zoho, "_searchPage", search_page)
+
+    records = list(zoho.iterSearch("(id:equals:1)", fields=("id", "NAAM_CaseID")))
+
+    assert len(records) == 24
+    assert records[0] == {"id": "1-0", "NAAM_CaseID": None}
+    assert requests_made[:10] == [(page, None) for page in range(1, 11)]
+    assert requests_made[10:] == [(11, "token-11"), (12, "token-12")]
+
+
+class _NoContent:
+    status_code = 204
+
+    def json(self):
+        raise ValueError("no body")
+
+
+class _Page:
+    status_code = 200
+
+    def __init__(self, body):
+        self._body = body
+
+    def json(self):
+        return self._body
+
+
+def test_search_stops_on_an_empty_or_204_page(monkeypatch):
+    monkeypatch.setattr(zoho, "get_token", lambda: "token")
+    responses = iter([
+        _Page({"data": [{"id": "1"}], "info": {"more_records": True}}),
+        _NoContent(),
+    ])
+    monkeypatch.setattr(zoho, "requestGet", lambda **kwargs: next(responses))
+
+    assert list(zoho.iterSyncIds()) == ["1"]
+
+    # an empty page ends the search even when Zoho says there is more
+    monkeypatch.setattr(zoho, "requestGet", lambda **kwargs: _Page({"data": [], "info": {"more_records": True}}))
+    assert zoho.listSyncRecords() == {"response": []}
+
+
+def test_search_error_is_returned_not_truncated(monkeypatch):
+    pages = iter([{"data": [{"id": "1"}], "info": {"more_records": True}}, {"error": "boom", "statusCode": 500}])
+    monkeypatch.setattr(zoho, "_searchPage", lambda *args: next(pages))
+
+    assert zoho.getListOfSyncIds()["statusCode"] == 500